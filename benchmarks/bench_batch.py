@@ -0,0 +1,94 @@
+"""
+Benchmark: /analyze/batch throughput vs the concurrency limit.
+
+Runs services.batch.run_batch over `--items` symptom texts against a stand-in
+model that takes `--latency` seconds per call and admits at most
+`--upstream-rps` calls per second (the upstream rate limit). Hospital lookups
+are simulated for clinics in a few neighbouring locations. Items per second
+should grow roughly linearly with the concurrency limit until it reaches
+the rate limit.
+
+    python -m benchmarks.bench_batch --items 400 --latency 0.5 --upstream-rps 60
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from schemas import SymptomCheckRequest
+from services.batch import run_batch
+
+SYMPTOMS = ["fever", "cough", "headache", "sore throat", "nausea", "rash", "back pain", "dizziness", "fatigue", "chills"]
+
+
+class RateLimitedModel:
+    """Admits calls at `rps` per second (a simple spacing limiter) and takes `latency` seconds each."""
+
+    def __init__(self, latency: float, rps: float):
+        self.latency = latency
+        self.interval = 1.0 / rps
+        self._next_slot = 0.0
+        self.calls = 0
+
+    async def analyze(self, symptoms: str) -> dict:
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        await asyncio.sleep(slot - now + self.latency)
+        self.calls += 1
+        return {"possible_conditions": [{"condition": "Common cold", "confidence_score": "40%"}], "symptoms": symptoms}
+
+
+async def find_hospitals(latitude: float, longitude: float):
+    await asyncio.sleep(0.05)
+    return [{"name": "City Hospital", "address": "Main Road", "distance_meters": 900}]
+
+
+def make_items(n: int, duplicate_ratio: float, rng: random.Random):
+    items = []
+    for i in range(n):
+        if items and rng.random() < duplicate_ratio:
+            items.append(rng.choice(items))
+            continue
+        text = f"{', '.join(rng.sample(SYMPTOMS, 3))} (patient {i})"
+        clinic = rng.choice([(12.9716, 77.5946), (12.9721, 77.5950), (12.9352, 77.6245)])
+        items.append(SymptomCheckRequest(symptoms=text, latitude=clinic[0], longitude=clinic[1]))
+    return items
+
+
+async def run(items, concurrency: int, latency: float, rps: float):
+    model = RateLimitedModel(latency, rps)
+    saved = []
+
+    async def save(completed):
+        saved.append(len(completed))
+
+    start = time.perf_counter()
+    lines = 0
+    async for _ in run_batch(items, model.analyze, find_hospitals, concurrency, hospitals_timeout=4.0, on_complete=save):
+        lines += 1
+    elapsed = time.perf_counter() - start
+    return elapsed, model.calls, saved, lines
+
+
+def main(n: int, latency: float, rps: float, duplicate_ratio: float, levels):
+    items = make_items(n, duplicate_ratio, random.Random(7))
+    print(f"{n} items, model latency {latency * 1e3:.0f} ms, upstream limit {rps:.0f} calls/s")
+    print(f"{'concurrency':>11} {'items/s':>9} {'model calls':>12} {'bulk inserts':>13}")
+    for concurrency in levels:
+        elapsed, calls, saved, lines = asyncio.run(run(items, concurrency, latency, rps))
+        assert lines == n + 1
+        print(f"{concurrency:>11} {n / elapsed:>9.1f} {calls:>12} {len(saved):>13}")
+    print(f"ideal linear scaling: {1 / latency:.1f} items/s per unit of concurrency, capped near {rps:.0f} calls/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--upstream-rps", type=float, default=60.0)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+    main(args.items, args.latency, args.upstream_rps, args.duplicates, args.levels)
@@ -0,0 +1,160 @@
+"""
+Benchmark: upstream brownout with and without the resilience layer.
+
+Starts a local fault-injecting HTTP stub and drives it open-loop at `--rps`
+requests per second, each with a `--deadline` budget, through four phases:
+
+    healthy   capacity C concurrent requests, latency L
+    brownout  capacity C/4, latency 4L; requests over capacity get 429 + Retry-After
+    outage    every request fails fast with 503
+    recovered back to healthy
+
+"naive" calls the stub directly (one attempt, like the code before
+services/resilience.py). "guarded" goes through an Upstream with the
+app's retry, adaptive-rate and circuit-breaker logic. The report shows, per
+phase, goodput (successful requests per second), error rate, p99 latency
+and the load the stub actually received.
+
+    python -m benchmarks.bench_brownout --rps 100 --phase-seconds 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from benchmarks.standins import percentile
+
+import httpx # type: ignore
+from services.resilience import Upstream
+
+PHASES = ["healthy", "brownout", "outage", "recovered"]
+BODY = json.dumps({"type": "FeatureCollection", "features": []}).encode()
+
+
+class FaultInjectingServer:
+    """HTTP/1.1 keep-alive stub whose capacity, latency and failure mode follow the phase schedule."""
+
+    def __init__(self, capacity: int, latency: float, phase_seconds: float):
+        self.capacity = capacity
+        self.latency = latency
+        self.phase_seconds = phase_seconds
+        self.started = None
+        self.in_flight = 0
+        self.received = {phase: 0 for phase in PHASES}
+        self._server = None
+
+    def phase(self) -> str:
+        index = int((time.monotonic() - self.started) / self.phase_seconds)
+        return PHASES[min(index, len(PHASES) - 1)]
+
+    async def _respond(self, phase: str):
+        if phase == "outage":
+            return 503, {}
+        capacity, latency = self.capacity, self.latency
+        if phase == "brownout":
+            capacity, latency = max(1, self.capacity // 4), self.latency * 4
+        if self.in_flight >= capacity:
+            return 429, {"Retry-After": "0.5"}
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            self.in_flight -= 1
+        return 200, {}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                phase = self.phase()
+                self.received[phase] += 1
+                status, headers = await self._respond(phase)
+                body = BODY if status == 200 else b"{}"
+                head = f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+                writer.write(head.encode() + b"\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.started = time.monotonic()
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def run(mode: str, rps: float, deadline: float, capacity: int, latency: float, phase_seconds: float):
+    server = FaultInjectingServer(capacity, latency, phase_seconds)
+    port = await server.start()
+    url = f"http://127.0.0.1:{port}/v2/places"
+    upstream = Upstream(
+        "stub", max_concurrency=capacity * 2, rate=rps, burst=rps / 4, max_attempts=3,
+        backoff_base=0.1, backoff_max=1.0, failure_threshold=5, reset_timeout=1.0, default_timeout=deadline,
+    )
+    results = {phase: [] for phase in PHASES}  # (ok, latency) per request, by phase at start
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=500, max_keepalive_connections=500), timeout=deadline) as client:
+        async def get():
+            response = await client.get(url)
+            response.raise_for_status()
+            return response
+
+        async def one():
+            phase = server.phase()
+            start = time.monotonic()
+            try:
+                if mode == "guarded":
+                    await upstream.call(get, deadline=start + deadline)
+                else:
+                    await asyncio.wait_for(get(), timeout=deadline)
+                ok = True
+            except Exception:
+                ok = False
+            results[phase].append((ok, time.monotonic() - start))
+
+        tasks = []
+        total = int(rps * phase_seconds * len(PHASES))
+        begin = time.monotonic()
+        for i in range(total):
+            delay = begin + i / rps - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one()))
+        await asyncio.gather(*tasks)
+    await server.stop()
+    return results, server.received, upstream.stats()
+
+
+def main(rps: float, deadline: float, capacity: int, latency: float, phase_seconds: float):
+    print(f"{rps:.0f} req/s offered, {deadline:.1f} s deadline, stub capacity {capacity} x {latency * 1e3:.0f} ms, "
+          f"{phase_seconds:.0f} s per phase")
+    for mode in ("naive", "guarded"):
+        results, received, stats = asyncio.run(run(mode, rps, deadline, capacity, latency, phase_seconds))
+        print(f"\n{mode}")
+        print(f"{'phase':>10} {'goodput/s':>10} {'errors':>7} {'p99 ms':>8} {'stub load/s':>12}")
+        for phase in PHASES:
+            samples = results[phase]
+            ok = sum(1 for success, _ in samples if success)
+            p99 = percentile([latency for _, latency in samples], 99) * 1e3
+            print(f"{phase:>10} {ok / phase_seconds:>10.1f} {1 - ok / len(samples):>7.0%} {p99:>8.0f} "
+                  f"{received[phase] / phase_seconds:>12.1f}")
+        if mode == "guarded":
+            print(f"upstream stats: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rps", type=float, default=100.0)
+    parser.add_argument("--deadline", type=float, default=2.0)
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--phase-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    main(args.rps, args.deadline, args.capacity, args.latency, args.phase_seconds)
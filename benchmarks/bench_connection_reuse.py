@@ -0,0 +1,112 @@
+"""
+Benchmark: per-call httpx.AsyncClient vs the shared pooled client.
+
+Starts a local HTTP/1.1 keep-alive server that answers with a Geoapify-shaped
+body. `--handshake-ms` delays the first response on every new connection to
+stand in for the TCP+TLS setup cost of a real remote host. Reports wall time,
+mean latency and how many connections each strategy opened.
+
+    python -m benchmarks.bench_connection_reuse --requests 200 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.standins import percentile
+
+import httpx # type: ignore
+from services.clients import ClientRegistry
+
+BODY = json.dumps({"type": "FeatureCollection", "features": []}).encode()
+
+
+class MockServer:
+    def __init__(self, handshake_delay: float):
+        self.handshake_delay = handshake_delay
+        self.connections = 0
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        first = True
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                if first and self.handshake_delay:
+                    await asyncio.sleep(self.handshake_delay)
+                first = False
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+                    + BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v2/places"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def per_call_client(url: str):
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url, params={"limit": 7})
+        response.raise_for_status()
+
+
+async def run(name: str, call, server: MockServer, requests: int, concurrency: int):
+    server.connections = 0
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<14} {elapsed * 1000:>9.0f} {sum(latencies) / len(latencies) * 1000:>9.2f} "
+        f"{percentile(latencies, 99) * 1000:>9.2f} {server.connections:>12}"
+    )
+
+
+async def main(requests: int, concurrency: int, handshake_ms: float):
+    server = MockServer(handshake_ms / 1000.0)
+    url = await server.start()
+    # HTTP/2 needs TLS+ALPN; the plain-text mock server speaks HTTP/1.1 keep-alive.
+    registry = ClientRegistry()
+    registry._http = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_keepalive_connections=concurrency))
+
+    async def shared_client():
+        response = await registry.http.get(url, params={"limit": 7})
+        response.raise_for_status()
+
+    print(f"{'strategy':<14} {'total ms':>9} {'mean ms':>9} {'p99 ms':>9} {'connections':>12}")
+    await run("per-call", lambda: per_call_client(url), server, requests, concurrency)
+    await run("shared pool", shared_client, server, requests, concurrency)
+    await registry.shutdown()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.handshake_ms))
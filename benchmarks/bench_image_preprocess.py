@@ -0,0 +1,100 @@
+"""
+Benchmark: image handling for 12 MP phone photos, before and after preprocessing.
+
+"before" is the old path: decode the full-resolution upload and re-encode it
+at full size, as the Gemini SDK does for a PIL image. "after" is
+services.image_processor: a draft-mode decode at reduced scale, downsampling to
+IMAGE_MAX_SIDE and re-encoding. Each mode runs in a fresh process, and its
+peak working memory is the growth in peak RSS over an after-imports baseline.
+The report also covers latency and the bytes sent to Storage and the model.
+
+    python -m benchmarks.bench_image_preprocess --photos 5
+"""
+import argparse
+import io
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.standins import percentile
+
+
+def synthetic_photo(seed: int, width: int = 4000, height: int = 3000) -> bytes:
+    """A 12 MP JPEG with smooth gradients plus sensor-like noise, roughly the size of a phone photo."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / rng.uniform(200, 800) + rng.uniform(0, 6)),
+        128 + 100 * np.cos(y / rng.uniform(200, 800) + rng.uniform(0, 6)),
+        128 + 100 * np.sin((x + y) / rng.uniform(300, 900)),
+    ], axis=-1)
+    noise = rng.normal(0, 5, base.shape).astype(np.float32)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format="JPEG", quality=92)
+    return out.getvalue()
+
+
+def _before(raw: bytes) -> int:
+    img = Image.open(io.BytesIO(raw))
+    img.load()
+    out = io.BytesIO()
+    img.save(out, format="JPEG")
+    # The original file was uploaded to Storage and the full-size re-encode sent to the model.
+    return len(raw) + len(out.getvalue())
+
+
+def _after(raw: bytes) -> int:
+    from services.image_processor import _digest, _prepare
+    from config import settings
+    prepared = _prepare(raw, _digest(raw), settings.IMAGE_MAX_SIDE, settings.IMAGE_FORMAT, settings.IMAGE_QUALITY)
+    # The same processed bytes go to Storage and to the model.
+    return 2 * len(prepared.data)
+
+
+def _run_mode(mode: str, photos: list, repeats: int, results):
+    import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+    import services.image_processor  # noqa: F401  (keep import cost out of the measurement)
+    func = _before if mode == "before" else _after
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies, transferred = [], 0
+    for _ in range(repeats):
+        for raw in photos:
+            start = time.perf_counter()
+            transferred = func(raw)
+            latencies.append(time.perf_counter() - start)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((mode, latencies, transferred, peak, baseline))
+
+
+def main(photos: int, repeats: int):
+    images = [synthetic_photo(seed) for seed in range(photos)]
+    print(f"{photos} synthetic 4000x3000 photos, mean size {sum(map(len, images)) / photos / 1e6:.1f} MB")
+    # Children of a fork inherit the parent's peak RSS; the forkserver starts small.
+    context = multiprocessing.get_context("forkserver")
+    results = context.Queue()
+    report = {}
+    for mode in ("before", "after"):
+        process = context.Process(target=_run_mode, args=(mode, images, repeats, results))
+        process.start()
+        report[mode] = results.get()
+        process.join()
+
+    for mode in ("before", "after"):
+        _, latencies, transferred, peak, baseline = report[mode]
+        print(f"{mode:>6}: p50 {percentile(latencies, 50) * 1e3:7.1f} ms, p99 {percentile(latencies, 99) * 1e3:7.1f} ms, "
+              f"peak working memory {(peak - baseline) / 1024:5.0f} MB, bytes to Storage + model {transferred / 1e6:5.2f} MB")
+    before, after = report["before"], report["after"]
+    print(f"speedup {percentile(before[1], 50) / percentile(after[1], 50):.1f}x, "
+          f"transfer {before[2] / after[2]:.0f}x smaller")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--photos", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    main(args.photos, args.repeats)
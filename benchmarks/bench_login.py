@@ -0,0 +1,99 @@
+"""
+Microbenchmark for the login path.
+
+Part 1 times `security.verify_password` for each stored-hash format, showing
+how concatenated legacy values multiply PBKDF2 work. Part 2 drives `/login`
+concurrently through the app (Supabase stand-in, no delay) and reports
+throughput, p99 and the worst event-loop stall, then logs in again to show
+that legacy hashes were upgraded to a single canonical candidate.
+
+    python -m benchmarks.bench_login --concurrency 16
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import secrets
+import time
+
+from benchmarks.standins import FakeSupabaseClient, LoopLagMonitor, percentile
+
+import httpx # type: ignore
+import security
+from main import app
+from services.supabase_service import supabase_service
+
+PASSWORD = "MySecurePassword@2025"
+
+
+def _legacy_hash(password: str, prefix: str) -> str:
+    salt = secrets.token_bytes(security.SALT_LEN)
+    dk = hashlib.pbkdf2_hmac(security.HASH_NAME, password.encode(), salt, security.ITERATIONS, dklen=security.DKLEN)
+    return f"{prefix}{security.HASH_NAME}${security.ITERATIONS}${base64.b64encode(salt).decode()}${base64.b64encode(dk).decode()}"
+
+
+def stored_formats():
+    canonical = security.get_password_hash(PASSWORD)
+    # A wrong first entry forces every candidate to be derived.
+    decoy = security.get_password_hash("not-the-password")
+    return {
+        "canonical": canonical,
+        "legacy pbkdf2$": _legacy_hash(PASSWORD, "pbkdf2$"),
+        "4-part": _legacy_hash(PASSWORD, ""),
+        "concatenated x3": decoy + decoy + canonical,
+    }
+
+
+def bench_verify(repeats: int):
+    print(f"{'format':<18} {'verify ms':>10} {'needs rehash':>13}")
+    for name, stored in stored_formats().items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            assert security.verify_password(PASSWORD, stored)
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"{name:<18} {elapsed * 1000:>10.1f} {str(security.needs_rehash(stored)):>13}")
+
+
+async def login_round(client: httpx.AsyncClient, emails, concurrency: int):
+    latencies = []
+
+    async def one(email):
+        start = time.perf_counter()
+        response = await client.post("/login", data={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(emails[i % len(emails)]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+    return latencies, elapsed, monitor.max_lag
+
+
+async def bench_login(concurrency: int):
+    supabase_service.initialize_client()
+    supabase_service.client = FakeSupabaseClient()
+    users = []
+    for i, stored in enumerate(stored_formats().values()):
+        users.append({"id": i + 1, "name": "Bench", "email": f"user{i}@example.com", "hashed_password": stored})
+    supabase_service.client.db["users"] = users
+    emails = [u["email"] for u in users]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"\n{'login round':<22} {'req/s':>7} {'p99 ms':>8} {'max loop stall ms':>18}")
+        for label in ("first (mixed formats)", "second (rehashed)"):
+            latencies, elapsed, max_lag = await login_round(client, emails, concurrency)
+            print(f"{label:<22} {len(latencies) / elapsed:>7.1f} {percentile(latencies, 99) * 1000:>8.1f} {max_lag * 1000:>18.1f}")
+    supabase_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    bench_verify(args.repeats)
+    asyncio.run(bench_login(args.concurrency))
@@ -0,0 +1,112 @@
+"""
+Benchmark: cost of the metrics instrumentation.
+
+Times one histogram observation, one `timed()` block and one MetricsMiddleware
+pass around a no-op ASGI app, then drives main.app directly over ASGI (no
+sockets) with METRICS_ENABLED toggled on and off in alternating blocks for the
+cheapest route (`GET /`). The per-request cost of a typical analysis request
+(middleware plus `--upstream-calls` timed calls) is reported against
+`--request-ms` (default 30 ms, well under one Gemini round trip).
+
+    python -m benchmarks.bench_metrics_overhead --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from config import settings
+from services.metrics import MetricsMiddleware, http_requests, timed
+import main
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+def _scope(path: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+
+
+async def _time_requests(path: str, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        await main.app(_scope(path), _receive, _send)
+    return (time.perf_counter() - start) / n
+
+
+async def compare(path: str, n: int, blocks: int):
+    """Mean seconds per request with metrics off and on, over alternating blocks."""
+    totals = {False: 0.0, True: 0.0}
+    await _time_requests(path, max(1, n // 10))  # warm-up
+    for _ in range(blocks):
+        for enabled in (False, True):
+            settings.METRICS_ENABLED = enabled
+            totals[enabled] += await _time_requests(path, n // blocks)
+    settings.METRICS_ENABLED = True
+    return totals[False] / blocks, totals[True] / blocks
+
+
+async def _noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _middleware_pass(n: int) -> float:
+    """Seconds MetricsMiddleware adds around a no-op ASGI app."""
+    wrapped = MetricsMiddleware(_noop_app)
+    scope = _scope("/")
+    timings = {}
+    for name, app in (("bare", _noop_app), ("wrapped", wrapped), ("bare", _noop_app), ("wrapped", wrapped)):
+        start = time.perf_counter()
+        for _ in range(n):
+            await app(scope, _receive, _send)
+        timings[name] = (time.perf_counter() - start) / n
+    return timings["wrapped"] - timings["bare"]
+
+
+def micro(n: int):
+    child = http_requests.labels("GET", "/bench", "200")
+    start = time.perf_counter()
+    for _ in range(n):
+        child.observe(0.01)
+    observe = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for _ in range(n):
+        with timed("bench", "noop"):
+            pass
+    block = (time.perf_counter() - start) / n
+    return observe, block, asyncio.run(_middleware_pass(n))
+
+
+def main_(requests: int, blocks: int, upstream_calls: int, request_ms: float):
+    observe, block, middleware = micro(200_000)
+    print(f"histogram observe {observe * 1e6:.2f} us, timed() block {block * 1e6:.2f} us, "
+          f"middleware pass {middleware * 1e6:.2f} us")
+
+    off, on = asyncio.run(compare("/", requests, blocks))
+    print(f"GET / through the full app: {off * 1e6:.1f} us off, {on * 1e6:.1f} us on "
+          f"({(on - off) / off:+.2%}; within run-to-run noise when small)")
+
+    per_request = middleware + upstream_calls * block
+    print(f"per request with {upstream_calls} instrumented upstream calls: {per_request * 1e6:.1f} us = "
+          f"{per_request / (request_ms / 1000):.3%} of a {request_ms:.0f} ms request, "
+          f"{per_request / off:.2%} of GET /")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--upstream-calls", type=int, default=4)
+    parser.add_argument("--request-ms", type=float, default=30.0)
+    args = parser.parse_args()
+    main_(args.requests, args.blocks, args.upstream_calls, args.request_ms)
@@ -0,0 +1,104 @@
+"""
+Benchmark: parsing and serializing a model analysis, per response.
+
+Compares the previous path (strip/replace fences, json.loads, FastAPI's
+jsonable_encoder + JSONResponse) with the current one (extract_json_object
++ orjson, SymptomAnalysis validation, ORJSONResponse) on analyses of
+`--conditions` entries in several output shapes: bare JSON (Gemini JSON
+mode), a ```json fence, prose around the object, and a trailing comma. Also
+reports which shapes each path can read at all.
+
+    python -m benchmarks.bench_parse --conditions 3 --number 20000
+"""
+import argparse
+import json
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from benchmarks.fakes import CONDITIONS
+from services.model_output import extract_json_object, parse_analysis
+
+
+def legacy_parse(text: str) -> dict:
+    # The parser this replaced (gemini_service.parse_model_json).
+    cleaned_response = text.strip().replace("```json", "").replace("```", "")
+    return json.loads(cleaned_response)
+
+
+def legacy(text: str) -> bytes:
+    return JSONResponse(jsonable_encoder(legacy_parse(text))).body
+
+
+def current(text: str) -> bytes:
+    return ORJSONResponse(parse_analysis(text)).body
+
+
+def analysis_text(conditions: int) -> str:
+    return json.dumps({
+        "possible_conditions": [
+            {"condition": CONDITIONS[i % len(CONDITIONS)], "confidence_score": f"{80 - i * 5}%"}
+            for i in range(conditions)
+        ],
+        "recommended_next_steps": "Rest, stay hydrated and see a doctor if symptoms persist or worsen. " * 3,
+        "disclaimer": "This is for informational purposes only and not a substitute for professional medical advice.",
+    }, indent=2)
+
+
+def shapes(text: str) -> dict:
+    return {
+        "bare": text,
+        "fenced": f"```json\n{text}\n```",
+        "prose": f"Here is the analysis you asked for:\n{text}\nLet me know if you need anything else {{:)}}.",
+        "trailing_comma": text[: text.rfind("}")].rstrip() + ",\n}",
+    }
+
+
+def per_call(func, text: str, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        func(text)
+    return (time.perf_counter() - start) / number
+
+
+def main(conditions: int, number: int):
+    samples = shapes(analysis_text(conditions))
+    print(f"{conditions} conditions, {len(samples['bare'])} bytes of model output")
+    print(f"{'shape':<16}{'legacy':>12}{'current':>12}")
+    for name, text in samples.items():
+        row = [f"{name:<16}"]
+        for func in (legacy, current):
+            try:
+                func(text)
+            except ValueError:
+                row.append(f"{'fails':>12}")
+                continue
+            row.append(f"{per_call(func, text, number) * 1e6:>9.1f} us")
+        print("".join(row))
+
+    # Where the time goes on the common path (JSON mode, bare output).
+    text = samples["bare"]
+    result = parse_analysis(text)
+    stages = {
+        "json.loads": lambda: json.loads(text),
+        "extract + orjson.loads": lambda: extract_json_object(text),
+        "extract + orjson + validate": lambda: parse_analysis(text),
+        "jsonable_encoder + JSONResponse": lambda: JSONResponse(jsonable_encoder(result)),
+        "ORJSONResponse": lambda: ORJSONResponse(result),
+    }
+    print("\nstages on bare output:")
+    for name, func in stages.items():
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        print(f"    {name:<34}{(time.perf_counter() - start) / number * 1e6:>8.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conditions", type=int, default=3)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.conditions, args.number)
@@ -0,0 +1,111 @@
+"""
+Benchmark: Geoapify category-set selection, sequential fallback vs PlaceQueryEngine.
+
+A stand-in Places API answers in `--latency` seconds (log-normal, with a
+`--tail` share of requests `--tail-factor` times slower). Two scenarios:
+
+    rejected  the upstream rejects the preferred category set with a 400;
+              "sequential" is the old code (preferred, then fallback on every
+              query), "engine" remembers the rejection
+    tail      both sets work; "engine" alone vs "engine+hedge", which sends a
+              duplicate request after the p95 of recent latency
+
+The report shows end-to-end p50/p99, upstream requests per query and the
+engine's per-strategy latency histograms.
+
+    python -m benchmarks.bench_place_query --queries 2000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from benchmarks.standins import percentile
+from services.location_service import FALLBACK_CATEGORIES, PREFERRED_CATEGORIES
+from services.place_query import CategoryRejected, PlaceQueryEngine
+
+STRATEGIES = [("preferred", PREFERRED_CATEGORIES), ("fallback", FALLBACK_CATEGORIES)]
+
+
+class StandInPlaces:
+    def __init__(self, latency: float, tail: float, tail_factor: float, reject: set, seed: int):
+        self.latency = latency
+        self.tail = tail
+        self.tail_factor = tail_factor
+        self.reject = reject
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    async def fetch(self, categories: str):
+        self.requests += 1
+        delay = self.latency * self.rng.lognormvariate(0, 0.25)
+        if self.rng.random() < self.tail:
+            delay *= self.tail_factor
+        if categories in self.reject:
+            await asyncio.sleep(delay / 2)  # a 400 comes back without running the search
+            raise CategoryRejected(categories)
+        await asyncio.sleep(delay)
+        return [{"name": "City Hospital", "lat": 12.97, "lon": 77.59}]
+
+
+async def sequential(fetch):
+    try:
+        return await fetch(PREFERRED_CATEGORIES)
+    except CategoryRejected:
+        return await fetch(FALLBACK_CATEGORIES)
+
+
+async def run(mode: str, scenario: str, queries: int, concurrency: int, args):
+    reject = {PREFERRED_CATEGORIES} if scenario == "rejected" else set()
+    places = StandInPlaces(args.latency, args.tail, args.tail_factor, reject, seed=11)
+    engine = PlaceQueryEngine(STRATEGIES, recheck_after=3600, hedge_percentile=95 if mode == "engine+hedge" else None)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.monotonic()
+            if mode == "sequential":
+                await sequential(places.fetch)
+            else:
+                await engine.query(places.fetch)
+            latencies.append(time.monotonic() - start)
+
+    await asyncio.gather(*(one() for _ in range(queries)))
+    return latencies, places.requests, engine.stats()
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1e3:.0f}"
+
+
+def main(args):
+    print(f"{args.queries} queries, {args.concurrency} concurrent, latency {args.latency * 1e3:.0f} ms, "
+          f"{args.tail:.0%} of requests {args.tail_factor:.0f}x slower")
+    for scenario, modes in (("rejected", ("sequential", "engine")), ("tail", ("engine", "engine+hedge"))):
+        print(f"\nscenario: {scenario}")
+        print(f"{'mode':>13} {'p50 ms':>7} {'p99 ms':>7} {'requests/query':>15}")
+        histograms = {}
+        for mode in modes:
+            latencies, requests, stats = asyncio.run(run(mode, scenario, args.queries, args.concurrency, args))
+            print(f"{mode:>13} {percentile(latencies, 50) * 1e3:>7.0f} {percentile(latencies, 99) * 1e3:>7.0f} "
+                  f"{requests / args.queries:>15.2f}")
+            if mode != "sequential":
+                histograms[mode] = stats
+        for mode, stats in histograms.items():
+            print(f"  {mode} histograms (p50/p90/p99 ms, count); "
+                  f"rejections {stats['rejections']}, hedges {stats['hedges']}, won {stats['hedge_wins']}")
+            for name, latency in stats["latency"].items():
+                print(f"    {name:>9}: {_ms(latency['p50_seconds'])}/{_ms(latency['p90_seconds'])}/"
+                      f"{_ms(latency['p99_seconds'])}, {latency['count']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.12)
+    parser.add_argument("--tail", type=float, default=0.05)
+    parser.add_argument("--tail-factor", type=float, default=8.0)
+    main(parser.parse_args())
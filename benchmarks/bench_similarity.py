@@ -0,0 +1,113 @@
+"""
+Benchmark: rephrased-symptom matching on a synthetic paraphrase corpus.
+
+Fills the similarity index with `--entries` canonical symptom texts (random
+2-4 symptom combinations), then queries rephrasings of indexed texts (word
+order and filler only) and of unseen combinations, plus the same texts with
+a duration added, which must not match. Reports lookup latency, index memory
+(tracemalloc) and the true-hit / false-hit / miss rates.
+
+    python -m benchmarks.bench_similarity --entries 100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks.standins import percentile
+from services.similarity_index import SimilarityIndex
+
+SYMPTOMS = """
+headache fever cough sore-throat runny-nose sneezing fatigue nausea vomiting diarrhea
+constipation dizziness chest-pain shortness-of-breath back-pain joint-pain muscle-ache rash itching
+swelling chills night-sweats weight-loss blurred-vision ear-pain toothache abdominal-pain bloating
+heartburn palpitations numbness tingling insomnia anxiety confusion fainting wheezing congestion
+hoarseness stiff-neck jaw-pain leg-cramps blisters hives dry-skin hair-loss frequent-urination
+burning-urination blood-in-urine thirst loss-of-appetite loss-of-smell loss-of-taste
+""".split()
+
+TEMPLATES = [
+    "{0}",
+    "I have {0}",
+    "I have been having {0}",
+    "experiencing {0}",
+    "my {0}",
+    "I am suffering from {0}",
+]
+# These change the meaning: a match would be a wrong answer.
+DURATIONS = ["{0} since yesterday", "{0} for the past 3 days", "{0} this morning", "{0} for 2 weeks"]
+
+
+def phrase(symptoms):
+    words = [s.replace("-", " ") for s in symptoms]
+    if len(words) == 1:
+        return words[0]
+    return ", ".join(words[:-1]) + " and " + words[-1]
+
+
+def combination(rng: random.Random):
+    return tuple(sorted(rng.sample(SYMPTOMS, rng.randint(2, 4))))
+
+
+def main(entries: int, queries: int, seed: int):
+    rng = random.Random(seed)
+    unique = set()
+    while len(unique) < entries:
+        unique.add(combination(rng))
+    combos = sorted(unique)
+
+    tracemalloc.start()
+    index = SimilarityIndex(max_entries=entries)
+    start = time.perf_counter()
+    for combo in combos:
+        index.add(phrase(combo), "|".join(combo))
+    build = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    seen = set(combos)
+    true_hits = false_hits = misses = unseen_hits = duration_hits = 0
+    latencies = []
+    for i in range(queries):
+        if i % 5 == 4:
+            combo = rng.choice(combos)
+            if index.lookup(rng.choice(DURATIONS).format(phrase(combo))) is not None:
+                duration_hits += 1
+            continue
+        if i % 2 == 0:
+            combo = rng.choice(combos)
+        else:
+            combo = combination(rng)
+        words = list(combo)
+        rng.shuffle(words)
+        text = rng.choice(TEMPLATES).format(phrase(words))
+        start = time.perf_counter()
+        match = index.lookup(text)
+        latencies.append(time.perf_counter() - start)
+        if combo in seen:
+            if match == "|".join(combo):
+                true_hits += 1
+            elif match is None:
+                misses += 1
+            else:
+                false_hits += 1
+        elif match is not None:
+            unseen_hits += 1
+
+    indexed_queries = true_hits + false_hits + misses
+    duration_queries = queries // 5
+    print(f"entries {len(index):,}, build {build:.1f} s, index memory {memory / 1e6:.1f} MB")
+    print(f"lookup p50 {percentile(latencies, 50) * 1e6:.0f} us, p99 {percentile(latencies, 99) * 1e6:.0f} us")
+    print(f"paraphrases of indexed texts: hit {true_hits / indexed_queries:.1%}, "
+          f"wrong match {false_hits / indexed_queries:.1%}, miss {misses / indexed_queries:.1%}")
+    print(f"unseen combinations matched to a different text: {unseen_hits / max(1, queries - indexed_queries - duration_queries):.1%}")
+    print(f"indexed texts with a duration added matched anyway: {duration_hits / max(1, duration_queries):.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+    main(args.entries, args.queries, args.seed)
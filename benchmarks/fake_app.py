@@ -0,0 +1,57 @@
+"""
+Runs the real app under uvicorn with the Gemini SDK replaced by FakeGenerativeModel.
+
+Started as a subprocess by benchmarks/load_service.py, which points
+SUPABASE_URL and GEOAPIFY_BASE_URL at the localhost fakes via the environment.
+With `--workers` above 1 the app runs in that many worker processes, set up
+as serve.py would (shared cache tier and quotas), each with its own stand-in.
+
+    python -m benchmarks.fake_app --port 8100 --gemini-ms 800 --gemini-errors 0.01
+"""
+import argparse
+import os
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+import uvicorn # type: ignore
+
+from benchmarks.fakes import FakeGenerativeModel, LatencyProfile
+
+
+def create_app():
+    """App factory; each worker process builds its stand-in model from the environment."""
+    from config import settings
+    from services.clients import clients
+    import main as app_module
+
+    model = FakeGenerativeModel(LatencyProfile(
+        float(os.environ["FAKE_GEMINI_MS"]) / 1000,
+        error_rate=float(os.environ["FAKE_GEMINI_ERRORS"]),
+        error_status=int(os.environ["FAKE_GEMINI_ERROR_STATUS"]),
+    ))
+    # clients.model() hands out cached handles; seed the cache with the stand-in.
+    clients._models[settings.GEMINI_MODEL] = model
+    return app_module.app
+
+
+def main(port: int, gemini_ms: float, gemini_errors: float, gemini_error_status: int, workers: int = 1):
+    os.environ.update(FAKE_GEMINI_MS=str(gemini_ms), FAKE_GEMINI_ERRORS=str(gemini_errors),
+                      FAKE_GEMINI_ERROR_STATUS=str(gemini_error_status))
+    if workers > 1:
+        from serve import configure_workers
+
+        configure_workers(workers)
+        uvicorn.run("benchmarks.fake_app:create_app", factory=True, workers=workers,
+                    host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    else:
+        uvicorn.run(create_app(), host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--gemini-ms", type=float, default=800.0)
+    parser.add_argument("--gemini-errors", type=float, default=0.0)
+    parser.add_argument("--gemini-error-status", type=int, default=503)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    main(args.port, args.gemini_ms, args.gemini_errors, args.gemini_error_status, args.workers)
@@ -0,0 +1,298 @@
+"""
+Localhost fakes for the service's upstreams, used by the load tests.
+
+Unlike benchmarks/standins.py (in-process objects swapped into the service),
+these run as real HTTP servers, so the production clients (httpx, postgrest,
+storage3) and the resilience layer are exercised unchanged:
+
+    FakeGeoapify   GET /v2/places, a FeatureCollection around the `filter` circle
+    FakeSupabase   PostgREST /rest/v1/<table> (select/insert/update) and
+                   Storage POST /storage/v1/object/<bucket>/<path>
+    FakeGenerativeModel
+                   in-process stand-in for genai.GenerativeModel with
+                   generate_content_async (plain and stream=True)
+
+Each takes a LatencyProfile: log-normal latency around a median plus an
+injected error rate.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+import uvicorn # type: ignore
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class LatencyProfile:
+    """Per-call latency (log-normal around `median` seconds) and an injected failure rate."""
+
+    def __init__(self, median: float, sigma: float = 0.3, error_rate: float = 0.0, error_status: int = 503,
+                 seed: Optional[int] = None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+
+    def sample(self) -> Tuple[float, Optional[int]]:
+        """(delay seconds, error status or None) for one call."""
+        delay = self.median * self._rng.lognormvariate(0, self.sigma) if self.median > 0 else 0.0
+        failed = self._rng.random() < self.error_rate
+        return delay, self.error_status if failed else None
+
+    def describe(self) -> dict:
+        return {"median_seconds": self.median, "sigma": self.sigma, "error_rate": self.error_rate,
+                "error_status": self.error_status}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeServer:
+    """Serves a Starlette app with uvicorn on a background thread (its own event loop)."""
+
+    def __init__(self, app, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning",
+                                                     access_log=False, lifespan="off"))
+        self._thread = threading.Thread(target=self._server.run, name=f"fake-{self.port}", daemon=True)
+
+    def start(self) -> "FakeServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"fake server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+async def _delay_or_fail(profile: LatencyProfile) -> Optional[JSONResponse]:
+    delay, status = profile.sample()
+    await asyncio.sleep(delay)
+    if status is not None:
+        headers = {"Retry-After": "1"} if status == 429 else None
+        return JSONResponse({"message": "injected failure", "code": status}, status_code=status, headers=headers)
+    return None
+
+
+class FakeGeoapify:
+    """
+    Geoapify Places stand-in. Places are synthetic but stable: the same tile of
+    the map always holds the same facilities. Category sets listed in
+    `rejected_categories` get Geoapify's 400 "Invalid parameters" answer.
+    """
+
+    def __init__(self, profile: LatencyProfile, places_per_query: int = 20, rejected_categories=()):
+        self.profile = profile
+        self.places_per_query = places_per_query
+        self.rejected_categories = set(rejected_categories)
+        self.requests = 0
+        self.app = Starlette(routes=[Route("/v2/places", self.places)])
+
+    async def places(self, request: Request):
+        self.requests += 1
+        failure = await _delay_or_fail(self.profile)
+        if failure is not None:
+            return failure
+        params = request.query_params
+        if params.get("categories") in self.rejected_categories:
+            return JSONResponse({"statusCode": 400, "error": "Bad Request", "message": "Invalid parameters"}, status_code=400)
+        try:
+            lon, lat, radius = (float(v) for v in params["filter"].removeprefix("circle:").split(","))
+        except (KeyError, ValueError):
+            return JSONResponse({"statusCode": 400, "error": "Bad Request", "message": "Invalid parameters"}, status_code=400)
+        limit = min(int(params.get("limit", self.places_per_query)), self.places_per_query)
+        rng = random.Random(f"{lat:.2f},{lon:.2f}")
+        features = []
+        for i in range(limit):
+            distance = radius * math.sqrt(rng.random())
+            bearing = rng.uniform(0, 2 * math.pi)
+            place_lat = lat + distance * math.cos(bearing) / 111_320
+            place_lon = lon + distance * math.sin(bearing) / (111_320 * max(0.01, math.cos(math.radians(lat))))
+            features.append({
+                "type": "Feature",
+                "properties": {
+                    "name": f"Clinic {i + 1}",
+                    "address_line2": f"{rng.randint(1, 200)} Main Road",
+                    "lat": place_lat,
+                    "lon": place_lon,
+                    "categories": ["healthcare", "healthcare.clinic_or_praxis"],
+                },
+                "geometry": {"type": "Point", "coordinates": [place_lon, place_lat]},
+            })
+        return JSONResponse({"type": "FeatureCollection", "features": features})
+
+
+_KEYSET = re.compile(r'created_at\.lt\."([^"]+)",and\(created_at\.eq\."[^"]+",id\.lt\.(\d+)\)')
+
+
+class FakeSupabase:
+    """
+    Supabase stand-in: just enough of PostgREST (eq filters, order, limit, the
+    /history keyset `or`, the top_condition JSON projection, insert/update with
+    return=representation) and Storage uploads for SupabaseService to run unchanged.
+    """
+
+    def __init__(self, db_profile: LatencyProfile, storage_profile: LatencyProfile):
+        self.db_profile = db_profile
+        self.storage_profile = storage_profile
+        self.tables = {}
+        self.objects = set()
+        self.requests = 0
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.app = Starlette(routes=[
+            Route("/rest/v1/{table}", self.rest, methods=["GET", "POST", "PATCH"]),
+            Route("/storage/v1/object/{bucket}/{path:path}", self.upload, methods=["POST"]),
+        ])
+
+    def _filtered(self, table: str, params) -> list:
+        rows = self.tables.setdefault(table, [])
+        for column, condition in params.multi_items():
+            if column in ("select", "order", "limit", "offset", "or", "columns"):
+                continue
+            if condition.startswith("eq."):
+                rows = [row for row in rows if str(row.get(column)) == condition[3:]]
+        keyset = _KEYSET.search(params.get("or", ""))
+        if keyset:
+            created_at, entry_id = keyset.group(1), int(keyset.group(2))
+            rows = [row for row in rows if (row["created_at"], row["id"]) < (created_at, entry_id)]
+        return rows
+
+    @staticmethod
+    def _project(row: dict, select: str) -> dict:
+        row = dict(row)
+        if "top_condition:" in select:
+            conditions = (row.get("response_data") or {}).get("possible_conditions") or [{}]
+            row["top_condition"] = conditions[0].get("condition")
+        return row
+
+    async def rest(self, request: Request):
+        self.requests += 1
+        failure = await _delay_or_fail(self.db_profile)
+        if failure is not None:
+            return failure
+        table = request.path_params["table"]
+        params = request.query_params
+        if request.method == "POST":
+            body = await request.json()
+            rows = self.tables.setdefault(table, [])
+            created = []
+            for values in body if isinstance(body, list) else [body]:
+                self._clock += timedelta(milliseconds=1)
+                row = dict(values, id=len(rows) + 1, created_at=self._clock.isoformat())
+                rows.append(row)
+                created.append(row)
+            return JSONResponse(created, status_code=201)
+        rows = self._filtered(table, params)
+        if request.method == "PATCH":
+            values = await request.json()
+            for row in rows:
+                row.update(values)
+            return JSONResponse(rows)
+        for key in reversed([part for part in params.get("order", "").split(",") if part]):
+            column, _, direction = key.partition(".")
+            rows = sorted(rows, key=lambda row: row.get(column), reverse=direction.startswith("desc"))
+        if "limit" in params:
+            rows = rows[: int(params["limit"])]
+        select = params.get("select", "*")
+        return JSONResponse([self._project(row, select) for row in rows])
+
+    async def upload(self, request: Request):
+        self.requests += 1
+        failure = await _delay_or_fail(self.storage_profile)
+        if failure is not None:
+            return failure
+        await request.body()
+        key = f"{request.path_params['bucket']}/{request.path_params['path']}"
+        if key in self.objects:
+            return JSONResponse({"statusCode": "409", "error": "Duplicate", "message": "The resource already exists"}, status_code=400)
+        self.objects.add(key)
+        return JSONResponse({"Key": key, "Id": str(len(self.objects))})
+
+
+CONDITIONS = ["Common Cold", "Influenza", "Migraine", "Gastroenteritis", "Allergic Rhinitis", "Contact Dermatitis", "Strep Throat"]
+
+
+def fake_analysis(seed: str) -> dict:
+    rng = random.Random(seed)
+    picks = rng.sample(CONDITIONS, 3)
+    return {
+        "possible_conditions": [
+            {"condition": name, "confidence_score": f"{score}%"}
+            for name, score in zip(picks, sorted(rng.sample(range(10, 90), 3), reverse=True))
+        ],
+        "recommended_next_steps": "Rest, stay hydrated and see a doctor if symptoms persist or worsen.",
+        "disclaimer": "This is for informational purposes only and not a substitute for professional medical advice.",
+    }
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Stream:
+    def __init__(self, chunks, gap: float):
+        self._chunks = chunks
+        self._gap = gap
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._gap)
+            yield _Chunk(chunk)
+
+
+class FakeGenerativeModel:
+    """
+    Stand-in for genai.GenerativeModel. Returns a schema-shaped analysis after
+    the profile's latency; injected failures raise the google.api_core error
+    the SDK would (ResourceExhausted for 429, ServiceUnavailable otherwise).
+    Streams split the JSON into `stream_chunks` pieces over the same latency.
+    """
+
+    def __init__(self, profile: LatencyProfile, stream_chunks: int = 8):
+        self.profile = profile
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+
+    async def generate_content_async(self, contents, stream: bool = False, **_kwargs):
+        from google.api_core import exceptions # type: ignore
+        self.calls += 1
+        delay, status = self.profile.sample()
+        prompt = contents[0] if isinstance(contents, list) else contents
+        text = json.dumps(fake_analysis(prompt))
+        if not stream:
+            await asyncio.sleep(delay)
+        else:
+            # Time to first chunk, then the rest of the latency spread over the chunks.
+            await asyncio.sleep(delay / 4)
+        if status is not None:
+            error = exceptions.ResourceExhausted if status == 429 else exceptions.ServiceUnavailable
+            raise error("injected failure")
+        if not stream:
+            return _Chunk(text)
+        size = math.ceil(len(text) / self.stream_chunks)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        return _Stream(chunks, gap=delay * 3 / 4 / len(chunks))
@@ -0,0 +1,174 @@
+"""
+Load test: a noisy neighbour against admission control.
+
+Same stack as benchmarks/load_service.py (real app in a subprocess, localhost
+Geoapify/Supabase fakes, FakeGenerativeModel). One "noisy" user keeps
+`--noisy-concurrency` /analyze/image requests in flight back to back,
+pausing `--noisy-pause` seconds after each rejection, while `--quiet-users`
+other users send an open-loop Poisson mix of text analysis, history and the
+occasional image at `--quiet-rps` in total. The run is repeated with
+ADMISSION_ENABLED off and on; the quiet users' latency per endpoint and the
+noisy user's outcomes are reported side by side.
+
+Rejected uploads are cheap but not free (the multipart body is read before
+the quota check). A noisy client that retries with no pause at all mostly
+burns CPU, which on a small box shows up as latency for everyone in both
+runs. The load generator shares that CPU too.
+
+    python -m benchmarks.load_admission --duration 30 --noisy-concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from benchmarks.fakes import FakeGeoapify, FakeServer, FakeSupabase, LatencyProfile, free_port
+from benchmarks.load_service import _endpoint_report, _photo, _symptom_text, _wait_until_up
+
+import httpx # type: ignore
+
+QUIET_MIX = {"text": 0.5, "history": 0.4, "image": 0.1}
+
+
+async def _request(client: httpx.AsyncClient, endpoint: str, token: str, photo: bytes, rng: random.Random):
+    headers = {"Authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    try:
+        if endpoint == "text":
+            response = await client.post("/analyze/text", json={"symptoms": _symptom_text(rng)}, headers=headers)
+        elif endpoint == "image":
+            files = {"image": ("photo.jpg", photo, "image/jpeg")}
+            response = await client.post("/analyze/image", data={"symptoms": _symptom_text(rng)}, files=files, headers=headers)
+        else:
+            response = await client.get("/history", params={"limit": 20}, headers=headers)
+        status = response.status_code
+    except httpx.HTTPError:
+        status = None
+    return status, time.perf_counter() - start
+
+
+async def _noisy(client, token: str, photos: list, concurrency: int, pause: float, until: float, samples: list):
+    rng = random.Random(7)
+
+    async def worker():
+        while time.perf_counter() < until:
+            status, seconds = await _request(client, "image", token, rng.choice(photos), rng)
+            samples.append((status, seconds))
+            if status is None or status >= 400:
+                await asyncio.sleep(pause)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def _quiet(client, tokens: list, photos: list, rps: float, duration: float, samples: dict):
+    rng = random.Random(1)
+    names, weights = zip(*QUIET_MIX.items())
+    tasks = []
+    begin = time.perf_counter()
+    next_at = 0.0
+
+    async def one(endpoint: str, token: str):
+        samples[endpoint].append(await _request(client, endpoint, token, rng.choice(photos), rng))
+
+    while True:
+        next_at += rng.expovariate(rps)
+        if next_at >= duration:
+            break
+        delay = begin + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(rng.choices(names, weights)[0], rng.choice(tokens))))
+    await asyncio.gather(*tasks)
+
+
+async def _run(args, url: str, process: subprocess.Popen) -> dict:
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        await _wait_until_up(client, process)
+        tokens = []
+        for i in range(args.quiet_users + 1):
+            email, password = f"tenant{i}@example.com", f"tenant-password-{i}"
+            await client.post("/signup", json={"name": f"Tenant {i}", "email": email, "password": password})
+            response = await client.post("/login", data={"username": email, "password": password})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+        photos = [_photo(seed) for seed in range(5)]
+
+        noisy_samples = []
+        quiet_samples = {name: [] for name in QUIET_MIX}
+        start = time.perf_counter()
+        # The noisy user gets a head start so the quiet traffic meets a saturated service.
+        noisy = asyncio.ensure_future(_noisy(client, tokens[0], photos, args.noisy_concurrency, args.noisy_pause,
+                                             start + args.duration + 2, noisy_samples))
+        await asyncio.sleep(2)
+        await _quiet(client, tokens[1:], photos, args.quiet_rps, args.duration, quiet_samples)
+        await noisy
+        elapsed = time.perf_counter() - start
+    return {
+        "quiet": {name: _endpoint_report(samples, args.duration) for name, samples in quiet_samples.items()},
+        "noisy": _endpoint_report(noisy_samples, elapsed),
+    }
+
+
+def run_once(args, admission: bool) -> dict:
+    geoapify = FakeGeoapify(LatencyProfile(0.15))
+    supabase = FakeSupabase(LatencyProfile(args.supabase_ms / 1000), LatencyProfile(args.storage_ms / 1000))
+    servers = [FakeServer(geoapify.app).start(), FakeServer(supabase.app).start()]
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="load_admission_")
+    env = dict(
+        os.environ,
+        GEOAPIFY_BASE_URL=f"{servers[0].url}/v2/places",
+        SUPABASE_URL=servers[1].url,
+        HISTORY_JOURNAL_PATH=os.path.join(workdir, "history_journal.jsonl"),
+        ADMISSION_ENABLED=str(admission).lower(),
+        # Every request is a fresh analysis; the cache would hide the contention.
+        ANALYSIS_CACHE_ENABLED="false",
+    )
+    command = [sys.executable, "-m", "benchmarks.fake_app", "--port", str(port), "--gemini-ms", str(args.gemini_ms)]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    try:
+        return asyncio.run(_run(args, f"http://127.0.0.1:{port}", process))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        for server in servers:
+            server.stop()
+
+
+def _row(label: str, report: dict) -> str:
+    statuses = ", ".join(f"{code}: {count}" for code, count in sorted(report["statuses"].items()) if code != "200")
+    return (f"{label:<28} {report['sent']:>6} {report['throughput_rps']:>7.1f} {report['error_rate']:>7.1%} "
+            f"{report['p50_ms']:>8.0f} {report['p99_ms']:>8.0f}  {statuses}")
+
+
+def main(args):
+    print(f"noisy user: {args.noisy_concurrency} concurrent image requests; {args.quiet_users} quiet users at "
+          f"{args.quiet_rps:.0f} req/s {QUIET_MIX}; gemini {args.gemini_ms:.0f} ms, {args.duration:.0f} s per run")
+    results = {admission: run_once(args, admission) for admission in (False, True)}
+    print(f"{'':<28} {'sent':>6} {'ok/s':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}  non-200")
+    for admission, result in results.items():
+        mode = "admission on" if admission else "admission off"
+        for name, report in result["quiet"].items():
+            print(_row(f"{mode} quiet {name}", report))
+        print(_row(f"{mode} noisy image", result["noisy"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--noisy-concurrency", type=int, default=64)
+    parser.add_argument("--noisy-pause", type=float, default=1.0, help="seconds the noisy user waits after a rejection")
+    parser.add_argument("--quiet-users", type=int, default=10)
+    parser.add_argument("--quiet-rps", type=float, default=8.0)
+    parser.add_argument("--gemini-ms", type=float, default=800.0)
+    parser.add_argument("--supabase-ms", type=float, default=20.0)
+    parser.add_argument("--storage-ms", type=float, default=60.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,173 @@
+"""
+Load test: throughput of the multi-worker mode from 1 to N worker processes.
+
+Same stack as benchmarks/load_service.py (real app in a subprocess, localhost
+Geoapify/Supabase fakes, FakeGenerativeModel), started through serve.py's
+worker setup, so with more than one worker the analysis, geo, principal and
+history-page caches live in the shared SQLite tier. For each worker count the
+app is saturated by `--client-procs` load-generator processes, each keeping
+`--connections` requests in flight back to back: text analyses with a
+location (a fixed set of `--texts` symptom descriptions, so after the warm-up
+every analysis and hospital lookup is a cache hit) and first /history pages.
+That is the CPU-bound part of the service, the part extra workers parallelize.
+
+Admission control is off: a closed loop at full speed would mostly measure
+the per-user quotas. The generators and the fakes use CPU too, so the scaling
+only shows while workers + client processes fit in the available cores.
+
+    python -m benchmarks.load_scaling --workers 1,2,4 --client-procs 2 --duration 15
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from benchmarks.fakes import FakeGeoapify, FakeServer, FakeSupabase, LatencyProfile, free_port
+from benchmarks.load_service import CLINICS, _endpoint_report, _symptom_text, _wait_until_up
+from serve import available_cpus
+
+import httpx # type: ignore
+
+MIX = {"text": 0.7, "history": 0.3}
+
+
+async def _closed_loop(url: str, tokens: list, texts: list, connections: int, duration: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    names, weights = zip(*MIX.items())
+    samples = {name: [] for name in MIX}
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        until = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < until:
+                endpoint = rng.choices(names, weights)[0]
+                headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+                start = time.perf_counter()
+                try:
+                    if endpoint == "text":
+                        latitude, longitude = rng.choice(CLINICS)
+                        body = {"symptoms": rng.choice(texts), "latitude": latitude, "longitude": longitude}
+                        response = await client.post("/analyze/text", json=body, headers=headers)
+                    else:
+                        response = await client.get("/history", params={"limit": 20}, headers=headers)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = None
+                samples[endpoint].append((status, time.perf_counter() - start))
+
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    return samples
+
+
+def _generator(args: tuple) -> dict:
+    """One load-generator process (picklable entry point for the pool)."""
+    return asyncio.run(_closed_loop(*args))
+
+
+async def _prepare(url: str, process: subprocess.Popen, users: int, texts: list) -> list:
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        await _wait_until_up(client, process)
+        tokens = []
+        for i in range(users):
+            email, password = f"scale{i}@example.com", f"scale-password-{i}"
+            await client.post("/signup", json={"name": f"Scale {i}", "email": email, "password": password})
+            response = await client.post("/login", data={"username": email, "password": password})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+        # Fill the analysis and geo caches, so the measured run is all hits.
+        headers = {"Authorization": f"Bearer {tokens[0]}"}
+        for i, text in enumerate(texts):
+            latitude, longitude = CLINICS[i % len(CLINICS)]
+            await client.post("/analyze/text", json={"symptoms": text, "latitude": latitude, "longitude": longitude},
+                              headers=headers)
+        for latitude, longitude in CLINICS:
+            await client.post("/analyze/text", json={"symptoms": texts[0], "latitude": latitude, "longitude": longitude},
+                              headers=headers)
+    return tokens
+
+
+def run_once(args, workers: int, texts: list) -> dict:
+    geoapify = FakeGeoapify(LatencyProfile(0.05))
+    supabase = FakeSupabase(LatencyProfile(args.supabase_ms / 1000), LatencyProfile(0.05))
+    servers = [FakeServer(geoapify.app).start(), FakeServer(supabase.app).start()]
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="load_scaling_")
+    env = dict(
+        os.environ,
+        GEOAPIFY_BASE_URL=f"{servers[0].url}/v2/places",
+        SUPABASE_URL=servers[1].url,
+        HISTORY_JOURNAL_PATH=os.path.join(workdir, "history_journal.jsonl"),
+        SHARED_CACHE_DIR=os.path.join(workdir, "shared_cache"),
+        ADMISSION_ENABLED="false",
+        METRICS_ENABLED="false",
+        STARTUP_PREWARM="false",
+    )
+    command = [sys.executable, "-m", "benchmarks.fake_app", "--port", str(port), "--gemini-ms", "50",
+               "--workers", str(workers)]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        tokens = asyncio.run(_prepare(url, process, args.users, texts))
+        jobs = [(url, tokens, texts, args.connections, args.duration, seed) for seed in range(args.client_procs)]
+        with multiprocessing.get_context("spawn").Pool(args.client_procs) as pool:
+            results = pool.map(_generator, jobs)
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+        for server in servers:
+            server.stop()
+    samples = [sample for result in results for endpoint_samples in result.values() for sample in endpoint_samples]
+    report = _endpoint_report(samples, args.duration)
+    report["per_endpoint_rps"] = {name: sum(len(result[name]) for result in results) / args.duration for name in MIX}
+    return report
+
+
+def main(args):
+    counts = [int(n) for n in args.workers.split(",")] if args.workers else _default_counts(args.client_procs)
+    cpus = available_cpus()
+    rng = random.Random(3)
+    texts = [_symptom_text(rng) for _ in range(args.texts)]
+    print(f"{cpus} CPUs available; {args.client_procs} load generators x {args.connections} connections, "
+          f"{args.duration:.0f} s per run, mix {MIX}")
+    if max(counts) + args.client_procs > cpus:
+        print(f"note: {max(counts)} workers + {args.client_procs} generators exceed {cpus} CPUs; "
+              "expect the scaling to flatten once the cores are used up")
+    print(f"{'workers':>7} {'ok/s':>8} {'speedup':>8} {'per-worker':>11} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    baseline = None
+    for workers in counts:
+        report = run_once(args, workers, texts)
+        baseline = baseline or report["throughput_rps"]
+        speedup = report["throughput_rps"] / baseline if baseline else 0.0
+        print(f"{workers:>7} {report['throughput_rps']:>8.0f} {speedup:>7.2f}x {speedup / workers:>10.0%} "
+              f"{report['error_rate']:>7.1%} {report['p50_ms']:>8.1f} {report['p99_ms']:>8.1f}")
+
+
+def _default_counts(client_procs: int) -> list:
+    # Powers of two up to the CPUs left over by the load generators.
+    limit = max(1, available_cpus() - client_procs)
+    counts = [1]
+    while counts[-1] * 2 <= limit:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default: 1, 2, 4, ... up to the spare CPUs)")
+    parser.add_argument("--client-procs", type=int, default=max(1, available_cpus() // 2))
+    parser.add_argument("--connections", type=int, default=32, help="requests in flight per load generator")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--texts", type=int, default=50)
+    parser.add_argument("--supabase-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,330 @@
+"""
+Load test: the whole service at a target request rate, against localhost fakes.
+
+Starts FakeGeoapify and FakeSupabase (benchmarks/fakes.py) on localhost, runs
+the real app in a subprocess with the Gemini SDK replaced by
+FakeGenerativeModel, signs up `--users` accounts, then sends an open-loop
+(Poisson) mix of /login, /analyze/text, /analyze/image and /history requests
+at `--rps` for `--duration` seconds. Every upstream's latency and error rate
+is configurable.
+
+Reports per-endpoint throughput, errors and p50/p95/p99, plus the app's
+event-loop blocking time (from the event_loop_lag histogram on /metrics),
+and saves everything as JSON (with the git commit) under benchmarks/results/.
+Compare two runs with --compare:
+
+    python -m benchmarks.load_service --rps 20 --duration 30
+    python -m benchmarks.load_service --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import benchmarks.standins  # noqa: F401  (dummy settings for the config import)
+from benchmarks.fakes import FakeGeoapify, FakeServer, FakeSupabase, LatencyProfile, free_port
+from benchmarks.standins import percentile
+
+import httpx # type: ignore
+from PIL import Image
+
+ENDPOINTS = ("login", "text", "image", "history")
+SYMPTOMS = [
+    "fever", "dry cough", "headache", "sore throat", "runny nose", "nausea", "vomiting", "diarrhea", "itchy rash",
+    "lower back pain", "dizziness", "fatigue", "chills", "shortness of breath", "chest tightness", "joint pain",
+    "blurred vision", "ear ache", "stomach cramps", "loss of appetite", "muscle aches", "sneezing", "swollen glands",
+]
+DURATIONS = ["since this morning", "for two days", "for a week", "on and off for a month", "since yesterday evening"]
+CLINICS = [(12.9716, 77.5946), (19.0760, 72.8777), (28.6139, 77.2090), (13.0827, 80.2707), (22.5726, 88.3639)]
+LAG_LINE = re.compile(r'^medilens_event_loop_lag_seconds_(bucket|sum|count)(?:\{le="([^"]+)"\})? (\S+)$')
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _symptom_text(rng: random.Random) -> str:
+    return f"{', '.join(rng.sample(SYMPTOMS, rng.randint(2, 5)))} {rng.choice(DURATIONS)}"
+
+
+def _photo(seed: int) -> bytes:
+    rng = random.Random(seed)
+    image = Image.effect_noise((640, 480), rng.uniform(20, 80)).convert("RGB")
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+def _loop_lag(metrics_text: str) -> dict:
+    """Parses the event_loop_lag histogram out of a /metrics scrape."""
+    lag = {"buckets": {}, "sum": 0.0, "count": 0}
+    for line in metrics_text.splitlines():
+        match = LAG_LINE.match(line)
+        if not match:
+            continue
+        kind, le, value = match.groups()
+        if kind == "bucket":
+            lag["buckets"][le] = float(value)
+        else:
+            lag[kind] = float(value)
+    return lag
+
+
+def _lag_report(before: dict, after: dict, elapsed: float) -> dict:
+    samples = after["count"] - before["count"]
+    blocked = after["sum"] - before["sum"]
+    # Upper bound of the bucket holding the 99th / 100th percentile of the new samples.
+    p99 = worst = None
+    for le, cumulative in after["buckets"].items():
+        new = cumulative - before["buckets"].get(le, 0)
+        if p99 is None and samples and new >= 0.99 * samples:
+            p99 = le
+        if worst is None and samples and new >= samples:
+            worst = le
+    return {"samples": int(samples), "blocked_seconds": blocked, "blocked_share": blocked / elapsed if elapsed else 0.0,
+            "p99_le": p99, "max_le": worst}
+
+
+class LoadGenerator:
+    def __init__(self, client: httpx.AsyncClient, tokens: list, users: list, photos: list, seed: int):
+        self.client = client
+        self.tokens = tokens
+        self.users = users
+        self.photos = photos
+        self.rng = random.Random(seed)
+        self.samples = {name: [] for name in ENDPOINTS}  # (status or None, seconds)
+
+    def _location(self) -> dict:
+        if self.rng.random() < 0.5:
+            return {}
+        lat, lon = self.rng.choice(CLINICS)
+        return {"latitude": lat + self.rng.uniform(-0.05, 0.05), "longitude": lon + self.rng.uniform(-0.05, 0.05)}
+
+    async def one(self, endpoint: str):
+        index = self.rng.randrange(len(self.tokens))
+        headers = {"Authorization": f"Bearer {self.tokens[index]}"}
+        start = time.perf_counter()
+        try:
+            if endpoint == "login":
+                email, password = self.users[index]
+                response = await self.client.post("/login", data={"username": email, "password": password})
+            elif endpoint == "text":
+                body = {"symptoms": _symptom_text(self.rng), **self._location()}
+                response = await self.client.post("/analyze/text", json=body, headers=headers)
+            elif endpoint == "image":
+                form = {"symptoms": _symptom_text(self.rng), **{k: str(v) for k, v in self._location().items()}}
+                files = {"image": ("photo.jpg", self.rng.choice(self.photos), "image/jpeg")}
+                response = await self.client.post("/analyze/image", data=form, files=files, headers=headers)
+            else:
+                response = await self.client.get("/history", params={"limit": 20}, headers=headers)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+        self.samples[endpoint].append((status, time.perf_counter() - start))
+
+    async def run(self, rps: float, duration: float, mix: dict):
+        """Open-loop Poisson arrivals; returns how late the generator dispatched its worst request."""
+        names, weights = zip(*mix.items())
+        tasks = []
+        worst_dispatch_lag = 0.0
+        begin = time.perf_counter()
+        next_at = 0.0
+        while True:
+            next_at += self.rng.expovariate(rps)
+            if next_at >= duration:
+                break
+            delay = begin + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                worst_dispatch_lag = max(worst_dispatch_lag, -delay)
+            tasks.append(asyncio.ensure_future(self.one(self.rng.choices(names, weights)[0])))
+        await asyncio.gather(*tasks)
+        return worst_dispatch_lag
+
+
+def _endpoint_report(samples: list, duration: float) -> dict:
+    ok = [seconds for status, seconds in samples if status is not None and status < 400]
+    statuses = {}
+    for status, _ in samples:
+        key = str(status) if status is not None else "transport_error"
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        "sent": len(samples),
+        "ok": len(ok),
+        "error_rate": 1 - len(ok) / len(samples) if samples else 0.0,
+        "throughput_rps": len(ok) / duration,
+        "p50_ms": percentile(ok, 50) * 1e3,
+        "p95_ms": percentile(ok, 95) * 1e3,
+        "p99_ms": percentile(ok, 99) * 1e3,
+        "statuses": statuses,
+    }
+
+
+def _print_report(result: dict):
+    print(f"{'endpoint':>9} {'sent':>6} {'ok/s':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in result["endpoints"].items():
+        print(f"{name:>9} {row['sent']:>6} {row['throughput_rps']:>7.1f} {row['error_rate']:>7.1%} "
+              f"{row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f}")
+    lag = result["event_loop"]
+    print(f"app event loop: blocked {lag['blocked_seconds'] * 1e3:.0f} ms over {lag['samples']} samples "
+          f"({lag['blocked_share']:.2%} of the run), p99 lag <= {lag['p99_le']} s, max <= {lag['max_le']} s")
+    print(f"generator dispatch lag (should be ~0): {result['generator_dispatch_lag_ms']:.1f} ms")
+
+
+async def _wait_until_up(client: httpx.AsyncClient, process: subprocess.Popen):
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("the app exited during startup")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("the app did not start within 60 s")
+
+
+async def run(args, app_url: str, process: subprocess.Popen) -> dict:
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=args.timeout) as client:
+        await _wait_until_up(client, process)
+        users = [(f"load{i}@example.com", f"load-password-{i}") for i in range(args.users)]
+        tokens = []
+        for i, (email, password) in enumerate(users):
+            await client.post("/signup", json={"name": f"Load {i}", "email": email, "password": password})
+            response = await client.post("/login", data={"username": email, "password": password})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+        photos = [_photo(seed) for seed in range(5)]
+
+        generator = LoadGenerator(client, tokens, users, photos, seed=args.seed)
+        before = _loop_lag((await client.get("/metrics")).text)
+        start = time.perf_counter()
+        dispatch_lag = await generator.run(args.rps, args.duration, args.mix)
+        elapsed = time.perf_counter() - start
+        after = _loop_lag((await client.get("/metrics")).text)
+
+    return {
+        "endpoints": {name: _endpoint_report(samples, elapsed) for name, samples in generator.samples.items() if samples},
+        "event_loop": _lag_report(before, after, elapsed),
+        "elapsed_seconds": elapsed,
+        "generator_dispatch_lag_ms": dispatch_lag * 1e3,
+    }
+
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def main(args):
+    geoapify = FakeGeoapify(LatencyProfile(args.geoapify_ms / 1000, error_rate=args.geoapify_errors, error_status=500))
+    supabase = FakeSupabase(
+        LatencyProfile(args.supabase_ms / 1000, error_rate=args.supabase_errors, error_status=503),
+        LatencyProfile(args.storage_ms / 1000, error_rate=args.supabase_errors, error_status=503),
+    )
+    servers = [FakeServer(geoapify.app).start(), FakeServer(supabase.app).start()]
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="load_service_")
+    env = dict(
+        os.environ,
+        GEOAPIFY_BASE_URL=f"{servers[0].url}/v2/places",
+        SUPABASE_URL=servers[1].url,
+        METRICS_ENABLED="true",
+        METRICS_LOOP_LAG_INTERVAL_SECONDS=str(args.lag_interval),
+        HISTORY_JOURNAL_PATH=os.path.join(workdir, "history_journal.jsonl"),
+    )
+    command = [sys.executable, "-m", "benchmarks.fake_app", "--port", str(port), "--gemini-ms", str(args.gemini_ms),
+               "--gemini-errors", str(args.gemini_errors)]
+    process = subprocess.Popen(command, env=env)
+    try:
+        print(f"{args.rps:.0f} req/s for {args.duration:.0f} s, mix {args.mix}; gemini {args.gemini_ms:.0f} ms, "
+              f"geoapify {args.geoapify_ms:.0f} ms, supabase {args.supabase_ms:.0f} ms (storage {args.storage_ms:.0f} ms)")
+        result = asyncio.run(run(args, f"http://127.0.0.1:{port}", process))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        for server in servers:
+            server.stop()
+
+    result = {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+        "upstream_requests": {"geoapify": geoapify.requests, "supabase": supabase.requests},
+        **result,
+    }
+    _print_report(result)
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"load_{result['commit'] or 'nogit'}_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"saved {output}")
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['commit']}{' (dirty)' if old['dirty'] else ''} {old['timestamp']}")
+    print(f"new: {new['commit']}{' (dirty)' if new['dirty'] else ''} {new['timestamp']}")
+    if old["config"] != new["config"]:
+        changed = sorted(k for k in set(old["config"]) | set(new["config"]) if old["config"].get(k) != new["config"].get(k))
+        print(f"warning: configs differ in {', '.join(changed)}")
+    print(f"{'endpoint':>9} {'metric':>15} {'old':>9} {'new':>9} {'change':>8}")
+    for name in new["endpoints"]:
+        if name not in old["endpoints"]:
+            continue
+        for metric in ("throughput_rps", "error_rate", "p50_ms", "p95_ms", "p99_ms"):
+            a, b = old["endpoints"][name][metric], new["endpoints"][name][metric]
+            change = f"{(b - a) / a:+.1%}" if a else "-"
+            print(f"{name:>9} {metric:>15} {a:>9.2f} {b:>9.2f} {change:>8}")
+    a, b = old["event_loop"]["blocked_seconds"], new["event_loop"]["blocked_seconds"]
+    print(f"{'event loop':>9} {'blocked_ms':>15} {a * 1e3:>9.1f} {b * 1e3:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("login=0.1,text=0.5,image=0.1,history=0.3"))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--gemini-ms", type=float, default=800.0)
+    parser.add_argument("--gemini-errors", type=float, default=0.0)
+    parser.add_argument("--geoapify-ms", type=float, default=150.0)
+    parser.add_argument("--geoapify-errors", type=float, default=0.0)
+    parser.add_argument("--supabase-ms", type=float, default=20.0)
+    parser.add_argument("--storage-ms", type=float, default=60.0)
+    parser.add_argument("--supabase-errors", type=float, default=0.0)
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="app event-loop lag sampling interval")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/load_<commit>_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved runs instead")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        main(args)
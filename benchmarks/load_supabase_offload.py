@@ -0,0 +1,110 @@
+"""
+Load test: protected endpoints against a Supabase stand-in that adds DB latency.
+
+The first /history page is served from the history page cache once warm, so
+the endpoints measured by default are the ones that still query Supabase on
+every request: later /history pages (a keyset select, fetched with the first
+page's cursor) and single /history/{id} entries. Admission control is off, so
+the per-user quotas don't turn the run into a 429 count. With the calls on
+the event loop, latency grows with concurrency (every request waits for every
+other request's sleep); with the thread-pool data layer p99 stays at roughly
+the stand-in delay until the pool is saturated. `--endpoints first` adds the
+cached first page for comparison.
+
+    python -m benchmarks.load_supabase_offload --delay 0.2 --concurrency 1 8 16
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.standins import FakeSupabaseClient, percentile
+
+import httpx # type: ignore
+from config import settings
+from main import app
+from security import create_access_token
+from services.supabase_service import supabase_service
+
+ENDPOINTS = ("page", "entry", "first")
+PAGE_SIZE = 20
+
+
+def _seed_history(user_id: int, rows: int) -> list:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": i + 1,
+            "user_id": user_id,
+            "created_at": (start + timedelta(minutes=i)).isoformat(),
+            "symptom_text": f"symptoms {i + 1}",
+            "image_url": None,
+            "response_data": {"possible_conditions": [{"condition": "Common cold"}]},
+        }
+        for i in range(rows)
+    ]
+
+
+async def run_level(client: httpx.AsyncClient, token: str, endpoints, cursor: str, entries: int,
+                    concurrency: int, rounds: int):
+    latencies = {endpoint: [] for endpoint in endpoints}
+    rng = random.Random(concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def one(endpoint: str):
+        start = time.perf_counter()
+        if endpoint == "page":
+            response = await client.get("/history", params={"limit": PAGE_SIZE, "cursor": cursor}, headers=headers)
+        elif endpoint == "entry":
+            response = await client.get(f"/history/{rng.randint(1, entries)}", headers=headers)
+        else:
+            response = await client.get("/history", params={"limit": PAGE_SIZE}, headers=headers)
+        response.raise_for_status()
+        latencies[endpoint].append(time.perf_counter() - start)
+
+    for _ in range(rounds):
+        await asyncio.gather(*(one(endpoints[i % len(endpoints)]) for i in range(concurrency)))
+    return latencies
+
+
+async def main(delay: float, levels, rounds: int, endpoints, entries: int):
+    settings.ADMISSION_ENABLED = False
+    supabase_service.initialize_client()
+    supabase_service.client = FakeSupabaseClient(delay=delay)
+    supabase_service.client.db["users"] = [{"id": 1, "name": "Bench", "email": "bench@example.com", "hashed_password": "x"}]
+    supabase_service.client.db["query_history"] = _seed_history(1, entries)
+    token = create_access_token(data={"sub": "bench@example.com"})
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = await client.get("/history", params={"limit": PAGE_SIZE}, headers={"Authorization": f"Bearer {token}"})
+        first.raise_for_status()
+        cursor = first.json()["next_cursor"]
+        print(f"DB stand-in delay: {delay * 1000:.0f} ms per call; endpoints: {', '.join(endpoints)}")
+        print(f"{'concurrency':>11} {'endpoint':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        for concurrency in levels:
+            start = time.perf_counter()
+            latencies = await run_level(client, token, endpoints, cursor, entries, concurrency, rounds)
+            elapsed = time.perf_counter() - start
+            for endpoint, samples in latencies.items():
+                if not samples:
+                    continue
+                print(
+                    f"{concurrency:>11} {endpoint:>8} {percentile(samples, 50) * 1000:>8.1f} "
+                    f"{percentile(samples, 99) * 1000:>8.1f} {len(samples) / elapsed:>8.1f}"
+                )
+    supabase_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=["page", "entry"],
+                        help="page: a later /history page (keyset select), entry: /history/{id}, "
+                             "first: the first /history page (cached)")
+    parser.add_argument("--entries", type=int, default=200, help="history rows seeded for the user")
+    args = parser.parse_args()
+    asyncio.run(main(args.delay, args.concurrency, args.rounds, args.endpoints, args.entries))
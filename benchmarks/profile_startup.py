@@ -0,0 +1,119 @@
+"""
+Profile: cold-start cost of the app, eager vs lazy imports.
+
+Two measurements per mode (LAZY_IMPORTS=false, then true):
+
+  * `python -X importtime -c "import main"` in a fresh interpreter, reported
+    as total import time plus the most expensive top-level packages (self
+    time summed over each package's modules, so nothing is double counted);
+  * time-to-first-200: spawn `uvicorn main:app` and poll `GET /` until it
+    answers, median over `--runs` cold starts, checked against `--target-ms`.
+    In lazy mode it also reports when the background prewarm finished (every
+    deferred module loaded, per /metrics).
+
+    python -m benchmarks.profile_startup --runs 5 --target-ms 1500
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import benchmarks.standins  # noqa: F401  (dummy settings, inherited by the subprocesses)
+import httpx # type: ignore
+
+from benchmarks.fakes import free_port
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| *(\S+)")
+
+
+def _env(lazy: bool) -> dict:
+    return dict(os.environ, LAZY_IMPORTS=str(lazy).lower())
+
+
+def import_profile(lazy: bool):
+    """(total seconds, {top-level package: self seconds}) for `import main`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            env=_env(lazy), capture_output=True, text=True, check=True)
+    packages = defaultdict(float)
+    total = 0.0
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == "main":
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def _wait_until(predicate, deadline: float, process: subprocess.Popen) -> float:
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            if predicate():
+                return time.monotonic()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError("timed out waiting for the app")
+
+
+def _warm(client: httpx.Client) -> bool:
+    text = client.get("/metrics").text
+    values = dict(line.split(" ", 1) for line in text.splitlines()
+                  if line.startswith(("medilens_lazy_imports_registered", "medilens_lazy_imports_loaded")))
+    return values.get("medilens_lazy_imports_loaded") == values.get("medilens_lazy_imports_registered")
+
+
+def cold_start(lazy: bool, timeout: float = 60.0):
+    """(seconds to first 200 on /, seconds until prewarm finished or None)."""
+    port = free_port()
+    # One client for all polls: a fresh one per poll would spend its own CPU on TLS setup.
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1)
+    start = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=_env(lazy), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        ready = _wait_until(lambda: client.get("/").status_code == 200, deadline, process)
+        warm = _wait_until(lambda: _warm(client), deadline, process) if lazy else None
+        return ready - start, (warm - start if warm is not None else None)
+    finally:
+        client.close()
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(runs: int, top: int, target_ms: float):
+    for lazy in (False, True):
+        mode = "lazy" if lazy else "eager"
+        total, packages = import_profile(lazy)
+        ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        print(f"[{mode}] import main: {total * 1000:.0f} ms; top packages by self time:")
+        for name, seconds in ranked:
+            print(f"    {name:<24} {seconds * 1000:7.1f} ms")
+
+        starts = [cold_start(lazy) for _ in range(runs)]
+        ready = statistics.median(s[0] for s in starts) * 1000
+        verdict = "meets" if ready <= target_ms else "misses"
+        line = f"[{mode}] time to first 200 on /: median {ready:.0f} ms over {runs} runs ({verdict} the {target_ms:.0f} ms target)"
+        if lazy:
+            line += f"; prewarm done at {statistics.median(s[1] for s in starts) * 1000:.0f} ms"
+        print(line + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--target-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+    main(args.runs, args.top, args.target_ms)
@@ -0,0 +1,161 @@
+"""
+Local stand-ins for the external services, used by the benchmark scripts.
+
+Nothing in here talks to the network: the fakes mimic just enough of the
+supabase-py client surface for `SupabaseService` to run unchanged.
+"""
+import asyncio
+import os
+import re
+import time
+
+# config.Settings requires these at import time; benchmarks never use real keys.
+for _name in ("GOOGLE_API_KEY", "GEOAPIFY_API_KEY", "SECRET_KEY"):
+    os.environ.setdefault(_name, "benchmark")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+# Shaped like a JWT so supabase-py's key validation accepts it.
+os.environ.setdefault("SUPABASE_KEY", "benchmark.benchmark.benchmark")
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+# The only `or` filter SupabaseService sends: the /history keyset condition.
+_KEYSET = re.compile(r'created_at\.lt\."([^"]+)",and\(created_at\.eq\."[^"]+",id\.lt\.(\d+)\)')
+
+
+class FakeQuery:
+    """Chainable query builder that sleeps `delay` seconds on execute()."""
+
+    def __init__(self, db, table: str, delay: float):
+        self._db = db
+        self._table = table
+        self._delay = delay
+        self._filters = []
+        self._keyset = None
+        self._order = []
+        self._insert = None
+        self._update = None
+        self._limit = None
+
+    def select(self, *_columns, **_kwargs):
+        return self
+
+    def insert(self, row):
+        self._insert = row
+        return self
+
+    def update(self, values):
+        self._update = values
+        return self
+
+    def eq(self, column, value):
+        self._filters.append((column, value))
+        return self
+
+    def or_(self, filters: str):
+        keyset = _KEYSET.fullmatch(filters)
+        if keyset is None:
+            raise NotImplementedError(f"FakeQuery only understands the history keyset filter, not {filters!r}")
+        self._keyset = (keyset.group(1), int(keyset.group(2)))
+        return self
+
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def execute(self):
+        time.sleep(self._delay)
+        rows = self._db.setdefault(self._table, [])
+        if self._insert is not None:
+            new_rows = self._insert if isinstance(self._insert, list) else [self._insert]
+            for row in new_rows:
+                row = dict(row, id=len(rows) + 1)
+                rows.append(row)
+            return FakeResponse(new_rows)
+        result = [r for r in rows if all(r.get(c) == v for c, v in self._filters)]
+        if self._keyset is not None:
+            result = [r for r in result if (r["created_at"], r["id"]) < self._keyset]
+        if self._update is not None:
+            for row in result:
+                row.update(self._update)
+        # Stable sorts, last key first, give the multi-column order.
+        for column, desc in reversed(self._order):
+            result.sort(key=lambda r: r[column], reverse=desc)
+        if self._limit is not None:
+            result = result[: self._limit]
+        return FakeResponse(result)
+
+
+class FakeBucket:
+    def __init__(self, delay: float):
+        self._delay = delay
+
+    def upload(self, path, file, file_options=None):
+        time.sleep(self._delay)
+        return {"Key": path}
+
+    def get_public_url(self, path):
+        return f"http://storage.local/symptom_images/{path}"
+
+
+class FakeStorage:
+    def __init__(self, delay: float):
+        self._delay = delay
+
+    def from_(self, _bucket):
+        return FakeBucket(self._delay)
+
+
+class FakeSupabaseClient:
+    """In-memory replacement for `supabase.Client` with a fixed per-call delay."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.db = {}
+        self.storage = FakeStorage(delay)
+
+    def table(self, name: str):
+        return FakeQuery(self.db, name, self.delay)
+
+
+class LoopLagMonitor:
+    """Samples how late a periodic timer fires, i.e. how long the loop was blocked."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    @property
+    def max_lag(self) -> float:
+        return max(self.lags, default=0.0)
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -9,6 +10,177 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Supabase data layer: blocking client calls run on a bounded thread pool
+    # over one pooled HTTP/2 connection set.
+    SUPABASE_MAX_WORKERS: int = 16
+    SUPABASE_MAX_CONNECTIONS: int = 20
+    SUPABASE_HTTP2: bool = True
+    SUPABASE_TIMEOUT_SECONDS: float = 10.0
+
+    # Authenticated-principal cache used by get_current_user.
+    PRINCIPAL_CACHE_SIZE: int = 10_000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0
+    TOKEN_CACHE_ENABLED: bool = True
+
+    # Password hashing pool ("thread" or "process"); workers default to the CPU count.
+    PASSWORD_HASH_POOL: str = "thread"
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # Per-stage timeouts for the /analyze request pipeline.
+    ANALYSIS_TIMEOUT_SECONDS: float = 60.0
+    HOSPITALS_TIMEOUT_SECONDS: float = 4.0
+    UPLOAD_TIMEOUT_SECONDS: float = 20.0
+    HISTORY_TIMEOUT_SECONDS: float = 10.0
+
+    # Write-behind query history (services/history_writer.py). Rows are queued,
+    # journaled to HISTORY_JOURNAL_PATH and bulk-inserted in the background.
+    HISTORY_WRITE_BEHIND: bool = True
+    HISTORY_JOURNAL_PATH: Optional[str] = "history_journal.jsonl"
+    HISTORY_QUEUE_MAX: int = 10_000
+    HISTORY_BATCH_SIZE: int = 100
+    HISTORY_FLUSH_INTERVAL_SECONDS: float = 0.5
+    HISTORY_RETRY_MAX_BACKOFF_SECONDS: float = 30.0
+    HISTORY_RETRY_MAX_ATTEMPTS: int = 6
+    HISTORY_JOURNAL_COMPACT_BYTES: int = 16 * 1024 * 1024
+    HISTORY_DRAIN_TIMEOUT_SECONDS: float = 10.0
+
+    # /history pagination and the per-user first-page cache.
+    HISTORY_PAGE_SIZE: int = 20
+    HISTORY_MAX_PAGE_SIZE: int = 100
+    HISTORY_CACHE_TTL_SECONDS: float = 300.0
+    HISTORY_CACHE_MAX_USERS: int = 10_000
+
+    # Image uploads (services/image_processor.py). Uploads are capped at
+    # IMAGE_MAX_UPLOAD_BYTES, then downscaled to IMAGE_MAX_SIDE on the long edge
+    # and re-encoded before being stored and sent to the model.
+    IMAGE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    IMAGE_MAX_SIDE: int = 1024
+    IMAGE_FORMAT: str = "JPEG"
+    IMAGE_QUALITY: int = 85
+    IMAGE_WORKERS: Optional[int] = None
+    IMAGE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    IMAGE_CACHE_TTL_SECONDS: float = 3600.0
+    IMAGE_UPLOAD_CACHE_SIZE: int = 10_000
+
+    # /analyze/batch: items per request and concurrent model calls per batch.
+    BATCH_MAX_ITEMS: int = 500
+    BATCH_CONCURRENCY: int = 16
+
+    # Upstream protection (services/resilience.py): per-upstream concurrency
+    # caps and adaptive rate limits, plus shared retry and circuit-breaker settings.
+    GEMINI_MAX_CONCURRENCY: int = 32
+    GEMINI_RATE_PER_SECOND: float = 25.0
+    GEMINI_RATE_BURST: float = 50.0
+    GEOAPIFY_MAX_CONCURRENCY: int = 16
+    GEOAPIFY_RATE_PER_SECOND: float = 5.0
+    GEOAPIFY_RATE_BURST: float = 10.0
+    UPSTREAM_MAX_ATTEMPTS: int = 3
+    UPSTREAM_BACKOFF_BASE_SECONDS: float = 0.2
+    UPSTREAM_BACKOFF_MAX_SECONDS: float = 2.0
+    UPSTREAM_FAILURE_THRESHOLD: int = 5
+    UPSTREAM_RESET_SECONDS: float = 10.0
+
+    # Shared outbound HTTP pool and model handles (services/clients.py).
+    # GEMINI_JSON_MODE asks the model for application/json output; turn it off
+    # for models without JSON mode (the parser still strips fences and prose).
+    GEMINI_MODEL: str = "gemini-2.5-flash"
+    GEMINI_JSON_MODE: bool = True
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+
+    # Nearby-hospital search and its geohash tile cache ("memory" or "sqlite" backend).
+    # Overridable so load tests can point at a local stand-in (benchmarks/fakes.py).
+    # A tile fetches up to HOSPITALS_TILE_LIMIT places; callers its answer doesn't
+    # cover (cut off in a dense area) are looked up around their exact point.
+    GEOAPIFY_BASE_URL: str = "https://api.geoapify.com/v2/places"
+    HOSPITALS_SEARCH_RADIUS_METERS: float = 5000.0
+    HOSPITALS_LIMIT: int = 7
+    HOSPITALS_TILE_LIMIT: int = 50
+    GEO_CACHE_ENABLED: bool = True
+    GEO_CACHE_BACKEND: str = "memory"
+    GEO_CACHE_PATH: str = "geo_cache.sqlite3"
+    GEO_CACHE_PRECISION: int = 6
+    GEO_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    GEO_CACHE_MAX_ENTRIES: int = 50_000
+
+    # Geoapify category-set selection (services/place_query.py). A rejected set is
+    # skipped for HOSPITALS_CATEGORY_RECHECK_SECONDS. With hedging enabled, a query
+    # slower than that percentile of recent latency sends one duplicate request.
+    HOSPITALS_CATEGORY_RECHECK_SECONDS: float = 3600.0
+    HOSPITALS_HEDGE_ENABLED: bool = False
+    HOSPITALS_HEDGE_PERCENTILE: float = 95.0
+    HOSPITALS_HEDGE_MIN_SAMPLES: int = 20
+    HOSPITALS_HEDGE_MIN_DELAY_SECONDS: float = 0.05
+
+    # Hospital source: "remote" (Geoapify), "local" (offline index) or "local-then-remote".
+    # Build the index with: python -m services.facility_index dump.geojson <FACILITY_INDEX_PATH>
+    LOCATION_MODE: str = "remote"
+    FACILITY_INDEX_PATH: Optional[str] = None
+
+    # Symptom-analysis cache (byte-bounded LRU with TTL) and request coalescing.
+    ANALYSIS_CACHE_ENABLED: bool = True
+    ANALYSIS_CACHE_TTL_SECONDS: float = 6 * 3600
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 10_000
+    ANALYSIS_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Reuse of cached analyses for rephrasings with the same content words
+    # (services/similarity_index.py) in front of the analysis cache.
+    SIMILARITY_ENABLED: bool = True
+    SIMILARITY_MAX_ENTRIES: int = 100_000
+
+    # Admission control (services/admission.py) for the analyze and history
+    # endpoints. Two lanes, "cheap" (text analysis, history) and "expensive"
+    # (image analysis, batches), each with per-user token buckets (rate per
+    # second and burst; 429 when spent) and concurrency slots. Requests queue
+    # for a slot, up to ADMISSION_MAX_QUEUE across both lanes, and are shed with
+    # 503 rather than wait past the lane's queue timeout. The "sqlite" quota
+    # backend shares the buckets between the workers on one host. A batch spends
+    # ADMISSION_BATCH_ITEM_COST expensive-lane tokens per item (0.1: an item
+    # costs what a text analysis does in the cheap lane, at a tenth of the rate).
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_BACKEND: str = "memory"
+    ADMISSION_PATH: str = "admission.sqlite3"
+    ADMISSION_MAX_QUEUE: int = 256
+    ADMISSION_CHEAP_RATE: float = 5.0
+    ADMISSION_CHEAP_BURST: float = 20.0
+    ADMISSION_CHEAP_CONCURRENCY: int = 64
+    ADMISSION_CHEAP_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_EXPENSIVE_RATE: float = 0.5
+    ADMISSION_EXPENSIVE_BURST: float = 5.0
+    ADMISSION_EXPENSIVE_CONCURRENCY: int = 8
+    ADMISSION_EXPENSIVE_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    ADMISSION_BATCH_ITEM_COST: float = 0.1
+
+    # Metrics: /metrics in Prometheus text format. The analyze endpoints always
+    # list their pipeline stages in a Server-Timing header; METRICS_SERVER_TIMING
+    # adds each upstream call a request made.
+    METRICS_ENABLED: bool = True
+    METRICS_SERVER_TIMING: bool = False
+    METRICS_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+
+    # Cold start (services/lazy.py): the Gemini SDK, supabase, Pillow and jose
+    # are imported on first use. With STARTUP_PREWARM they are loaded, and the
+    # Gemini/Supabase clients built, in the background shortly after startup.
+    LAZY_IMPORTS: bool = True
+    STARTUP_PREWARM: bool = True
+    STARTUP_PREWARM_DELAY_SECONDS: float = 0.5
+
+    # Multi-worker serving (serve.py). WEB_CONCURRENCY worker processes, by default
+    # one per available CPU (affinity and cgroup quota) up to WEB_CONCURRENCY_AUTO_MAX;
+    # more takes an explicit WEB_CONCURRENCY. SIGHUP restarts them one at a time. With
+    # SHARED_CACHE_DIR set, the analysis, geo, principal and history-page caches
+    # live in SQLite (WAL) files in that directory, shared by every worker on the
+    # host; serve.py sets it when running more than one worker.
+    WEB_CONCURRENCY: Optional[int] = None
+    WEB_CONCURRENCY_AUTO_MAX: int = 4
+    WEB_GRACEFUL_TIMEOUT_SECONDS: float = 30.0
+    SHARED_CACHE_DIR: Optional[str] = None
+    SHARED_CACHE_TOUCH_SECONDS: float = 30.0
+
     model_config = SettingsConfigDict(env_file=".env")
 
 settings = Settings()
\ No newline at end of file
@@ -1,28 +1,68 @@
-from fastapi import Depends, HTTPException
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 
+from services.lazy import lazy_import, ensure_loaded
 from services.supabase_service import supabase_service
+from services.principal_cache import principal_cache
+from services.admission import admission
 from schemas import User
 from config import settings
 
+jwt = lazy_import("jose.jwt")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    payload = principal_cache.get_token_claims(token)
+    if payload is None:
+        await ensure_loaded(jwt)
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except jwt.JWTError:
             raise credentials_exception
-    except JWTError:
+        principal_cache.put_token_claims(token, payload)
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
-    
-    user_data = supabase_service.get_user_by_email(email=email)
+
+    user_data = await principal_cache.get_principal(email)
     if user_data is None:
-        raise credentials_exception
-    return User(**user_data)
\ No newline at end of file
+        user_data = await supabase_service.get_user_by_email(email=email)
+        if user_data is None:
+            raise credentials_exception
+        await principal_cache.put_principal(email, user_data, exp=payload.get("exp"))
+    return User(**user_data)
+
+def admitted(lane: str, cost: Optional[Callable[[Request], Awaitable[float]]] = None):
+    """
+    Like get_current_user, but also holds one of the user's admission slots in
+    `lane` until the response has been sent (streamed responses included).
+    `cost`, if given, prices the request in quota tokens (default 1).
+    """
+    async def current_user_with_slot(request: Request, current_user: User = Depends(get_current_user)):
+        tokens = await cost(request) if cost is not None else 1.0
+        async with admission.slot(current_user.id, lane, tokens):
+            yield current_user
+    return current_user_with_slot
+
+async def batch_cost(request: Request) -> float:
+    """
+    ADMISSION_BATCH_ITEM_COST per item of a /analyze/batch body. Dependencies
+    run before the body is validated, so a malformed one costs a single token
+    and is then rejected with 422 as usual.
+    """
+    try:
+        items = (await request.json()).get("items")
+    except (ValueError, AttributeError):
+        return 1.0
+    if not isinstance(items, list):
+        return 1.0
+    items = min(len(items), settings.BATCH_MAX_ITEMS)
+    return max(1.0, items * settings.ADMISSION_BATCH_ITEM_COST)
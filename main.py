@@ -1,18 +1,40 @@
 # main.py
+import asyncio
+import math
+import orjson # type: ignore
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware # Import the CORS middleware
-from schemas import SymptomCheckRequest, UserCreate, User
+from schemas import SymptomCheckRequest, SymptomBatchRequest, UserCreate, User, HistoryPage, HistoryEntry, AnalysisResponse
 from services import gemini_service, location_service
 from services.supabase_service import supabase_service
+from services.model_output import parse_analysis
+from services.clients import clients
+from services.history_writer import history_writer
+from services.history_cache import history_cache, history_page, decode_cursor
+from services.image_processor import image_processor, read_upload, PreparedImage, ImageTooLarge, InvalidImage, UploadLimitMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from security import verify_password, create_access_token
-from dependencies import get_current_user
+from security import create_access_token, jwt
+from services.password_hasher import password_hasher, HashingOverloaded
+from services.pipeline import RequestPipeline, StageTimeout
+from services.streaming import stream_analysis_events, StreamError
+from services.batch import run_batch
+from services.metrics import registry, loop_monitor, MetricsMiddleware, CONTENT_TYPE
+from services.analysis_cache import analysis_cache
+from services.geo_cache import geo_cache
+from services.principal_cache import principal_cache
+from services.resilience import gemini_upstream, geoapify_upstream
+from services.admission import admission, AdmissionRejected
+from services import lazy
+from config import settings
+from dependencies import admitted, batch_cost
 
 app = FastAPI(
     title="Healthcare Symptom Checker API",
     description="An API to suggest possible conditions based on symptoms.",
     version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 origins = [
     "https://medilens-o54a.onrender.com",
@@ -30,67 +52,319 @@ app.add_middleware(
 
 
 @app.on_event("startup")
-async def startup_supabase_client():
+async def startup_clients():
     supabase_service.initialize_client()
+    clients.startup()
+    await history_writer.start()
+    loop_monitor.start()
+    # Load the deferred SDKs once uvicorn is serving, not before it binds the port.
+    app.state.prewarm = None
+    if settings.STARTUP_PREWARM and settings.LAZY_IMPORTS:
+        app.state.prewarm = asyncio.ensure_future(lazy.prewarm(settings.STARTUP_PREWARM_DELAY_SECONDS))
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    if app.state.prewarm is not None:
+        app.state.prewarm.cancel()
+    await loop_monitor.stop()
+    # Drain queued history rows while the Supabase client is still open.
+    await history_writer.stop(timeout=settings.HISTORY_DRAIN_TIMEOUT_SECONDS)
+    supabase_service.close()
+    password_hasher.close()
+    image_processor.close()
+    admission.close()
+    await clients.shutdown()
+
+# Caps image upload bodies while they are received, before the multipart body
+# is parsed, with some room for the multipart framing and the text fields.
+app.add_middleware(UploadLimitMiddleware, path_prefix="/analyze/image",
+                   max_bytes=settings.IMAGE_MAX_UPLOAD_BYTES + 64 * 1024)
+
+# Outermost, so early rejections (413, 503) are counted too.
+app.add_middleware(MetricsMiddleware)
+
+# Existing component counters, exported as gauges on every scrape.
+registry.register_collector("analysis_cache", analysis_cache.stats)
+registry.register_collector("geo_cache", geo_cache.stats)
+registry.register_collector("principal_cache", principal_cache.stats)
+registry.register_collector("history_cache", history_cache.stats)
+registry.register_collector("history_writer", history_writer.stats)
+registry.register_collector("image_processor", image_processor.stats)
+registry.register_collector("password_hasher", password_hasher.stats)
+registry.register_collector("gemini_upstream", gemini_upstream.stats)
+registry.register_collector("geoapify_upstream", geoapify_upstream.stats)
+registry.register_collector("place_query", location_service.place_query.stats)
+registry.register_collector("lazy_imports", lazy.stats)
+registry.register_collector("admission", admission.stats)
+
+@app.exception_handler(HashingOverloaded)
+async def hashing_overloaded_handler(request: Request, exc: HashingOverloaded):
+    # Shed signup/login load instead of queueing PBKDF2 work without bound.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service is busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    # 429: this user's quota for the lane is spent; 503: the lane is too busy to queue.
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
 
 @app.get("/")
 def read_root():
     return {"message": "Symptom Checker API is running!"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
 # ... (the rest of your main.py file remains exactly the same)
+
 @app.post("/signup", response_model=User)
 async def create_user(user: UserCreate):
-    db_user = supabase_service.create_user(user)
+    db_user = await supabase_service.create_user(user)
     if "error" in db_user:
         raise HTTPException(status_code=400, detail=db_user["error"])
     return db_user
 
 @app.post("/login")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = supabase_service.get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user.get("hashed_password")):
+    user = await supabase_service.get_user_by_email(form_data.username)
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
+    verified, new_hash = await password_hasher.verify(form_data.password, user.get("hashed_password"))
+    if not verified:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if new_hash:
+        # Upgrade legacy/concatenated hashes so future logins derive a single candidate.
+        await supabase_service.update_password_hash(user["id"], user["email"], new_hash)
+    # The first login imports jose; keep that off the event loop.
+    await lazy.ensure_loaded(jwt)
     access_token = create_access_token(data={"sub": user["email"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/history")
-async def get_user_query_history(current_user: User = Depends(get_current_user)):
-    history = supabase_service.get_user_history(current_user.id)
-    return history
+@app.get("/history", response_model=HistoryPage)
+async def get_user_query_history(
+    limit: int = Query(default=settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(admitted("cheap")),
+):
+    after = None
+    if cursor is None:
+        cached = await history_cache.get(current_user.id, limit)
+        if cached is not None:
+            return cached
+    else:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid history cursor.")
+    epoch = history_cache.epoch()
+    # One extra row tells us whether there is a next page.
+    rows = await supabase_service.get_user_history(current_user.id, limit=limit + 1, after=after)
+    page = history_page(rows, limit)
+    if cursor is None:
+        await history_cache.put(current_user.id, limit, page, epoch)
+    return page
+
+@app.get("/history/{entry_id}", response_model=HistoryEntry)
+async def get_user_query_history_entry(entry_id: int, current_user: User = Depends(admitted("cheap"))):
+    entry = await supabase_service.get_history_entry(current_user.id, entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="History entry not found.")
+    return entry
+
+async def _await_hospitals(pipeline: RequestPipeline, analysis_result: dict):
+    """Attaches the hospital stage's result, or marks it unavailable if it timed out."""
+    try:
+        analysis_result["nearby_hospitals"] = await pipeline.result("hospitals")
+    except StageTimeout:
+        analysis_result["nearby_hospitals"] = {"error": "Nearby hospital lookup timed out.", "status": "unavailable"}
+
+async def _save_history(pipeline: RequestPipeline, **row):
+    # Only waits for the row to be queued; the bulk insert happens in the background.
+    try:
+        await pipeline.run("history", history_writer.enqueue(row), timeout=settings.HISTORY_TIMEOUT_SECONDS)
+    except StageTimeout:
+        print("Timed out queueing query history; returning the analysis anyway.")
+
+def _analysis_error(analysis_result: dict) -> HTTPException:
+    if analysis_result.get("status") == "unavailable":
+        # The resilience layer refused the call (circuit open or rate limited).
+        return HTTPException(status_code=503, detail=analysis_result["error"], headers={"Retry-After": "5"})
+    if analysis_result.get("status") == "invalid":
+        # The model answered, but not with a readable analysis.
+        return HTTPException(status_code=502, detail=analysis_result["error"])
+    return HTTPException(status_code=500, detail=analysis_result["error"])
+
+async def _prepare_image(image: UploadFile) -> PreparedImage:
+    """Reads the upload under the size cap and downscales it for storage and the model."""
+    try:
+        raw = await read_upload(image, settings.IMAGE_MAX_UPLOAD_BYTES)
+    except ImageTooLarge:
+        raise HTTPException(status_code=413, detail="Image is too large.")
+    try:
+        return await image_processor.prepare(raw)
+    except InvalidImage:
+        raise HTTPException(status_code=400, detail="The uploaded file is not a readable image.")
 
-@app.post("/analyze/text")
-async def analyze_symptoms(request: SymptomCheckRequest, current_user: User = Depends(get_current_user)):
-    analysis_result = await gemini_service.get_symptom_analysis(request.symptoms)
+@app.post("/analyze/text", response_model=AnalysisResponse)
+async def analyze_symptoms(request: SymptomCheckRequest, current_user: User = Depends(admitted("cheap"))):
+    pipeline = RequestPipeline()
+    pipeline.start("analysis", gemini_service.get_symptom_analysis(request.symptoms), timeout=settings.ANALYSIS_TIMEOUT_SECONDS)
+    has_location = bool(request.latitude and request.longitude)
+    if has_location:
+        pipeline.start("hospitals", location_service.get_nearby_hospitals(request.latitude, request.longitude), timeout=settings.HOSPITALS_TIMEOUT_SECONDS)
+
+    try:
+        analysis_result = await pipeline.result("analysis")
+    except StageTimeout:
+        pipeline.cancel()
+        raise HTTPException(status_code=504, detail="Timed out waiting for the model analysis.")
     if "error" in analysis_result:
-        raise HTTPException(status_code=500, detail=analysis_result["error"])
-    
-    if request.latitude and request.longitude:
-        hospitals = await location_service.get_nearby_hospitals(request.latitude, request.longitude)
-        analysis_result["nearby_hospitals"] = hospitals
-        
-    supabase_service.save_query_history(user_id=current_user.id, symptom_text=request.symptoms, response_data=analysis_result)
-    return analysis_result
+        pipeline.cancel()
+        raise _analysis_error(analysis_result)
+
+    if has_location:
+        await _await_hospitals(pipeline, analysis_result)
 
-@app.post("/analyze/image")
+    await _save_history(pipeline, user_id=current_user.id, symptom_text=request.symptoms, response_data=analysis_result)
+    # Already validated against the schema when parsed; serialize it as-is.
+    return ORJSONResponse(analysis_result)
+
+@app.post("/analyze/image", response_model=AnalysisResponse)
 async def analyze_symptoms_with_image(
     image: UploadFile = File(...),
     symptoms: Optional[str] = Form(default="No additional text symptoms provided."),
     latitude: Optional[float] = Form(default=None),
     longitude: Optional[float] = Form(default=None),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(admitted("expensive"))
 ):
-    image_bytes = await image.read()
-    image_url = supabase_service.upload_symptom_image(user_id=current_user.id, image_bytes=image_bytes, content_type=image.content_type)
+    pipeline = RequestPipeline()
+    try:
+        prepared = await pipeline.run("preprocess", _prepare_image(image), timeout=settings.UPLOAD_TIMEOUT_SECONDS)
+    except StageTimeout:
+        raise HTTPException(status_code=504, detail="Timed out processing the image.")
+    # Storage upload and model inference both only need the processed image.
+    pipeline.start("upload", supabase_service.upload_symptom_image(user_id=current_user.id, image_bytes=prepared.data, content_type=prepared.mime_type, file_name=prepared.file_name), timeout=settings.UPLOAD_TIMEOUT_SECONDS)
+    pipeline.start("analysis", gemini_service.get_multimodal_analysis(symptoms=symptoms, image=prepared), timeout=settings.ANALYSIS_TIMEOUT_SECONDS)
+    has_location = latitude is not None and longitude is not None
+    if has_location:
+        pipeline.start("hospitals", location_service.get_nearby_hospitals(latitude, longitude), timeout=settings.HOSPITALS_TIMEOUT_SECONDS)
+
+    try:
+        image_url = await pipeline.result("upload")
+    except StageTimeout:
+        image_url = None
     if not image_url:
+        pipeline.cancel()
         raise HTTPException(status_code=500, detail="Failed to upload image.")
 
-    analysis_result = await gemini_service.get_multimodal_analysis(symptoms=symptoms, image_bytes=image_bytes)
+    try:
+        analysis_result = await pipeline.result("analysis")
+    except StageTimeout:
+        pipeline.cancel()
+        raise HTTPException(status_code=504, detail="Timed out waiting for the model analysis.")
     if "error" in analysis_result:
-        raise HTTPException(status_code=500, detail=analysis_result["error"])
-        
+        pipeline.cancel()
+        raise _analysis_error(analysis_result)
+
+    if has_location:
+        await _await_hospitals(pipeline, analysis_result)
+
+    await _save_history(pipeline, user_id=current_user.id, symptom_text=symptoms, response_data=analysis_result, image_url=image_url)
+    # Already validated against the schema when parsed; serialize it as-is.
+    return ORJSONResponse(analysis_result)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/analyze/text/stream")
+async def analyze_symptoms_stream(request: SymptomCheckRequest, current_user: User = Depends(admitted("cheap"))):
+    hospitals = None
+    if request.latitude and request.longitude:
+        hospitals = location_service.get_nearby_hospitals(request.latitude, request.longitude)
+
+    async def save(result: dict):
+        await history_writer.enqueue({"user_id": current_user.id, "symptom_text": request.symptoms, "response_data": result})
+
+    events = stream_analysis_events(
+        gemini_service.stream_symptom_analysis(request.symptoms),
+        parse=parse_analysis,
+        hospitals=hospitals,
+        hospitals_timeout=settings.HOSPITALS_TIMEOUT_SECONDS,
+        on_complete=save,
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/analyze/image/stream")
+async def analyze_symptoms_with_image_stream(
+    image: UploadFile = File(...),
+    symptoms: Optional[str] = Form(default="No additional text symptoms provided."),
+    latitude: Optional[float] = Form(default=None),
+    longitude: Optional[float] = Form(default=None),
+    current_user: User = Depends(admitted("expensive"))
+):
+    prepared = await _prepare_image(image)
+    upload = asyncio.ensure_future(supabase_service.upload_symptom_image(user_id=current_user.id, image_bytes=prepared.data, content_type=prepared.mime_type, file_name=prepared.file_name))
+    hospitals = None
     if latitude is not None and longitude is not None:
-        hospitals = await location_service.get_nearby_hospitals(latitude, longitude)
-        analysis_result["nearby_hospitals"] = hospitals
-    
-    supabase_service.save_query_history(user_id=current_user.id, symptom_text=symptoms, response_data=analysis_result, image_url=image_url)
-    return analysis_result
\ No newline at end of file
+        hospitals = location_service.get_nearby_hospitals(latitude, longitude)
+
+    async def save(result: dict):
+        image_url = await upload
+        if not image_url:
+            raise StreamError("Failed to upload image.")
+        await history_writer.enqueue({"user_id": current_user.id, "symptom_text": symptoms, "response_data": result, "image_url": image_url})
+
+    events = stream_analysis_events(
+        gemini_service.stream_multimodal_analysis(symptoms=symptoms, image=prepared),
+        parse=parse_analysis,
+        hospitals=hospitals,
+        hospitals_timeout=settings.HOSPITALS_TIMEOUT_SECONDS,
+        on_complete=save,
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/analyze/batch")
+async def analyze_symptoms_batch(request: SymptomBatchRequest,
+                                 current_user: User = Depends(admitted("expensive", cost=batch_cost))):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="The batch has no items.")
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {settings.BATCH_MAX_ITEMS} items.")
+
+    async def save(completed: list):
+        rows = [
+            {"user_id": current_user.id, "symptom_text": request.items[index].symptoms, "response_data": result}
+            for index, result in completed
+        ]
+        if not rows:
+            return
+        # One bulk insert for the whole batch; on failure hand the rows to the
+        # history writer, which journals and retries them.
+        if await supabase_service.save_query_history_batch(rows):
+            await history_cache.invalidate({current_user.id})
+        else:
+            for row in rows:
+                await history_writer.enqueue(row)
+
+    async def lines():
+        async for line in run_batch(
+            request.items,
+            analyze=gemini_service.get_symptom_analysis,
+            find_hospitals=location_service.get_nearby_hospitals,
+            concurrency=settings.BATCH_CONCURRENCY,
+            hospitals_timeout=settings.HOSPITALS_TIMEOUT_SECONDS,
+            on_complete=save,
+        ):
+            yield orjson.dumps(line) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,11 +1,55 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, model_validator
+from typing import Any, List, Optional, Union
 
 class SymptomCheckRequest(BaseModel):
     symptoms: str
     latitude: Optional[float] = None
     longitude: Optional[float] = None
 
+class SymptomBatchRequest(BaseModel):
+    items: List[SymptomCheckRequest]
+
+class PossibleCondition(BaseModel):
+    condition: str
+    # As the model wrote it (e.g. "75%"), kept for display.
+    confidence_score: str = ""
+    # confidence_score as a number from 0 to 100; None when it is not numeric (e.g. "High").
+    confidence: Optional[float] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def _numeric_confidence(cls, data: Any) -> Any:
+        if not isinstance(data, dict) or data.get("confidence") is not None:
+            return data
+        raw = data.get("confidence_score")
+        if isinstance(raw, bool) or raw is None:
+            return data
+        data = dict(data)
+        if isinstance(raw, (int, float)):
+            value, percent = float(raw), False
+        else:
+            text = str(raw).strip()
+            percent = text.endswith("%")
+            try:
+                value = float(text.rstrip("%").strip())
+            except ValueError:
+                return data
+        if not percent and 0 < value <= 1:
+            value *= 100
+        data["confidence"] = min(100.0, max(0.0, value))
+        if not isinstance(raw, str):
+            data["confidence_score"] = f"{data['confidence']:g}%"
+        return data
+
+class SymptomAnalysis(BaseModel):
+    """The analysis the model is asked for; model output is validated against it."""
+    possible_conditions: List[PossibleCondition]
+    recommended_next_steps: Union[str, List[str]] = ""
+    disclaimer: str = ""
+
+class AnalysisResponse(SymptomAnalysis):
+    nearby_hospitals: Optional[Any] = None
+
 class UserCreate(BaseModel):
     name: str
     email: str
@@ -17,4 +61,19 @@ class User(BaseModel):
     email: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class HistorySummary(BaseModel):
+    id: int
+    created_at: str
+    symptom_text: Optional[str] = None
+    image_url: Optional[str] = None
+    top_condition: Optional[str] = None
+
+class HistoryPage(BaseModel):
+    items: List[HistorySummary]
+    next_cursor: Optional[str] = None
+
+class HistoryEntry(HistorySummary):
+    user_id: int
+    response_data: Optional[dict] = None
@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta, timezone
-from jose import jwt
 from config import settings
+from services.lazy import lazy_import
 import hashlib
 import secrets
 import base64
 import typing
 
+jwt = lazy_import("jose.jwt")
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -30,6 +32,36 @@ def get_password_hash(password: str) -> str:
     return f"pbkdf2_{HASH_NAME}${ITERATIONS}${base64.b64encode(salt).decode()}${base64.b64encode(dk).decode()}"
 
 
+def needs_rehash(stored_hash: str) -> bool:
+    """
+    True unless stored_hash is a single hash in the canonical format with the
+    current iteration count. Legacy, 4-part, bcrypt and concatenated values all
+    need rehashing so that later verifications derive only one candidate.
+    """
+    if not stored_hash:
+        return True
+    parts = stored_hash.strip().split("$")
+    if len(parts) != 4 or parts[0] != f"pbkdf2_{HASH_NAME}":
+        return True
+    try:
+        return int(parts[1]) != ITERATIONS
+    except ValueError:
+        return True
+
+
+def verify_and_update(plain_password: str, stored_hash: str) -> typing.Tuple[bool, typing.Optional[str]]:
+    """
+    Verify plain_password and, if it matches a non-canonical stored_hash,
+    return a fresh canonical hash to persist in its place.
+    Returns (verified, new_hash_or_None).
+    """
+    if not verify_password(plain_password, stored_hash):
+        return False, None
+    if needs_rehash(stored_hash):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+
 def _safe_b64decode(s: str) -> bytes:
     """Decode base64 while tolerating missing padding / whitespace."""
     s = s.strip()
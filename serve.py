@@ -0,0 +1,89 @@
+"""
+Production launcher: the app in several uvicorn worker processes behind one port.
+
+    python serve.py              # HOST, PORT, WEB_CONCURRENCY from the environment
+
+WEB_CONCURRENCY defaults to the number of CPUs this process may use (its CPU
+affinity and, in a container, the cgroup CPU quota), capped at
+WEB_CONCURRENCY_AUTO_MAX: every worker loads its own copy of the SDKs, so
+going past that takes an explicit WEB_CONCURRENCY. With more than one worker,
+caches and per-user quotas are moved to SQLite files on local disk that every
+worker shares (SHARED_CACHE_DIR, ADMISSION_BACKEND=sqlite) unless those are
+configured explicitly. Each worker keeps its own history journal (see
+HistoryWriter).
+
+Signals to the parent process:
+
+    SIGHUP            graceful reload: workers are restarted one at a time, each
+                      finishing its in-flight requests and draining its history
+                      queue first, so the others keep serving throughout
+    SIGTTIN/SIGTTOU   add or remove one worker
+    SIGTERM/SIGINT    graceful shutdown
+"""
+import math
+import os
+from typing import Optional
+
+import uvicorn # type: ignore
+
+from config import settings
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota (v2 cpu.max, or v1 CFS files); None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        # Respects CPU pinning and container cpusets, unlike os.cpu_count().
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    # Kubernetes/Render limit CPU with a quota, which the affinity mask doesn't show.
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+def worker_count() -> int:
+    if settings.WEB_CONCURRENCY:
+        return settings.WEB_CONCURRENCY
+    return min(available_cpus(), settings.WEB_CONCURRENCY_AUTO_MAX)
+
+def configure_workers(workers: int):
+    """Shares caches and quotas between workers, unless configured explicitly."""
+    if workers <= 1:
+        return
+    # Worker processes are spawned and read their settings from this environment.
+    if "SHARED_CACHE_DIR" not in settings.model_fields_set:
+        os.environ["SHARED_CACHE_DIR"] = "shared_cache"
+    if "ADMISSION_BACKEND" not in settings.model_fields_set:
+        os.environ["ADMISSION_BACKEND"] = "sqlite"
+
+def main():
+    workers = worker_count()
+    configure_workers(workers)
+    print(f"Starting {workers} worker(s); shared cache: {os.environ.get('SHARED_CACHE_DIR') or settings.SHARED_CACHE_DIR or 'off'}.")
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        timeout_graceful_shutdown=settings.WEB_GRACEFUL_TIMEOUT_SECONDS,
+    )
+
+
+if __name__ == "__main__":
+    main()
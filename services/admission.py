@@ -0,0 +1,326 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, Optional
+
+from config import settings
+from services.metrics import admission_wait
+
+class AdmissionRejected(Exception):
+    """Raised instead of admitting a request: 429 for a spent quota, 503 when shed."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+def _spend(tokens: float, burst: float, rate: float, cost: float):
+    """
+    (tokens left, seconds to wait) for spending `cost` from a bucket holding
+    `tokens`. A cost above the burst is admitted from a full bucket and leaves
+    it in debt, so a large request is charged in full without being refused
+    forever.
+    """
+    needed = min(cost, burst)
+    if tokens < needed:
+        return tokens, (needed - tokens) / rate
+    return tokens - cost, 0.0
+
+class MemoryQuotaBackend:
+    """
+    Per-key token buckets in this process. The least recently used buckets are
+    dropped beyond `max_keys`; an idle bucket has refilled by then anyway.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """Spends `cost` tokens; returns 0 if admitted, else seconds until it would be."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        bucket[0], wait = _spend(tokens, burst, rate, cost)
+        return wait
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "keys": len(self._buckets)}
+
+class SQLiteQuotaBackend:
+    """
+    Token buckets in a SQLite file, so every worker on the host draws from the
+    same per-user quota. Each take() is one short IMMEDIATE transaction, run on
+    a single background thread so a locked database never stalls the event
+    loop; if it stays locked past `busy_timeout`, the request is admitted
+    rather than failed. Every `prune_interval` seconds the rows of buckets that
+    have refilled (and so are the same as no row) are deleted.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.05, prune_interval: float = 60.0):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Quotas need not survive a power cut; skip the fsync per commit.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # full_at: wall-clock time the bucket is back to its burst, after which the row can go.
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                           "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(buckets)")]
+        if "full_at" not in columns:
+            self._conn.execute("ALTER TABLE buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+        self._next_prune = time.monotonic() + prune_interval
+        self.errors = 0
+        self.pruned = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            # One thread: the transactions are serialized by the database anyway.
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="admission")
+        return self._executor
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """Spends `cost` tokens; returns 0 if admitted, else seconds until it would be."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self._take, key, rate, burst, cost)
+
+    def _take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        # Wall-clock time: the buckets are shared with other processes.
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                    tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                    tokens, wait = _spend(tokens, burst, rate, cost)
+                    self._conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                                       (key, tokens, now, now + (burst - tokens) / rate))
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + self.prune_interval
+                    self.pruned += self._conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,)).rowcount
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Admission quota backend error, admitting: {e}")
+                return 0.0
+        return wait
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "errors": self.errors, "pruned": self.pruned}
+
+class _Lane:
+    """Concurrency slots for one class of request, with per-user FIFO queues served round-robin."""
+
+    def __init__(self, name: str, concurrency: int, queue_timeout: float, rate: float, burst: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.active = 0
+        self.queued = 0
+        self._waiting: "OrderedDict[Hashable, deque]" = OrderedDict()
+        # Smoothed seconds a request holds a slot; None until the first release.
+        self.service_time: Optional[float] = None
+        self.admitted = 0
+        self.throttled = 0
+        self.shed = 0
+        self.expired = 0
+
+    def predicted_wait(self) -> float:
+        if self.service_time is None:
+            return 0.0
+        return (self.queued + 1) * self.service_time / self.concurrency
+
+    def enqueue(self, user_id: Hashable, future: asyncio.Future):
+        self._waiting.setdefault(user_id, deque()).append(future)
+        self.queued += 1
+
+    def next_waiter(self) -> Optional[asyncio.Future]:
+        """Pops the next live waiter, taking users in turn so one user's backlog cannot starve the rest."""
+        while self._waiting:
+            user_id, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if not future.done():
+                return future
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "queued": self.queued,
+            "service_seconds": self.service_time or 0.0,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "shed": self.shed,
+            "expired": self.expired,
+        }
+
+class Ticket:
+    """A held slot. release() is idempotent, so streamed responses can release from several places."""
+
+    def __init__(self, controller: "AdmissionController", lane: Optional[_Lane]):
+        self._controller = controller
+        self._lane = lane
+        self._start = time.monotonic()
+        self._released = lane is None
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self._lane, time.monotonic() - self._start)
+
+class AdmissionController:
+    """
+    Admission control for the analyze and history endpoints, keyed by user.
+
+    Each lane ("cheap": text analysis and history, "expensive": image analysis
+    and batches) has per-user token-bucket quotas, answered with 429 when
+    spent, and its own concurrency slots, so image work cannot occupy the
+    slots text and history requests need. A request that finds no free slot
+    waits in its user's queue; users are served in turn. Requests are shed
+    with 503 when the queues (shared by both lanes) are full, when the lane's
+    recent service time predicts a wait past its queue timeout, or when the
+    wait actually runs that long.
+    """
+
+    def __init__(self, backend, lanes: Dict[str, _Lane], max_queue: int):
+        self.backend = backend
+        self.lanes = lanes
+        self.max_queue = max_queue
+        self.queued = 0
+
+    def _shed(self, lane: _Lane, detail: str, retry_after: float):
+        lane.shed += 1
+        raise AdmissionRejected(503, detail, retry_after)
+
+    async def acquire(self, user_id: Hashable, lane_name: str, cost: float = 1.0) -> Ticket:
+        """
+        Waits for a slot in the lane; raises AdmissionRejected instead of
+        admitting. `cost` is the number of quota tokens the request spends,
+        e.g. one per item of a batch; it still holds a single slot.
+        """
+        if not settings.ADMISSION_ENABLED:
+            return Ticket(self, None)
+        lane = self.lanes[lane_name]
+        wait = await self.backend.take(f"{lane.name}:{user_id}", lane.rate, lane.burst, cost)
+        if wait > 0:
+            lane.throttled += 1
+            raise AdmissionRejected(429, "Too many requests. Please slow down.", wait)
+
+        if lane.active < lane.concurrency and not lane.queued:
+            lane.active += 1
+            lane.admitted += 1
+            return Ticket(self, lane)
+        if self.queued >= self.max_queue:
+            self._shed(lane, "The service is busy. Please retry shortly.", lane.service_time or 1.0)
+        predicted = lane.predicted_wait()
+        if predicted > lane.queue_timeout:
+            self._shed(lane, "The service is busy. Please retry shortly.", predicted)
+
+        future = asyncio.get_running_loop().create_future()
+        lane.enqueue(user_id, future)
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=lane.queue_timeout)
+        except asyncio.TimeoutError:
+            lane.queued -= 1
+            self.queued -= 1
+            lane.expired += 1
+            self._shed(lane, "Timed out waiting for capacity. Please retry shortly.", lane.service_time or 1.0)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over as the request went away; pass it on.
+                self._release(lane, 0.0, observe=False)
+            else:
+                lane.queued -= 1
+                self.queued -= 1
+            raise
+        lane.admitted += 1
+        if settings.METRICS_ENABLED:
+            admission_wait.labels(lane.name).observe(time.monotonic() - start)
+        return Ticket(self, lane)
+
+    def _release(self, lane: _Lane, held: float, observe: bool = True):
+        if observe:
+            lane.service_time = held if lane.service_time is None else 0.8 * lane.service_time + 0.2 * held
+        future = lane.next_waiter()
+        if future is None:
+            lane.active -= 1
+            return
+        # The slot passes straight to the waiter; `active` is unchanged.
+        lane.queued -= 1
+        self.queued -= 1
+        future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable, lane_name: str, cost: float = 1.0):
+        ticket = await self.acquire(user_id, lane_name, cost)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "quota": self.backend.stats(),
+            **{name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+    def close(self):
+        self.backend.close()
+
+
+def _create_backend():
+    if settings.ADMISSION_BACKEND == "sqlite":
+        return SQLiteQuotaBackend(settings.ADMISSION_PATH)
+    return MemoryQuotaBackend()
+
+
+# Create a single, reusable instance for the app to use
+admission = AdmissionController(
+    _create_backend(),
+    lanes={
+        "cheap": _Lane("cheap", settings.ADMISSION_CHEAP_CONCURRENCY, settings.ADMISSION_CHEAP_QUEUE_TIMEOUT_SECONDS,
+                       settings.ADMISSION_CHEAP_RATE, settings.ADMISSION_CHEAP_BURST),
+        "expensive": _Lane("expensive", settings.ADMISSION_EXPENSIVE_CONCURRENCY, settings.ADMISSION_EXPENSIVE_QUEUE_TIMEOUT_SECONDS,
+                           settings.ADMISSION_EXPENSIVE_RATE, settings.ADMISSION_EXPENSIVE_BURST),
+    },
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+)
@@ -0,0 +1,108 @@
+import hashlib
+import re
+from typing import Awaitable, Callable, Optional
+
+import orjson # type: ignore
+
+from config import settings
+from services.cache import SingleFlight, TTLCache, shared_cache
+from services.similarity_index import SimilarityIndex
+
+_PUNCTUATION = re.compile(r"[^\w\s%]+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_symptoms(symptoms: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a symptom description."""
+    text = _PUNCTUATION.sub(" ", symptoms.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+class AnalysisCache:
+    """
+    Caches model analyses and coalesces identical in-flight requests.
+
+    Keys hash the model name, prompt template version and normalized
+    symptoms, so changing either the model or the prompt naturally
+    invalidates old entries. Results are stored as compact JSON bytes: the
+    byte bound is exact, and each caller decodes its own copy (handlers add
+    `nearby_hospitals` to the dict they get back). Error results are shared
+    with coalesced callers but never cached.
+
+    With a SimilarityIndex attached, an exact-key miss for a text query also
+    reuses the cached analysis of a text with the same content words (e.g.
+    "fever, headache" vs "I have a headache and a fever").
+
+    With SHARED_CACHE_DIR set, results live in a SQLite file shared by all
+    worker processes (bounded by entry count only). Coalescing and the
+    similarity index stay per process: a near-duplicate is only found by
+    the worker that stored the original.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float, enabled: bool = True,
+                 similarity_index: Optional[SimilarityIndex] = None):
+        self.enabled = enabled
+        self._cache = shared_cache("analysis", max_entries=max_entries, default_ttl=ttl_seconds)
+        if self._cache is None:
+            self._cache = TTLCache(max_entries=max_entries, default_ttl=ttl_seconds, max_bytes=max_bytes)
+        self._flights = SingleFlight()
+        self.similarity_index = similarity_index
+        self.similar_hits = 0
+
+    @staticmethod
+    def key(model: str, prompt_version: str, symptoms: str, *extra: str) -> str:
+        parts = [model, prompt_version, normalize_symptoms(symptoms), *extra]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    async def lookup(self, key: str, text: Optional[str] = None) -> Optional[dict]:
+        """Cached analysis for key, or for a near-duplicate of `text`; None on a miss."""
+        if not self.enabled:
+            return None
+        cached = await self._cache.aget(key)
+        if cached is None and text is not None and self.similarity_index is not None:
+            similar_key = self.similarity_index.lookup(text)
+            if similar_key is not None and similar_key != key:
+                cached = await self._cache.aget(similar_key)
+                if cached is not None:
+                    self.similar_hits += 1
+        return orjson.loads(cached) if cached is not None else None
+
+    async def store(self, key: str, result: dict, text: Optional[str] = None) -> bytes:
+        """Caches a successful analysis (errors are skipped); returns its encoded form."""
+        encoded = orjson.dumps(result)
+        if self.enabled and "error" not in result:
+            await self._cache.aset(key, encoded)
+            if text is not None and self.similarity_index is not None:
+                self.similarity_index.add(text, key)
+        return encoded
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[dict]], text: Optional[str] = None) -> dict:
+        """
+        Returns the cached analysis for key (or for a near-duplicate of `text`),
+        otherwise runs compute() once for all concurrent callers with this key.
+        """
+        if not self.enabled:
+            return await compute()
+        cached = await self.lookup(key, text)
+        if cached is not None:
+            return cached
+        encoded = await self._flights.do(key, lambda: self._compute_and_store(key, compute, text))
+        return orjson.loads(encoded)
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[dict]], text: Optional[str]) -> bytes:
+        return await self.store(key, await compute(), text)
+
+    def stats(self) -> dict:
+        stats = dict(self._cache.stats(), coalesced=self._flights.coalesced, inflight=len(self._flights),
+                     similar_hits=self.similar_hits)
+        if self.similarity_index is not None:
+            stats["similarity"] = self.similarity_index.stats()
+        return stats
+
+
+# Create a single, reusable instance for the app to use
+analysis_cache = AnalysisCache(
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+    max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+    enabled=settings.ANALYSIS_CACHE_ENABLED,
+    similarity_index=SimilarityIndex(max_entries=settings.SIMILARITY_MAX_ENTRIES) if settings.SIMILARITY_ENABLED else None,
+)
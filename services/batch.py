@@ -0,0 +1,88 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from schemas import SymptomCheckRequest
+from services.analysis_cache import normalize_symptoms
+
+def _dedupe_key(item: SymptomCheckRequest) -> tuple:
+    return normalize_symptoms(item.symptoms), item.latitude, item.longitude
+
+async def run_batch(
+    items: List[SymptomCheckRequest],
+    analyze: Callable[[str], Awaitable[dict]],
+    find_hospitals: Callable[[float, float], Awaitable],
+    concurrency: int,
+    hospitals_timeout: float,
+    on_complete: Optional[Callable[[List[Tuple[int, dict]]], Awaitable[None]]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Analyzes a batch of symptom checks, yielding one line per item as it completes.
+
+    Identical inputs (same normalized text and coordinates) are analyzed once
+    and reported under every index that asked for them. At most `concurrency`
+    analyses run at a time; each item's hospital lookup starts when its
+    analysis does, and lookups for the same coordinates are shared (lookups
+    in the same geohash tile are further coalesced by location_service).
+
+    Yields {"index", "result"} or {"index", "error"} per item, then a final
+    {"done": true, ...} summary. on_complete receives every successful
+    (index, result) pair once, even if the client disconnects early.
+    """
+    groups: Dict[tuple, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(_dedupe_key(item), []).append(index)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    hospital_lookups: Dict[Tuple[float, float], asyncio.Future] = {}
+
+    async def run_group(indices: List[int]):
+        item = items[indices[0]]
+        async with semaphore:
+            hospitals = None
+            if item.latitude and item.longitude:
+                coordinates = (item.latitude, item.longitude)
+                if coordinates not in hospital_lookups:
+                    hospital_lookups[coordinates] = asyncio.ensure_future(find_hospitals(*coordinates))
+                hospitals = hospital_lookups[coordinates]
+            try:
+                result = await analyze(item.symptoms)
+            except Exception as e:
+                print(f"Error analyzing batch item: {e}")
+                result = {"error": "Failed to get analysis from the model."}
+        if "error" not in result and hospitals is not None:
+            try:
+                # Shielded: other items may be waiting on the same lookup.
+                result["nearby_hospitals"] = await asyncio.wait_for(asyncio.shield(hospitals), timeout=hospitals_timeout)
+            except asyncio.TimeoutError:
+                result["nearby_hospitals"] = {"error": "Nearby hospital lookup timed out.", "status": "unavailable"}
+            except Exception as e:
+                print(f"Error looking up hospitals for batch item: {e}")
+                result["nearby_hospitals"] = {"error": "Nearby hospital lookup failed.", "status": "unavailable"}
+        return indices, result
+
+    tasks = [asyncio.ensure_future(run_group(indices)) for indices in groups.values()]
+    completed: List[Tuple[int, dict]] = []
+    failed = 0
+    saved = False
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indices, result = await next_done
+            for index in indices:
+                if "error" in result:
+                    failed += 1
+                    yield {"index": index, "error": result["error"]}
+                else:
+                    completed.append((index, result))
+                    yield {"index": index, "result": result}
+        saved = True
+        if on_complete is not None:
+            await on_complete(completed)
+        yield {"done": True, "items": len(items), "unique": len(groups), "failed": failed}
+    finally:
+        for task in tasks:
+            task.cancel()
+        for lookup in hospital_lookups.values():
+            lookup.cancel()
+        if not saved and completed and on_complete is not None:
+            # The client went away mid-stream; keep what was already answered.
+            asyncio.ensure_future(on_complete(completed))
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from config import settings
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry expiry and hit/miss counters.
+
+    Bounded by entry count and, when `max_bytes` is set, by the total of
+    `sizeof(value)` over all entries. Entries may carry their own TTL, which
+    lets callers pin expiry to an external deadline (e.g. a JWT's `exp`).
+    """
+
+    def __init__(self, max_entries: int, default_ttl: float, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = len):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.delete(key)
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    # Same interface as SQLiteCache's, so callers can await either tier; in
+    # process there is nothing to wait for.
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        return self.get(key, default)
+
+    async def aset(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: Hashable) -> None:
+        self.delete(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution.
+
+    The first caller starts the work as a task; callers arriving while it is
+    in flight await the same task. The task is shielded so one caller being
+    cancelled (e.g. by a stage timeout) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+class SQLiteCache:
+    """
+    On-disk LRU cache with per-entry expiry, backed by a single SQLite file.
+
+    Values must be JSON-serializable or `bytes` (stored as-is). Entries survive
+    restarts; expiry uses wall-clock time for that reason. Eviction of
+    least-recently-used rows is amortized over every `max_entries // 100`
+    writes and is a single DELETE, so it is atomic even with several
+    processes writing to the same file.
+
+    The database runs in WAL mode, so any number of worker processes can
+    share one file: reads never wait for a writer. Recency is only recorded
+    once per `touch_interval` per entry, which keeps cache hits read-only. A
+    write that finds the database locked for longer than `busy_timeout` is
+    dropped (and a read counted as a miss) rather than stalling the request.
+
+    Async code uses aget/aset/adelete, which run the same calls (and the JSON
+    encoding) on a single background thread, so disk I/O and lock waits never
+    stall the event loop.
+    """
+
+    def __init__(self, path: str, max_entries: int, default_ttl: float, touch_interval: float = 0.0,
+                 busy_timeout: float = 5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A cache need not survive a power cut; skip the fsync per commit.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._evict_every = max(1, max_entries // 100)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _error(self, e: sqlite3.Error) -> None:
+        self.errors += 1
+        print(f"SQLite cache {self.path} error: {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is None or row[1] <= now:
+                    if row is not None:
+                        self._conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+                    self.misses += 1
+                    return default
+                if now - row[2] >= self.touch_interval:
+                    self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                self._error(e)
+                self.misses += 1
+                return default
+            self.hits += 1
+        value = row[0]
+        return value if isinstance(value, bytes) else json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        now = time.time()
+        payload = value if isinstance(value, bytes) else json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, payload, now + ttl, now),
+                )
+                self._writes += 1
+                if self._writes % self._evict_every == 0:
+                    self._evict()
+            except sqlite3.Error as e:
+                self._error(e)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            # One thread: the calls share a connection and are serialized by its lock anyway.
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-cache")
+        return self._executor
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), self.get, key, default)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._get_executor(), self.set, key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._get_executor(), self.delete, key)
+
+    def _evict(self) -> None:
+        # Expired rows first, then everything past the `max_entries` most recently used.
+        cursor = self._conn.execute(
+            "DELETE FROM cache WHERE expires_at <= ? OR key IN "
+            "(SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (time.time(), self.max_entries),
+        )
+        self.evictions += cursor.rowcount
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                self._error(e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._conn.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+def shared_cache(name: str, max_entries: int, default_ttl: float) -> Optional[SQLiteCache]:
+    """
+    The named cache in SHARED_CACHE_DIR, shared by every worker process on the
+    host, or None when caches are kept per process.
+    """
+    if not settings.SHARED_CACHE_DIR:
+        return None
+    os.makedirs(settings.SHARED_CACHE_DIR, exist_ok=True)
+    return SQLiteCache(os.path.join(settings.SHARED_CACHE_DIR, f"{name}.sqlite3"), max_entries=max_entries,
+                       default_ttl=default_ttl, touch_interval=settings.SHARED_CACHE_TOUCH_SECONDS, busy_timeout=0.05)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import httpx # type: ignore
+from config import settings
+from services.lazy import lazy_import, on_prewarm
+
+genai = lazy_import("google.generativeai")
+
+class ClientRegistry:
+    """
+    Application-lifetime outbound clients.
+
+    Holds one pooled httpx.AsyncClient (keep-alive, optionally HTTP/2) for all
+    outbound REST calls and a cache of Gemini model handles, so requests stop
+    paying a TCP+TLS handshake or model construction each time. Created in the
+    FastAPI startup hook and closed on shutdown. The Gemini SDK is imported and
+    configured on the first model() call, not at startup; async code uses
+    get_model(), which does that off the event loop.
+    """
+
+    def __init__(self):
+        self._http: httpx.AsyncClient = None
+        self._models = {}
+        self._configured = False
+        self._configure_lock = threading.Lock()
+
+    def startup(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                http2=settings.HTTP2_ENABLED,
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+                timeout=settings.HTTP_TIMEOUT_SECONDS,
+            )
+
+    async def shutdown(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self._models.clear()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Scripts that never run the app's startup hook still get a pooled client.
+        if self._http is None:
+            self.startup()
+        return self._http
+
+    def _configure_gemini(self):
+        with self._configure_lock:
+            if not self._configured:
+                genai.configure(api_key=settings.GOOGLE_API_KEY)
+                self._configured = True
+
+    def model(self, name: str = None) -> "genai.GenerativeModel":
+        """Returns a shared GenerativeModel handle for `name`."""
+        name = name or settings.GEMINI_MODEL
+        model = self._models.get(name)
+        if model is None:
+            if not self._configured:
+                self._configure_gemini()
+            # JSON mode: the model returns the bare object, with no fences to strip.
+            generation_config = {"response_mime_type": "application/json"} if settings.GEMINI_JSON_MODE else None
+            model = genai.GenerativeModel(name, generation_config=generation_config)
+            self._models[name] = model
+        return model
+
+    async def get_model(self, name: str = None) -> "genai.GenerativeModel":
+        """model() for async code: the first call imports and configures the SDK on a worker thread."""
+        model = self._models.get(name or settings.GEMINI_MODEL)
+        if model is None:
+            model = await asyncio.to_thread(self.model, name)
+        return model
+
+
+# Create a single, reusable instance for the app to use
+clients = ClientRegistry()
+on_prewarm(clients.model)
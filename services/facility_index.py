@@ -0,0 +1,205 @@
+import argparse
+import csv
+import json
+import math
+import os
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6_371_000.0
+METERS_PER_DEGREE_LAT = 111_320.0
+
+class _StringTable:
+    """Strings packed into one UTF-8 blob plus an offsets array (mmap-friendly)."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> "_StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+class FacilityIndex:
+    """
+    Offline nearest-facility index on a uniform lat/lon grid.
+
+    Facilities are sorted by grid cell id, so every row of cells overlapping a
+    query's bounding box is one contiguous slice of the coordinate arrays.
+    Candidate distances are then computed in one vectorized haversine pass.
+    All arrays can be saved to and memory-mapped from a directory of .npy files.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, names: _StringTable, addresses: _StringTable,
+                 cell_degrees: float, cell_ids: np.ndarray):
+        # All arrays must already be sorted by cell id; use build() or load().
+        self.cell_degrees = float(cell_degrees)
+        self.n_cols = int(math.ceil(360.0 / self.cell_degrees))
+        self.lats = lats
+        self.lons = lons
+        self.cell_ids = cell_ids
+        self.names = names
+        self.addresses = addresses
+
+    @classmethod
+    def build(cls, records: Iterable[Tuple[str, str, float, float]], cell_degrees: float = 0.05) -> "FacilityIndex":
+        """Builds an index from (name, address, lat, lon) records."""
+        names, addresses, lats, lons = [], [], [], []
+        for name, address, lat, lon in records:
+            # Exports can carry explicit nulls; use the placeholders the readers
+            # and the Geoapify path use, so a missing name looks the same everywhere.
+            names.append(name or "N/A")
+            addresses.append(address or "Address not available")
+            lats.append(lat)
+            lons.append(lon)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        n_cols = int(math.ceil(360.0 / cell_degrees))
+        cell_ids = cls._cell_rows(lats, cell_degrees) * n_cols + cls._cell_cols(lons, cell_degrees)
+        order = np.argsort(cell_ids, kind="stable")
+        return cls(
+            lats[order], lons[order],
+            _StringTable.from_strings(names[i] for i in order),
+            _StringTable.from_strings(addresses[i] for i in order),
+            cell_degrees, cell_ids[order],
+        )
+
+    @staticmethod
+    def _cell_rows(lats, cell_degrees: float):
+        # Clamped so lat 90.0 falls in the last row rather than one past it.
+        rows = np.floor((np.asarray(lats) + 90.0) / cell_degrees).astype(np.int64)
+        return np.clip(rows, 0, int(math.ceil(180.0 / cell_degrees)) - 1)
+
+    @staticmethod
+    def _cell_cols(lons, cell_degrees: float):
+        # Clamped so lon 180.0 falls in the last column, not column 0 of the next row.
+        cols = np.floor((np.asarray(lons) + 180.0) / cell_degrees).astype(np.int64)
+        return np.clip(cols, 0, int(math.ceil(360.0 / cell_degrees)) - 1)
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _candidates(self, latitude: float, longitude: float, radius_meters: float) -> np.ndarray:
+        d_lat = radius_meters / METERS_PER_DEGREE_LAT
+        d_lon = radius_meters / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+        row_lo = int(self._cell_rows(max(latitude - d_lat, -90.0), self.cell_degrees))
+        row_hi = int(self._cell_rows(min(latitude + d_lat, 90.0), self.cell_degrees))
+        col_lo = int(self._cell_cols(max(longitude - d_lon, -180.0), self.cell_degrees))
+        col_hi = int(self._cell_cols(min(longitude + d_lon, 180.0), self.cell_degrees))
+        # Boxes crossing the antimeridian are clipped to it.
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.n_cols
+        starts = np.searchsorted(self.cell_ids, rows + col_lo, side="left")
+        ends = np.searchsorted(self.cell_ids, rows + col_hi, side="right")
+        slices = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def _distances(self, latitude: float, longitude: float, idx: np.ndarray) -> np.ndarray:
+        phi1 = math.radians(latitude)
+        phi2 = np.radians(self.lats[idx])
+        d_phi = phi2 - phi1
+        d_lambda = np.radians(self.lons[idx] - longitude)
+        a = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+    def _results(self, idx: np.ndarray, distances: np.ndarray, limit: int) -> List[dict]:
+        if len(idx) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            idx, distances = idx[top], distances[top]
+        order = np.argsort(distances)
+        return [
+            {"name": self.names[int(i)], "address": self.addresses[int(i)], "distance_meters": int(d)}
+            for i, d in zip(idx[order], distances[order])
+        ]
+
+    def within_radius(self, latitude: float, longitude: float, radius_meters: float, limit: int) -> List[dict]:
+        """Nearest `limit` facilities within radius_meters, closest first."""
+        idx = self._candidates(latitude, longitude, radius_meters)
+        if len(idx) == 0:
+            return []
+        distances = self._distances(latitude, longitude, idx)
+        keep = distances <= radius_meters
+        return self._results(idx[keep], distances[keep], limit)
+
+    def nearest(self, latitude: float, longitude: float, k: int, max_radius_meters: float = 50_000.0) -> List[dict]:
+        """k nearest facilities, growing the search box until k are found or max_radius is hit."""
+        radius = self.cell_degrees * METERS_PER_DEGREE_LAT
+        while True:
+            results = self.within_radius(latitude, longitude, radius, k)
+            if len(results) >= k or radius >= max_radius_meters:
+                return results
+            radius = min(radius * 2, max_radius_meters)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "lats": self.lats, "lons": self.lons, "cell_ids": self.cell_ids,
+            "names_blob": self.names.blob, "names_offsets": self.names.offsets,
+            "addresses_blob": self.addresses.blob, "addresses_offsets": self.addresses.offsets,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"cell_degrees": self.cell_degrees, "count": len(self)}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "FacilityIndex":
+        mode = "r" if mmap else None
+        arr = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(
+            arr("lats"), arr("lons"),
+            _StringTable(arr("names_blob"), arr("names_offsets")),
+            _StringTable(arr("addresses_blob"), arr("addresses_offsets")),
+            meta["cell_degrees"], arr("cell_ids"),
+        )
+
+
+def read_geojson(path: str):
+    """Yields (name, address, lat, lon) from a GeoJSON FeatureCollection (e.g. a Geoapify/OSM export)."""
+    with open(path) as f:
+        data = json.load(f)
+    for feature in data.get("features", []):
+        properties = feature.get("properties", {})
+        coordinates = (feature.get("geometry") or {}).get("coordinates") or [None, None]
+        lat = properties.get("lat", coordinates[1])
+        lon = properties.get("lon", coordinates[0])
+        if lat is None or lon is None:
+            continue
+        yield (
+            properties.get("name") or "N/A",
+            properties.get("address_line2") or properties.get("formatted") or "Address not available",
+            float(lat), float(lon),
+        )
+
+def read_csv(path: str):
+    """Yields (name, address, lat, lon) from a CSV with name, address, lat/latitude, lon/longitude columns."""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            lat = row.get("lat", row.get("latitude"))
+            lon = row.get("lon", row.get("longitude"))
+            if not lat or not lon:
+                continue
+            yield row.get("name") or "N/A", row.get("address") or "Address not available", float(lat), float(lon)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an offline facility index from a GeoJSON or CSV dump.")
+    parser.add_argument("source", help="Path to a .geojson/.json or .csv file")
+    parser.add_argument("output", help="Directory to write the index to (FACILITY_INDEX_PATH)")
+    parser.add_argument("--cell-degrees", type=float, default=0.05)
+    args = parser.parse_args()
+    reader = read_csv if args.source.endswith(".csv") else read_geojson
+    index = FacilityIndex.build(reader(args.source), cell_degrees=args.cell_degrees)
+    index.save(args.output)
+    print(f"Indexed {len(index)} facilities into {args.output}")
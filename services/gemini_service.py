@@ -1,18 +1,28 @@
-import io
-import google.generativeai as genai # type: ignore
-import json
+from typing import AsyncIterator
+
+import orjson # type: ignore
 from config import settings
-from PIL import Image
+from services.clients import clients
+from services.analysis_cache import analysis_cache
+from services.image_processor import PreparedImage, image_processor
+from services.resilience import gemini_upstream, UpstreamUnavailable
+from services.metrics import observe
+from services.model_output import parse_analysis, ModelOutputError
 
-genai.configure(api_key=settings.GOOGLE_API_KEY)
+# Bump whenever a prompt template below (or the model's generation config)
+# changes, so cached analyses produced by the old prompt are no longer served.
+PROMPT_VERSION = "2"
 
-async def get_symptom_analysis(symptoms: str):
-    """
-    Sends symptoms to the Gemini API and gets a structured analysis.
-    """
+# Returned (never cached) when the resilience layer refuses a call, so callers can answer 503.
+UNAVAILABLE = {"error": "The analysis service is temporarily unavailable. Please retry shortly.", "status": "unavailable"}
+
+# Returned (never cached) when the model's output cannot be read as an analysis.
+INVALID_OUTPUT = {"error": "The model returned an unreadable analysis.", "status": "invalid"}
+
+def _symptom_prompt(symptoms: str) -> str:
     # This is a crucial step: engineering the prompt.
     # We instruct the model to return a JSON object with a specific structure.
-    prompt = f"""
+    return f"""
     Analyze the following symptoms and provide a probable medical condition analysis.
     The user's symptoms are: "{symptoms}".
 
@@ -31,24 +41,8 @@ async def get_symptom_analysis(symptoms: str):
     Only return the raw JSON object. Do not include any other text or markdown formatting like ```json.
     """
 
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = await model.generate_content_async(prompt)
-        
-        # Clean the response to ensure it's valid JSON
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        
-        # Parse the JSON string into a Python dictionary
-        return json.loads(cleaned_response)
-    except Exception as e:
-        print(f"Error during Gemini API call: {e}")
-        return {"error": "Failed to get analysis from the model."}
-    
-async def get_multimodal_analysis(symptoms: str, image_bytes: bytes):
-    """
-    Sends both text symptoms and an image to the Gemini API for analysis.
-    """
-    prompt = f"""
+def _multimodal_prompt(symptoms: str) -> str:
+    return f"""
     Analyze the following symptoms and the attached image to provide a probable medical condition analysis.
     The user's symptoms are: "{symptoms}".
 
@@ -67,17 +61,94 @@ async def get_multimodal_analysis(symptoms: str, image_bytes: bytes):
     Only return the raw JSON object. Do not include any other text or markdown formatting like ```json.
     """
 
+async def get_symptom_analysis(symptoms: str):
+    """
+    Sends symptoms to the Gemini API and gets a structured analysis.
+    Popular inputs (and near-duplicate phrasings of them) are served from the
+    analysis cache, and concurrent identical requests share one upstream call.
+    """
+    key = analysis_cache.key(settings.GEMINI_MODEL, PROMPT_VERSION, symptoms)
+    return await analysis_cache.get_or_compute(key, lambda: _generate_symptom_analysis(symptoms), text=symptoms)
+
+async def _generate_symptom_analysis(symptoms: str):
+    try:
+        model = await clients.get_model()
+        response = await gemini_upstream.call(lambda: observe("gemini", "text", model.generate_content_async(_symptom_prompt(symptoms))))
+        return parse_analysis(response.text)
+    except UpstreamUnavailable as e:
+        print(f"Skipped Gemini API call: {e}")
+        return dict(UNAVAILABLE)
+    except ModelOutputError as e:
+        print(f"Unreadable Gemini output: {e}")
+        return dict(INVALID_OUTPUT)
+    except Exception as e:
+        print(f"Error during Gemini API call: {e}")
+        return {"error": "Failed to get analysis from the model."}
+
+async def stream_symptom_analysis(symptoms: str) -> AsyncIterator[str]:
+    """
+    Yields the model's JSON output as it is generated.
+    A cached analysis is yielded whole; a fresh one is cached once complete.
+    """
+    key = analysis_cache.key(settings.GEMINI_MODEL, PROMPT_VERSION, symptoms)
+    cached = await analysis_cache.lookup(key, text=symptoms)
+    if cached is not None:
+        yield orjson.dumps(cached).decode()
+        return
+    parts = []
+    model = await clients.get_model()
+    response = await gemini_upstream.call(lambda: observe("gemini", "text_stream_start", model.generate_content_async(_symptom_prompt(symptoms), stream=True)))
+    async for chunk in response:
+        parts.append(chunk.text)
+        yield chunk.text
+    try:
+        await analysis_cache.store(key, parse_analysis("".join(parts)), text=symptoms)
+    except ValueError:
+        pass
+
+def _image_cache_key(symptoms: str, image: PreparedImage) -> str:
+    # The model sees the processed image, so the processing settings are part of the key.
+    return analysis_cache.key(settings.GEMINI_MODEL, PROMPT_VERSION, symptoms, "image", image.digest, image_processor.variant)
+
+async def get_multimodal_analysis(symptoms: str, image: PreparedImage):
+    """
+    Sends both text symptoms and an image to the Gemini API for analysis.
+    Re-submitting the same photo with the same symptoms is served from the cache.
+    """
+    key = _image_cache_key(symptoms, image)
+    return await analysis_cache.get_or_compute(key, lambda: _generate_multimodal_analysis(symptoms, image))
+
+async def _generate_multimodal_analysis(symptoms: str, image: PreparedImage):
     try:
-        # Load the image from bytes
-        img = Image.open(io.BytesIO(image_bytes))
-
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # The prompt is a list containing the text and the image
-        response = await model.generate_content_async([prompt, img])
-        
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(cleaned_response)
+        model = await clients.get_model()
+
+        # The prompt is a list containing the text and the already-encoded image
+        response = await gemini_upstream.call(lambda: observe("gemini", "multimodal", model.generate_content_async([_multimodal_prompt(symptoms), image.as_part()])))
+        return parse_analysis(response.text)
+    except UpstreamUnavailable as e:
+        print(f"Skipped Gemini API multimodal call: {e}")
+        return dict(UNAVAILABLE)
+    except ModelOutputError as e:
+        print(f"Unreadable Gemini multimodal output: {e}")
+        return dict(INVALID_OUTPUT)
     except Exception as e:
         print(f"Error during Gemini API multimodal call: {e}")
-        return {"error": f"An internal error occurred: {str(e)}"}
\ No newline at end of file
+        return {"error": f"An internal error occurred: {str(e)}"}
+
+async def stream_multimodal_analysis(symptoms: str, image: PreparedImage) -> AsyncIterator[str]:
+    """Yields the model's JSON output for text + image as it is generated."""
+    key = _image_cache_key(symptoms, image)
+    cached = await analysis_cache.lookup(key)
+    if cached is not None:
+        yield orjson.dumps(cached).decode()
+        return
+    parts = []
+    model = await clients.get_model()
+    response = await gemini_upstream.call(lambda: observe("gemini", "multimodal_stream_start", model.generate_content_async([_multimodal_prompt(symptoms), image.as_part()], stream=True)))
+    async for chunk in response:
+        parts.append(chunk.text)
+        yield chunk.text
+    try:
+        await analysis_cache.store(key, parse_analysis("".join(parts)))
+    except ValueError:
+        pass
@@ -0,0 +1,142 @@
+import math
+from typing import List, Optional, Tuple
+
+from config import settings
+from services.cache import SQLiteCache, TTLCache, shared_cache
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_METERS = 6_371_000.0
+
+def geohash_bounds(latitude: float, longitude: float, precision: int) -> Tuple[str, float, float, float, float]:
+    """Returns (geohash, min_lat, max_lat, min_lon, max_lon) of the tile containing the point."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars), lat_lo, lat_hi, lon_lo, lon_hi
+
+def haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+class GeoTile:
+    """A geohash tile: its cache key, center, and the center-to-corner distance."""
+
+    def __init__(self, latitude: float, longitude: float, precision: int):
+        self.key, lat_lo, lat_hi, lon_lo, lon_hi = geohash_bounds(latitude, longitude, precision)
+        self.center_lat = (lat_lo + lat_hi) / 2
+        self.center_lon = (lon_lo + lon_hi) / 2
+        self.half_diagonal_meters = haversine_meters(self.center_lat, self.center_lon, lat_hi, lon_hi)
+
+class GeoCache:
+    """
+    Caches nearby-place results per geohash tile.
+
+    A miss queries the upstream once around the tile center with the search
+    radius widened by the tile's half-diagonal, so the cached set covers every
+    point in the tile. A hit recomputes distances from the caller's exact
+    point, drops places outside the radius and returns the nearest `limit`.
+
+    When the upstream cut the tile's answer off at its limit, the set is only
+    complete up to the farthest place it holds from the tile center, and a
+    caller near the tile's edge may have closer places that were cut off.
+    nearest_covered() answers only callers that set provably covers.
+    """
+
+    def __init__(self, backend, precision: int):
+        self.backend = backend
+        self.precision = precision
+        self.uncovered = 0
+
+    def tile(self, latitude: float, longitude: float) -> GeoTile:
+        return GeoTile(latitude, longitude, self.precision)
+
+    async def get(self, tile: GeoTile) -> Optional[List[dict]]:
+        return await self.backend.aget(f"hospitals:{tile.key}")
+
+    async def set(self, tile: GeoTile, places: List[dict]) -> None:
+        await self.backend.aset(f"hospitals:{tile.key}", places)
+
+    @staticmethod
+    def nearest(places: List[dict], latitude: float, longitude: float, radius_meters: float, limit: int) -> List[dict]:
+        """Projects cached places to the caller: exact distances, radius filter, nearest first."""
+        results = []
+        for place in places:
+            distance = haversine_meters(latitude, longitude, place["lat"], place["lon"])
+            if distance <= radius_meters:
+                results.append({
+                    "name": place["name"],
+                    "address": place["address"],
+                    "distance_meters": int(distance),
+                })
+        results.sort(key=lambda h: h["distance_meters"])
+        return results[:limit]
+
+    def nearest_covered(self, tile: GeoTile, places: List[dict], latitude: float, longitude: float,
+                        radius_meters: float, limit: int, fetch_limit: int) -> Optional[List[dict]]:
+        """
+        nearest() for a point in `tile`, or None when the tile's places, fetched
+        with `fetch_limit`, can't vouch for it and the caller should query live.
+
+        A truncated set holds every place within `covered` of the tile center,
+        so around the caller it is complete within `covered - offset`. The
+        answer stands if that reaches the caller's `limit`-th nearest place or,
+        with fewer results, the whole search radius.
+        """
+        results = self.nearest(places, latitude, longitude, radius_meters, limit)
+        if len(places) < fetch_limit:
+            # The fetch returned everything within radius + half-diagonal.
+            return results
+        covered = max(haversine_meters(tile.center_lat, tile.center_lon, p["lat"], p["lon"]) for p in places)
+        offset = haversine_meters(tile.center_lat, tile.center_lon, latitude, longitude)
+        # distance_meters is truncated to whole meters.
+        needed = results[-1]["distance_meters"] + 1 if len(results) == limit else radius_meters
+        if needed <= covered - offset:
+            return results
+        self.uncovered += 1
+        return None
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "uncovered": self.uncovered}
+
+
+def _create_backend():
+    if settings.GEO_CACHE_BACKEND == "sqlite":
+        return SQLiteCache(settings.GEO_CACHE_PATH, max_entries=settings.GEO_CACHE_MAX_ENTRIES, default_ttl=settings.GEO_CACHE_TTL_SECONDS)
+    shared = shared_cache("geo", max_entries=settings.GEO_CACHE_MAX_ENTRIES, default_ttl=settings.GEO_CACHE_TTL_SECONDS)
+    if shared is not None:
+        return shared
+    return TTLCache(max_entries=settings.GEO_CACHE_MAX_ENTRIES, default_ttl=settings.GEO_CACHE_TTL_SECONDS)
+
+
+# Create a single, reusable instance for the app to use
+geo_cache = GeoCache(_create_backend(), precision=settings.GEO_CACHE_PRECISION)
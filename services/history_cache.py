@@ -0,0 +1,89 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from config import settings
+from services.cache import TTLCache, shared_cache
+
+def encode_cursor(created_at: str, entry_id: int) -> str:
+    """Opaque keyset cursor pointing just past the given (created_at, id)."""
+    raw = json.dumps([created_at, entry_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, entry_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid history cursor.") from e
+    if not isinstance(created_at, str) or not isinstance(entry_id, int):
+        raise ValueError("Invalid history cursor.")
+    # The timestamp is interpolated into a PostgREST filter, so only accept real timestamps.
+    datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    return created_at, entry_id
+
+def history_page(rows: list, limit: int) -> dict:
+    """Builds a page from `limit + 1` fetched rows; the extra row only signals that more exist."""
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and items:
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
+
+class HistoryPageCache:
+    """
+    Per-user cache of the first /history page (one entry per page size).
+
+    The history writer calls `invalidate` after each flush. A page is only
+    stored if no flush happened while it was being fetched (tracked with a
+    global epoch), so a read racing a write can't cache a page missing the
+    new row.
+
+    With SHARED_CACHE_DIR set, pages are shared by all worker processes, so a
+    flush in one worker invalidates the page for every worker. The epoch is
+    still per process: a read racing a flush in another worker may cache a
+    stale page until the TTL runs out.
+    """
+
+    def __init__(self, max_users: int, ttl_seconds: float):
+        self._pages = shared_cache("history_pages", max_entries=max_users, default_ttl=ttl_seconds)
+        if self._pages is None:
+            self._pages = TTLCache(max_entries=max_users, default_ttl=ttl_seconds)
+        self._epoch = 0
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    # Keys are strings so the pages survive a JSON round trip in the shared cache.
+    async def get(self, user_id: int, limit: int) -> Optional[dict]:
+        pages = await self._pages.aget(str(user_id))
+        if pages is None:
+            return None
+        return pages.get(str(limit))
+
+    async def put(self, user_id: int, limit: int, page: dict, epoch: int) -> None:
+        if epoch != self._epoch:
+            return
+        pages = await self._pages.aget(str(user_id)) or {}
+        # A flush may have happened while reading the other page sizes.
+        if epoch != self._epoch:
+            return
+        pages[str(limit)] = page
+        await self._pages.aset(str(user_id), pages)
+
+    async def invalidate(self, user_ids) -> None:
+        # The epoch moves before any await, so a racing put() sees it.
+        self._epoch += 1
+        for user_id in user_ids:
+            await self._pages.adelete(str(user_id))
+
+    def stats(self) -> dict:
+        return self._pages.stats()
+
+
+history_cache = HistoryPageCache(
+    max_users=settings.HISTORY_CACHE_MAX_USERS,
+    ttl_seconds=settings.HISTORY_CACHE_TTL_SECONDS,
+)
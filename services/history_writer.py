@@ -0,0 +1,387 @@
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterator, List, Optional
+from config import settings
+from services.supabase_service import supabase_service
+from services.history_cache import history_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: one worker, one journal
+    fcntl = None
+
+def _journal_slot(path: str, slot: int) -> str:
+    """history_journal.jsonl, history_journal.1.jsonl, history_journal.2.jsonl, ..."""
+    if slot == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{slot}{ext}"
+
+def _try_lock(path: str):
+    """An exclusive lock on `path`.lock, held until the returned file is closed; None if taken."""
+    lock = open(f"{path}.lock", "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return None
+    return lock
+
+def _unsaved_rows(path: str) -> Iterator[dict]:
+    """Streams the rows of a journal above its last ack (two passes, constant memory)."""
+    acked = -1
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith('{"ack"'):
+                try:
+                    acked = max(acked, json.loads(line)["ack"])
+                except ValueError:
+                    pass
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith('{"ack"'):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn write from a crash
+            if entry["seq"] > acked:
+                yield entry["row"]
+
+class HistoryWriter:
+    """
+    Write-behind queue for query_history rows.
+
+    `enqueue` appends the row to an append-only journal and returns as soon as
+    it is queued; a background task groups rows into bulk inserts, flushing
+    when `batch_size` rows are waiting or `flush_interval` has passed. The
+    queue is bounded, so producers wait (backpressure) instead of growing
+    memory without limit. Failed inserts are retried with jittered
+    exponential backoff, up to `max_attempts` times. A batch still failing
+    after that takes in the rows waiting behind it and is split in halves to
+    find the rows that can't be inserted (e.g. a constraint violation). If
+    the other rows go in, the failing ones are moved to a dead-letter file,
+    so one bad row can't stall the queue; if none do, the database is down
+    and the batch is kept and retried.
+
+    The journal holds `{"seq": n, "row": {...}}` lines and `{"ack": n}` lines
+    written after each successful insert. Batches are flushed in order, so
+    every row with a seq above the last ack is unsaved. The file is truncated
+    whenever the queue is fully drained, and compacted to the unsaved rows
+    once it passes `compact_bytes` and is mostly acked lines, so it stays
+    small under steady traffic. Delivery is at-least-once: a batch
+    interrupted mid-insert by shutdown is replayed.
+
+    On start the journal left by the previous run is renamed to a backlog
+    file, and streamed back into the queue by a background task once the app
+    is serving, leaving room in the queue for new rows. Dead-letter files use
+    the journal format; rename one to `*.backlog.jsonl` to retry its rows.
+
+    Several worker processes can share one `journal_path`: each locks the
+    first free slot (history_journal.jsonl, history_journal.1.jsonl, ...),
+    and also takes over as backlog any journal that no running worker holds,
+    e.g. after the worker count was reduced.
+    """
+
+    def __init__(self, insert_batch: Callable[[List[dict]], Awaitable[bool]], journal_path: Optional[str],
+                 max_queue: int, batch_size: int, flush_interval: float, max_backoff: float, enabled: bool = True,
+                 on_flushed: Optional[Callable[[List[dict]], Awaitable[None]]] = None, max_attempts: int = 6,
+                 compact_bytes: int = 16 * 1024 * 1024):
+        self._insert_batch = insert_batch
+        self._journal_base = journal_path
+        self.journal_path = journal_path
+        self.dead_letter_path: Optional[str] = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.compact_bytes = compact_bytes
+        self.enabled = enabled
+        self._on_flushed = on_flushed
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._journal = None
+        self._journal_lock = None
+        self._seq = 0
+        # Unsaved rows by seq, with the size of their journal line (for compaction).
+        self._pending: "OrderedDict[int, tuple]" = OrderedDict()
+        self._pending_bytes = 0
+        self._task: Optional[asyncio.Task] = None
+        self._backlog_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.replayed_rows = 0
+        self.compactions = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.flushes = 0
+
+    @property
+    def _unacked(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        if self.journal_path:
+            slot = 0
+            while fcntl is not None and self._journal_lock is None:
+                self.journal_path = _journal_slot(self._journal_base, slot)
+                self._journal_lock = _try_lock(self.journal_path)
+                slot += 1
+            root, ext = os.path.splitext(self.journal_path)
+            self.dead_letter_path = f"{root}.dead{ext}"
+            self._to_backlog(self.journal_path)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._task = asyncio.ensure_future(self._run())
+        if self.journal_path:
+            # Replays in the background, so a large backlog doesn't hold up startup.
+            self._backlog_task = asyncio.ensure_future(self._drain_backlog())
+
+    def _to_backlog(self, path: str):
+        """Renames a journal with content to a new backlog file (atomic, so no row is lost or doubled)."""
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            root, ext = os.path.splitext(self._journal_base)
+            os.replace(path, f"{root}.{time.time_ns()}-{os.getpid()}.backlog{ext}")
+
+    def _other_journals(self) -> list:
+        base = self._journal_base
+        root, ext = os.path.splitext(base)
+        return [base] + [path for path in glob.glob(f"{glob.escape(root)}.*{ext}")
+                         if path[len(root) + 1:-len(ext) or None].isdigit()]
+
+    async def _drain_backlog(self):
+        if fcntl is not None:
+            for path in self._other_journals():
+                if path == self.journal_path or not os.path.exists(path):
+                    continue
+                lock = _try_lock(path)
+                if lock is None:
+                    continue  # a running worker's own journal
+                try:
+                    self._to_backlog(path)
+                finally:
+                    lock.close()
+        root, ext = os.path.splitext(self._journal_base)
+        for path in sorted(glob.glob(f"{glob.escape(root)}.*.backlog{ext}")):
+            lock = _try_lock(path) if fcntl is not None else None
+            if fcntl is not None and lock is None:
+                continue  # being drained by another worker
+            try:
+                if not os.path.exists(path):
+                    continue
+                count = 0
+                for row in _unsaved_rows(path):
+                    # Leave half the queue to new rows.
+                    while self._queue.maxsize and self._queue.qsize() >= self._queue.maxsize // 2:
+                        await asyncio.sleep(self.flush_interval)
+                    # Re-journaled in our file before the backlog file is removed.
+                    await self.enqueue(row)
+                    count += 1
+                self.replayed_rows += count
+                if count:
+                    print(f"Replayed {count} unsaved history rows from {path}.")
+                os.remove(path)
+            finally:
+                if lock is not None:
+                    if not os.path.exists(path):
+                        os.remove(f"{path}.lock")
+                    lock.close()
+
+    def _journal_write(self, entry: dict) -> int:
+        if self._journal is None:
+            return 0
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        self._journal.write(line)
+        self._journal.flush()
+        return len(line)
+
+    async def enqueue(self, row: dict):
+        """Queues a row for insertion, waiting only if the queue is full."""
+        if self._task is None:
+            # Write-behind disabled (or not started): insert inline.
+            if await self._insert_batch([row]) and self._on_flushed is not None:
+                await self._on_flushed([row])
+            return
+        seq = self._seq
+        self._seq += 1
+        await self._queue.put((seq, row))
+        # Nothing below awaits, so the flusher cannot ack this seq before its
+        # journal line exists, and a put cancelled while waiting journals nothing.
+        size = self._journal_write({"seq": seq, "row": row})
+        self._pending[seq] = (row, size)
+        self._pending_bytes += size
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            await self._flush(batch)
+
+    async def _insert_retrying(self, rows: list) -> bool:
+        for attempt in range(self.max_attempts):
+            if await self._insert_batch(rows):
+                return True
+            self.failed_flushes += 1
+            if self._stopping:
+                # Leave the rows in the journal for the next start.
+                raise asyncio.CancelledError()
+            if attempt + 1 < self.max_attempts:
+                await asyncio.sleep(random.uniform(0, min(self.max_backoff, 0.5 * 2 ** attempt)))
+        return False
+
+    async def _isolate(self, rows: list) -> tuple:
+        """Inserts what it can of a batch that keeps failing by halving it; returns (saved, failed) rows."""
+        if self._stopping:
+            raise asyncio.CancelledError()
+        if len(rows) == 1:
+            return [], rows
+        saved, failed = [], []
+        middle = len(rows) // 2
+        for half in (rows[:middle], rows[middle:]):
+            if await self._insert_batch(half):
+                saved.extend(half)
+            else:
+                self.failed_flushes += 1
+                half_saved, half_failed = await self._isolate(half)
+                saved.extend(half_saved)
+                failed.extend(half_failed)
+        return saved, failed
+
+    def _dead_letter(self, row: dict):
+        self.dead_lettered += 1
+        if self.dead_letter_path is None:
+            print(f"Dropping a history row for user {row.get('user_id')} the database rejects.")
+            return
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"seq": self.dead_lettered, "row": row}, separators=(",", ":")) + "\n")
+        print(f"Moved a history row for user {row.get('user_id')} the database rejects to {self.dead_letter_path}.")
+
+    async def _flush(self, batch: list):
+        rows = [row for _, row in batch]
+        start = time.perf_counter()
+        while not await self._insert_retrying(rows):
+            # Take in what is waiting, so a failing row can be told apart from a failing database.
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            rows = [row for _, row in batch]
+            saved, failed = await self._isolate(rows)
+            if saved:
+                # The database takes other rows. Give each failed row one more try on
+                # its own (the database may have come back mid-split), then give up on it.
+                for row in failed:
+                    if await self._insert_batch([row]):
+                        saved.append(row)
+                    else:
+                        self._dead_letter(row)
+                break
+            # Nothing could be inserted: the database is down, not the rows. Keep them.
+            await asyncio.sleep(self.max_backoff)
+        else:
+            saved = rows
+        elapsed = time.perf_counter() - start
+        self.last_flush_seconds = elapsed
+        self.total_flush_seconds += elapsed
+        self.flushes += 1
+        self.flushed_rows += len(saved)
+        for seq, _ in batch:
+            _, size = self._pending.pop(seq)
+            self._pending_bytes -= size
+        self._journal_write({"ack": batch[-1][0]})
+        if self._journal is not None:
+            if not self._pending:
+                self._journal.truncate(0)
+                self._journal.seek(0)
+            elif self._journal.tell() > max(self.compact_bytes, 2 * self._pending_bytes):
+                self._compact()
+        if saved and self._on_flushed is not None:
+            await self._on_flushed(saved)
+
+    def _compact(self):
+        """Rewrites the journal with only the unsaved rows; the swap is atomic."""
+        temp_path = f"{self.journal_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for seq, (row, _) in self._pending.items():
+                f.write(json.dumps({"seq": seq, "row": row}, separators=(",", ":")) + "\n")
+        self._journal.close()
+        os.replace(temp_path, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self.compactions += 1
+
+    async def stop(self, timeout: float):
+        """Flushes what is queued within `timeout`; anything left stays in the journal."""
+        if self._task is None:
+            return
+        if self._backlog_task is not None:
+            # A partly replayed backlog file is replayed again on the next start.
+            self._backlog_task.cancel()
+            try:
+                await self._backlog_task
+            except asyncio.CancelledError:
+                pass
+            self._backlog_task = None
+        deadline = time.monotonic() + timeout
+        while self._unacked and time.monotonic() < deadline and not self._task.done():
+            await asyncio.sleep(0.05)
+        self._stopping = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._unacked:
+            print(f"{self._unacked} history rows left in {self.journal_path} for replay on next start.")
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._journal_lock is not None:
+            self._journal_lock.close()
+            self._journal_lock = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "unacked": self._unacked,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+            "replayed_rows": self.replayed_rows,
+            "compactions": self.compactions,
+            "last_flush_seconds": self.last_flush_seconds,
+            "mean_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
+
+
+# Create a single, reusable instance for the app to use
+history_writer = HistoryWriter(
+    insert_batch=supabase_service.save_query_history_batch,
+    journal_path=settings.HISTORY_JOURNAL_PATH,
+    max_queue=settings.HISTORY_QUEUE_MAX,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL_SECONDS,
+    max_backoff=settings.HISTORY_RETRY_MAX_BACKOFF_SECONDS,
+    max_attempts=settings.HISTORY_RETRY_MAX_ATTEMPTS,
+    compact_bytes=settings.HISTORY_JOURNAL_COMPACT_BYTES,
+    enabled=settings.HISTORY_WRITE_BEHIND,
+    # New rows change the first /history page of their users.
+    on_flushed=lambda rows: history_cache.invalidate({row["user_id"] for row in rows}),
+)
@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from config import settings
+from services.cache import TTLCache
+from services.lazy import lazy_import
+
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds the configured size cap."""
+
+class InvalidImage(Exception):
+    """Raised when an upload cannot be decoded as an image."""
+
+# Output format -> (MIME type, file extension).
+FORMATS = {
+    "JPEG": ("image/jpeg", "jpg"),
+    "WEBP": ("image/webp", "webp"),
+    "PNG": ("image/png", "png"),
+}
+
+class UploadLimitMiddleware:
+    """
+    Pure ASGI middleware capping request bodies under `path_prefix`.
+
+    The multipart parser spools the whole body before an endpoint sees the
+    upload, so the cap has to be applied while the body is received: a
+    declared Content-Length over `max_bytes` is refused before any of it is
+    read, and a body without one (chunked) is counted as it arrives and
+    refused with 413 as soon as it goes over.
+    """
+
+    def __init__(self, app, path_prefix: str, max_bytes: int):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await JSONResponse(status_code=413, content={"detail": "Image is too large."})(scope, receive, send)
+                return
+
+        received = 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised into the body parser; FastAPI answers it like any HTTPException.
+                    raise HTTPException(status_code=413, detail="Image is too large.")
+            return message
+
+        await self.app(scope, counting_receive, send)
+
+async def read_upload(upload, max_bytes: int, chunk_size: int = 64 * 1024) -> bytes:
+    """
+    Reads a parsed UploadFile in chunks, refusing it once it exceeds max_bytes.
+    The request body was already received (and capped, with some room for the
+    multipart framing, by UploadLimitMiddleware); this caps the file part itself.
+    """
+    size = getattr(upload, "size", None)
+    if size is not None and size > max_bytes:
+        raise ImageTooLarge()
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise ImageTooLarge()
+    return bytes(buffer)
+
+class PreparedImage:
+    """A downscaled, re-encoded upload plus the SHA-256 of the original bytes."""
+
+    def __init__(self, data: bytes, mime_type: str, extension: str, digest: str, width: int, height: int):
+        self.data = data
+        self.mime_type = mime_type
+        self.extension = extension
+        self.digest = digest
+        self.width = width
+        self.height = height
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.digest}.{self.extension}"
+
+    def as_part(self) -> dict:
+        """Inline-data content part for the Gemini API."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+def _digest(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+def _prepare(raw: bytes, digest: str, max_side: int, image_format: str, quality: int) -> PreparedImage:
+    try:
+        with Image.open(io.BytesIO(raw)) as original:
+            # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale, which is
+            # where most of the time and memory of a full decode goes.
+            scale = max_side / max(original.size)
+            if scale < 1:
+                original.draft("RGB", (int(original.width * scale), int(original.height * scale)))
+            # In place, to avoid a second full-size copy.
+            ImageOps.exif_transpose(original, in_place=True)
+            img = original if original.mode == "RGB" else original.convert("RGB")
+            img.thumbnail((max_side, max_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+            out = io.BytesIO()
+            img.save(out, format=image_format, quality=quality, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e)) from e
+    mime_type, extension = FORMATS[image_format]
+    return PreparedImage(out.getvalue(), mime_type, extension, digest, img.width, img.height)
+
+class ImageProcessor:
+    """
+    Decodes, downsamples and re-encodes uploads on a worker pool.
+
+    Images are shrunk to `max_side` pixels on the long edge (more detail than
+    that is not used by the model) and re-encoded as `image_format`. Results
+    are kept for a while by content hash, so an identical re-upload skips the
+    decode. Pillow releases the GIL while decoding and resampling, so a
+    thread pool runs these in parallel.
+    """
+
+    def __init__(self, max_side: int, image_format: str, quality: int, max_workers: Optional[int],
+                 cache_bytes: int, cache_ttl_seconds: float):
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported IMAGE_FORMAT {image_format!r}; expected one of {sorted(FORMATS)}.")
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: ThreadPoolExecutor = None
+        self._recent = TTLCache(max_entries=10_000, default_ttl=cache_ttl_seconds, max_bytes=cache_bytes,
+                                sizeof=lambda prepared: len(prepared.data))
+        self.processed = 0
+        self.reused = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_seconds = 0.0
+
+    @property
+    def variant(self) -> str:
+        """Identifies the processing settings, for cache keys of results derived from the output."""
+        return f"{self.max_side}:{self.image_format}:{self.quality}"
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image")
+        return self._executor
+
+    async def prepare(self, raw: bytes) -> PreparedImage:
+        loop = asyncio.get_running_loop()
+        digest = await loop.run_in_executor(self._get_executor(), _digest, raw)
+        prepared = self._recent.get(digest)
+        if prepared is not None:
+            self.reused += 1
+            return prepared
+        start = time.perf_counter()
+        prepared = await loop.run_in_executor(
+            self._get_executor(), _prepare, raw, digest, self.max_side, self.image_format, self.quality,
+        )
+        self.total_seconds += time.perf_counter() - start
+        self.processed += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(prepared.data)
+        self._recent.set(digest, prepared)
+        return prepared
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.processed,
+            "reused": self.reused,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "mean_seconds": self.total_seconds / self.processed if self.processed else 0.0,
+            "recent": self._recent.stats(),
+        }
+
+
+# Create a single, reusable instance for the app to use
+image_processor = ImageProcessor(
+    max_side=settings.IMAGE_MAX_SIDE,
+    image_format=settings.IMAGE_FORMAT,
+    quality=settings.IMAGE_QUALITY,
+    max_workers=settings.IMAGE_WORKERS,
+    cache_bytes=settings.IMAGE_CACHE_MAX_BYTES,
+    cache_ttl_seconds=settings.IMAGE_CACHE_TTL_SECONDS,
+)
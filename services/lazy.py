@@ -0,0 +1,105 @@
+import asyncio
+import importlib
+import threading
+import time
+import types
+from typing import Callable, Dict, List
+
+from config import settings
+
+class LazyModule(types.ModuleType):
+    """
+    Stands in for a module until one of its attributes is first used, then
+    imports it and forwards every lookup. Loading is guarded by a lock, so the
+    first use may come from any thread (executors, the prewarm task).
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    _load_seconds[self.__name__] = time.perf_counter() - start
+                    self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+_modules: Dict[str, LazyModule] = {}
+_load_seconds: Dict[str, float] = {}
+_prewarm_hooks: List[Callable[[], None]] = []
+
+def lazy_import(name: str):
+    """
+    `genai = lazy_import("google.generativeai")` at module level defers the
+    import to first attribute access. With LAZY_IMPORTS off the module is
+    imported right away and returned as-is.
+    """
+    if not settings.LAZY_IMPORTS:
+        return importlib.import_module(name)
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = LazyModule(name)
+    return module
+
+async def ensure_loaded(module):
+    """
+    Imports a lazy module on a worker thread if it isn't loaded yet, so async
+    code can use it without the import blocking the event loop. If prewarm is
+    importing it already, this waits for that import, also off the loop.
+    """
+    if isinstance(module, LazyModule) and not module.loaded:
+        await asyncio.to_thread(module._load)
+    return module
+
+def on_prewarm(hook: Callable[[], None]):
+    """Registers a blocking setup step (e.g. creating an SDK client) for prewarm() to run."""
+    _prewarm_hooks.append(hook)
+    return hook
+
+async def prewarm(delay: float = 0.0):
+    """
+    Imports every lazy module not yet used, then runs the registered hooks,
+    one at a time on a worker thread. Started from the startup hook so the
+    first real request finds the SDKs loaded without delaying the port bind.
+    Imports hold the GIL, so requests served meanwhile run somewhat slower.
+    """
+    await asyncio.sleep(delay)
+    start = time.perf_counter()
+    for module in list(_modules.values()):
+        if not module.loaded:
+            try:
+                await asyncio.to_thread(module._load)
+            except Exception as e:
+                print(f"Prewarm of {module.__name__} failed: {e}")
+    for hook in _prewarm_hooks:
+        try:
+            await asyncio.to_thread(hook)
+        except Exception as e:
+            print(f"Prewarm hook {getattr(hook, '__qualname__', hook)} failed: {e}")
+    print(f"Prewarm finished in {time.perf_counter() - start:.2f}s.")
+
+def stats() -> dict:
+    return {
+        "registered": len(_modules),
+        "loaded": sum(module.loaded for module in _modules.values()),
+        "load_seconds": {name.replace(".", "_"): seconds for name, seconds in _load_seconds.items()},
+    }
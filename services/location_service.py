@@ -1,76 +1,166 @@
 import httpx # type: ignore
 from config import settings
+from services.clients import clients
+from services.resilience import geoapify_upstream, UpstreamUnavailable
+from services.geo_cache import geo_cache
+from services.cache import SingleFlight
+from services.place_query import CategoryRejected, PlaceQueryEngine
+from services.metrics import timed
 
-async def get_nearby_hospitals(latitude: float, longitude: float):
+BASE_URL = settings.GEOAPIFY_BASE_URL
+# Preferred categories: hospital + clinic_or_praxis (supported by Geoapify)
+PREFERRED_CATEGORIES = "healthcare.hospital,healthcare.clinic_or_praxis"
+FALLBACK_CATEGORIES = "healthcare.hospital,healthcare"  # fallback if strict categories rejected
+
+def _parse_features(data: dict) -> list:
+    """Converts a Geoapify FeatureCollection into place dicts with coordinates."""
+    places = []
+    for feature in data.get("features", []):
+        properties = feature.get("properties", {})
+        coordinates = (feature.get("geometry") or {}).get("coordinates") or [None, None]
+        lat = properties.get("lat", coordinates[1])
+        lon = properties.get("lon", coordinates[0])
+        if lat is None or lon is None:
+            continue
+        places.append({
+            "name": properties.get("name") or "N/A",
+            "address": properties.get("address_line2") or properties.get("formatted") or "Address not available",
+            "lat": lat,
+            "lon": lon,
+        })
+    return places
+
+place_query = PlaceQueryEngine(
+    [("preferred", PREFERRED_CATEGORIES), ("fallback", FALLBACK_CATEGORIES)],
+    recheck_after=settings.HOSPITALS_CATEGORY_RECHECK_SECONDS,
+    hedge_percentile=settings.HOSPITALS_HEDGE_PERCENTILE if settings.HOSPITALS_HEDGE_ENABLED else None,
+    hedge_min_samples=settings.HOSPITALS_HEDGE_MIN_SAMPLES,
+    hedge_min_delay=settings.HOSPITALS_HEDGE_MIN_DELAY_SECONDS,
+)
+
+async def _fetch_places(latitude: float, longitude: float, radius_meters: float, limit: int):
     """
-    Finds nearby hospitals using the Geoapify Places API.
-    Use supported categories: healthcare.hospital and healthcare.clinic_or_praxis
+    Queries the Geoapify Places API around a point.
+    Returns a list of places (with lat/lon) or an error dict.
     """
-    api_key = settings.GEOAPIFY_API_KEY
-    base_url = "https://api.geoapify.com/v2/places"
-
-    # Preferred categories: hospital + clinic_or_praxis (supported by Geoapify)
-    preferred_categories = "healthcare.hospital,healthcare.clinic_or_praxis"
-    fallback_categories = "healthcare.hospital,healthcare"  # fallback if strict categories rejected
     params = {
-        "categories": preferred_categories,
-        "filter": f"circle:{longitude},{latitude},5000",
+        "filter": f"circle:{longitude},{latitude},{int(radius_meters)}",
         "bias": f"proximity:{longitude},{latitude}",
-        "limit": 7,
-        "apiKey": api_key
+        "limit": limit,
+        "apiKey": settings.GEOAPIFY_API_KEY
     }
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            response = await client.get(base_url, params=params)
+    client = clients.http
+
+    async def fetch(categories: str):
+        async def get():
+            with timed("geoapify", "places"):
+                response = await client.get(BASE_URL, params={**params, "categories": categories})
             response.raise_for_status()
-            data = response.json()
-            hospitals = []
-            for feature in data.get("features", []):
-                properties = feature.get("properties", {})
-                hospitals.append({
-                    "name": properties.get("name", "N/A"),
-                    "address": properties.get("address_line2", properties.get("formatted", "Address not available")),
-                    "distance_meters": int(properties.get("distance", 0))
-                })
-            return hospitals
+            return response
 
+        try:
+            response = await geoapify_upstream.call(get)
         except httpx.HTTPStatusError as e:
-            # If Geoapify rejects our preferred category, try a fallback category set once
-            status = e.response.status_code
-            body = e.response.text
-            print(f"Geoapify HTTP error: {status} - {body}")
-
-            # If 400 and looks like "Invalid parameters" for categories, attempt fallback
-            if status == 400 and "Invalid parameters" in body:
-                print("Attempting fallback categories:", fallback_categories)
-                params["categories"] = fallback_categories
-                try:
-                    resp2 = await client.get(base_url, params=params)
-                    resp2.raise_for_status()
-                    data2 = resp2.json()
-                    hospitals = []
-                    for feature in data2.get("features", []):
-                        properties = feature.get("properties", {})
-                        hospitals.append({
-                            "name": properties.get("name", "N/A"),
-                            "address": properties.get("address_line2", properties.get("formatted", "Address not available")),
-                            "distance_meters": int(properties.get("distance", 0))
-                        })
-                    return hospitals
-                except httpx.HTTPStatusError as e2:
-                    print(f"Fallback also failed: {e2.response.status_code} - {e2.response.text}")
-                    return {"error": f"Error from location service: {e2.response.status_code} - {e2.response.text}"}
-                except Exception as ex2:
-                    print("Unexpected error on fallback:", ex2)
-                    return {"error": "Unexpected error contacting location service in fallback."}
-            else:
-                return {"error": f"Error from location service: {status} - {body}"}
-
-        except httpx.RequestError as e:
-            print(f"Request error while contacting Geoapify: {e}")
-            return {"error": "Failed to connect to the location service."}
-
-        except Exception as e:
-            print("Unexpected exception in get_nearby_hospitals:", e)
-            return {"error": f"An unexpected error occurred: {str(e)}"}
+            # Geoapify answers an unsupported category set with 400 "Invalid parameters".
+            if e.response.status_code == 400 and "Invalid parameters" in e.response.text:
+                print(f"Geoapify rejected categories {categories}: {e.response.text}")
+                raise CategoryRejected(categories) from e
+            raise
+        return _parse_features(response.json())
+
+    try:
+        return await place_query.query(fetch)
+
+    except UpstreamUnavailable as e:
+        print(f"Skipped Geoapify call: {e}")
+        return {"error": "Location service is temporarily unavailable.", "status": "unavailable"}
+
+    except CategoryRejected as e:
+        print(f"Every Geoapify category set was rejected: {e}")
+        return {"error": "Location service rejected every category set."}
+
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        body = e.response.text
+        print(f"Geoapify HTTP error: {status} - {body}")
+        return {"error": f"Error from location service: {status} - {body}"}
+
+    except httpx.RequestError as e:
+        print(f"Request error while contacting Geoapify: {e}")
+        return {"error": "Failed to connect to the location service."}
+
+    except Exception as e:
+        print("Unexpected exception in get_nearby_hospitals:", e)
+        return {"error": f"An unexpected error occurred: {str(e)}"}
+
+_tile_flights = SingleFlight()
+
+async def _get_remote_hospitals(latitude: float, longitude: float):
+    """Geoapify lookup, served from the geohash tile cache when possible."""
+    radius = settings.HOSPITALS_SEARCH_RADIUS_METERS
+    limit = settings.HOSPITALS_LIMIT
+    if not settings.GEO_CACHE_ENABLED:
+        places = await _fetch_places(latitude, longitude, radius, limit)
+        if isinstance(places, dict):
+            return places
+        return geo_cache.nearest(places, latitude, longitude, radius, limit)
+
+    tile = geo_cache.tile(latitude, longitude)
+    places = await geo_cache.get(tile)
+    if places is None:
+        # Concurrent misses in one tile (e.g. a batch from one clinic) share a single fetch.
+        places = await _tile_flights.do(tile.key, lambda: _fetch_tile(tile))
+        if isinstance(places, dict):
+            return places
+    hospitals = geo_cache.nearest_covered(tile, places, latitude, longitude, radius, limit, settings.HOSPITALS_TILE_LIMIT)
+    if hospitals is not None:
+        return hospitals
+    # The tile's answer was cut off before reaching this caller's nearest places
+    # (dense area, caller near the tile edge): ask around the exact point.
+    places = await _fetch_places(latitude, longitude, radius, limit)
+    if isinstance(places, dict):
+        return places
+    return geo_cache.nearest(places, latitude, longitude, radius, limit)
+
+async def _fetch_tile(tile):
+    places = await _fetch_places(tile.center_lat, tile.center_lon, settings.HOSPITALS_SEARCH_RADIUS_METERS + tile.half_diagonal_meters, settings.HOSPITALS_TILE_LIMIT)
+    if not isinstance(places, dict):
+        await geo_cache.set(tile, places)
+    return places
+
+_facility_index = None
+
+def _get_facility_index():
+    """Memory-maps the offline facility index on first use."""
+    global _facility_index
+    if _facility_index is None and settings.FACILITY_INDEX_PATH:
+        # Imported here: it needs numpy, which remote-only deployments never load.
+        from services.facility_index import FacilityIndex
+
+        _facility_index = FacilityIndex.load(settings.FACILITY_INDEX_PATH)
+        print(f"Loaded offline facility index with {len(_facility_index)} entries.")
+    return _facility_index
+
+async def get_nearby_hospitals(latitude: float, longitude: float):
+    """
+    Finds nearby hospitals.
+
+    LOCATION_MODE selects the source:
+    - "remote": Geoapify Places API (healthcare.hospital and healthcare.clinic_or_praxis),
+      cached per geohash tile (see services/geo_cache.py)
+    - "local": the offline facility index at FACILITY_INDEX_PATH only
+    - "local-then-remote": the offline index, falling back to Geoapify when it
+      has nothing within the search radius
+    Every mode returns the same [{name, address, distance_meters}] shape.
+    """
+    mode = settings.LOCATION_MODE
+    if mode in ("local", "local-then-remote"):
+        index = _get_facility_index()
+        if index is not None:
+            hospitals = index.within_radius(latitude, longitude, settings.HOSPITALS_SEARCH_RADIUS_METERS, settings.HOSPITALS_LIMIT)
+            if hospitals or mode == "local":
+                return hospitals
+        elif mode == "local":
+            return {"error": "Offline facility index is not configured."}
+    return await _get_remote_hospitals(latitude, longitude)
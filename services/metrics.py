@@ -0,0 +1,309 @@
+import abc
+import asyncio
+import bisect
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+
+# Upper bounds in seconds; +Inf is implied.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric(abc.ABC):
+    """
+    A metric family with optional labels. Children are created on first use.
+
+    Updates are plain attribute writes with no locks: every observation is
+    made from the event loop thread (work done on executors is timed around
+    the await), so they never race.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A fresh child for one label set."""
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return lines
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _samples(self, values: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+class Registry:
+    """
+    Holds metric families plus collectors: callables returning a component's
+    existing stats() dict, exported as gauges at scrape time. Nested dicts are
+    flattened into the name; string values become a `value` label set to 1.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, Callable[[], dict]]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(f"{self.namespace}_{name}", help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(f"{self.namespace}_{name}", help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.namespace}_{name}", help, labelnames, buckets))
+
+    def register_collector(self, prefix: str, stats: Callable[[], dict]):
+        self._collectors.append((prefix, stats))
+
+    def _flatten(self, prefix: str, stats: dict, lines: List[str]):
+        for key, value in stats.items():
+            name = f"{prefix}_{key}"
+            if isinstance(value, dict):
+                self._flatten(name, value, lines)
+            elif isinstance(value, str):
+                lines.append(f'{name}{{value="{_escape(value)}"}} 1')
+            elif isinstance(value, (int, float)):
+                lines.append(f"{name} {_format_value(value)}")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats in self._collectors:
+            try:
+                self._flatten(f"{self.namespace}_{prefix}", stats(), lines)
+            except Exception as e:
+                print(f"Metrics collector {prefix} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry("medilens")
+
+http_requests = registry.histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served.").labels()
+upstream_requests = registry.histogram("upstream_request_duration_seconds", "Latency of calls to external services.", ("upstream", "operation", "outcome"))
+upstream_in_flight = registry.gauge("upstream_requests_in_flight", "Calls to external services currently in flight.", ("upstream",))
+password_hashing = registry.histogram("password_hash_seconds", "PBKDF2/bcrypt CPU time per derivation (excludes queueing).", ("operation",))
+password_hash_wait = registry.histogram("password_hash_queue_seconds", "Time a derivation waited for a hashing worker.", ("operation",))
+admission_wait = registry.histogram("admission_queue_seconds", "Time an admitted request waited for a slot.", ("lane",))
+request_stages = registry.histogram("request_stage_seconds", "Duration of each stage of a fanned-out analysis request.", ("stage",))
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a periodic timer.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+).labels()
+
+# Server-Timing entries for the request being served, shared with the tasks it spawns.
+_server_timing: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("server_timing", default=None)
+
+@contextmanager
+def timed(upstream: str, operation: str):
+    """Records the duration of one upstream call: `with timed("gemini", "text"): ...`."""
+    in_flight = upstream_in_flight.labels(upstream)
+    in_flight.inc()
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        in_flight.dec()
+        if settings.METRICS_ENABLED:
+            upstream_requests.labels(upstream, operation, outcome).observe(elapsed)
+        entries = _server_timing.get()
+        if entries is not None and settings.METRICS_SERVER_TIMING:
+            entries.append(f"{upstream}-{operation};dur={elapsed * 1000:.1f}")
+
+def record_stage(stage: str, seconds: float):
+    """Records one RequestPipeline stage; always listed in the request's Server-Timing."""
+    if settings.METRICS_ENABLED:
+        request_stages.labels(stage).observe(seconds)
+    entries = _server_timing.get()
+    if entries is not None:
+        entries.append(f"{stage};dur={seconds * 1000:.1f}")
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency and in-flight requests.
+
+    Routes are labelled by their path template (e.g. /history/{entry_id}) so
+    the label set stays bounded. The pipeline stages (and, with
+    METRICS_SERVER_TIMING, the upstream calls) a request finished before its
+    response headers went out are listed in its Server-Timing header,
+    followed by the total time to the headers. Requests with neither get no
+    header. Streamed responses are timed to the last byte. With
+    METRICS_ENABLED off only the Server-Timing header is kept.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        entries = []
+        token = _server_timing.set(entries)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if entries:
+                    total = f"total;dur={(time.perf_counter() - start) * 1000:.1f}"
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", ", ".join(entries + [total]).encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        enabled = settings.METRICS_ENABLED
+        if enabled:
+            http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _server_timing.reset(token)
+            if not enabled:
+                return
+            http_in_flight.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_requests.labels(scope["method"], path, str(status)).observe(elapsed)
+
+async def observe(upstream: str, operation: str, awaitable):
+    """Awaits one upstream call under timed(); handy inside an Upstream.call lambda."""
+    with timed(upstream, operation):
+        return await awaitable
+
+class EventLoopMonitor:
+    """Samples event-loop lag: how much later than requested a periodic sleep returns."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            event_loop_lag.observe(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        if self._task is None and settings.METRICS_ENABLED:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Create a single, reusable instance for the app to use
+loop_monitor = EventLoopMonitor(settings.METRICS_LOOP_LAG_INTERVAL_SECONDS)
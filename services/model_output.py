@@ -0,0 +1,73 @@
+import re
+
+import orjson # type: ignore
+from pydantic import ValidationError
+
+from schemas import SymptomAnalysis
+
+class ModelOutputError(ValueError):
+    """Raised when the model's text holds no analysis matching SymptomAnalysis."""
+
+# Characters that matter when matching braces; everything else is skipped in C.
+_STRUCTURE = re.compile(r'[{}"\\]')
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+def _balanced_end(text: str, start: int) -> int:
+    """Index just past the object opened at `start`, honouring strings and escapes; -1 if unclosed."""
+    depth = 0
+    in_string = False
+    skip = -1
+    for match in _STRUCTURE.finditer(text, start):
+        i = match.start()
+        if i == skip:
+            continue
+        ch = match.group()
+        if in_string:
+            if ch == "\\":
+                skip = i + 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+def extract_json_object(text: str):
+    """
+    Parses the outermost JSON object in the model's text.
+
+    Markdown fences and prose before or after the object are skipped without
+    rewriting the text: the object is located with str.find/rfind and parsed
+    from a single slice (no copy at all when the text is exactly the object,
+    as with Gemini's JSON mode). Only if that fails is the object's end found
+    by a brace-matching scan, with trailing commas dropped as a last resort.
+    """
+    start = text.find("{")
+    end = text.rfind("}") + 1
+    if start < 0 or end <= start:
+        raise ModelOutputError("no complete JSON object in the model output")
+    try:
+        return orjson.loads(text[start:end])
+    except orjson.JSONDecodeError:
+        pass
+    # Trailing text that itself contains "}", or a stray comma before a closing bracket.
+    end = _balanced_end(text, start)
+    candidate = text[start:end] if end > 0 else text[start:]
+    for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+        try:
+            return orjson.loads(attempt)
+        except orjson.JSONDecodeError:
+            continue
+    raise ModelOutputError("the model output is not valid JSON")
+
+def parse_analysis(text: str) -> dict:
+    """Extracts and validates a symptom analysis; returns it as a plain dict."""
+    try:
+        return SymptomAnalysis.model_validate(extract_json_object(text)).model_dump()
+    except ValidationError as e:
+        raise ModelOutputError(f"the model output does not match the analysis schema: {e.error_count()} errors") from e
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from config import settings
+from services.metrics import password_hash_wait, password_hashing
+import security
+
+def _timed_call(func, *args):
+    # Runs on the hashing worker, so the measured time excludes queueing.
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full and the request should be shed."""
+
+class PasswordHasher:
+    """
+    Runs PBKDF2/bcrypt work off the event loop on a bounded pool.
+
+    `hashlib.pbkdf2_hmac` and `bcrypt` release the GIL, so a thread pool gives
+    real parallelism; a process pool is available for interpreters where that
+    does not hold. At most `max_pending` derivations may be queued or running;
+    beyond that callers get HashingOverloaded immediately instead of waiting.
+    """
+
+    def __init__(self, pool: str, max_workers: Optional[int], max_pending: int):
+        self.pool = pool
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor: Executor = None
+        self._pending = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pbkdf2")
+        return self._executor
+
+    async def _submit(self, operation: str, func, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingOverloaded()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            result, seconds = await loop.run_in_executor(self._get_executor(), _timed_call, func, *args)
+            password_hashing.labels(operation).observe(seconds)
+            password_hash_wait.labels(operation).observe(max(0.0, time.perf_counter() - start - seconds))
+            return result
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Returns a canonical PBKDF2 hash of password."""
+        return await self._submit("hash", security.get_password_hash, password)
+
+    async def verify(self, plain_password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifies a password. On success against a legacy-format hash, also
+        returns the canonical replacement hash to be persisted.
+        """
+        if not plain_password or not stored_hash:
+            return False, None
+        return await self._submit("verify", security.verify_and_update, plain_password, stored_hash)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "max_pending": self.max_pending, "rejected": self.rejected}
+
+
+# Create a single, reusable instance for the app to use
+password_hasher = PasswordHasher(
+    pool=settings.PASSWORD_HASH_POOL,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict
+
+from services.metrics import record_stage
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage does not finish within its timeout."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Stage '{stage}' timed out.")
+        self.stage = stage
+
+class RequestPipeline:
+    """
+    Fans out the independent stages of one request concurrently.
+
+    Each stage runs as its own task under its own timeout, so end-to-end
+    latency is max(stage) rather than sum(stage). Stage durations are recorded
+    through the metrics layer (see record_stage).
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, name: str, coro: Awaitable, timeout: float) -> None:
+        """Schedules coro as stage `name`; it starts running immediately."""
+        self._tasks[name] = asyncio.ensure_future(self._timed(name, coro, timeout))
+
+    async def _timed(self, name: str, coro: Awaitable, timeout: float):
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeout(name)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            record_stage(name, self.timings[name])
+
+    async def result(self, name: str) -> Any:
+        """Waits for stage `name`; re-raises its exception (including StageTimeout)."""
+        return await self._tasks[name]
+
+    async def run(self, name: str, coro: Awaitable, timeout: float) -> Any:
+        """Runs a dependent stage inline, still recording its timing."""
+        self.start(name, coro, timeout)
+        return await self.result(name)
+
+    def cancel(self) -> None:
+        """Cancels all stages still running, e.g. after a required stage failed."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark as retrieved so asyncio doesn't log it
@@ -0,0 +1,225 @@
+import asyncio
+import bisect
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+class CategoryRejected(Exception):
+    """Raised by a fetch when the upstream rejects the category set itself (Geoapify: 400 "Invalid parameters")."""
+
+    def __init__(self, categories: str):
+        super().__init__(f"category set rejected: {categories}")
+        self.categories = categories
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram (1 ms .. ~60 s, 20% wide buckets).
+
+    Bucket counts are halved whenever they add up to `window`, so percentiles
+    follow recent traffic rather than the whole process lifetime.
+    """
+
+    BOUNDS = [0.001 * 1.2 ** i for i in range(61)]
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._counts = [0] * (len(self.BOUNDS) + 1)
+        self._weight = 0
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        self._counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self._weight += 1
+        if self._weight >= self.window:
+            self._counts = [c // 2 for c in self._counts]
+            self._weight = sum(self._counts)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the pct-th percentile, or None with no samples."""
+        if self._weight == 0:
+            return None
+        rank = pct / 100.0 * self._weight
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BOUNDS[min(index, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_seconds": self.total / self.count if self.count else None,
+            "p50_seconds": self.percentile(50),
+            "p90_seconds": self.percentile(90),
+            "p99_seconds": self.percentile(99),
+        }
+
+class _Rank:
+    """Attempts for one category set within a single query."""
+
+    def __init__(self):
+        self.running = 0
+        self.launched = False
+        self.result: Any = None
+        self.succeeded = False
+        self.error: Optional[BaseException] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.launched and self.running == 0 and not self.succeeded
+
+class PlaceQueryEngine:
+    """
+    Picks and races Geoapify category sets for a place search.
+
+    `strategies` are (name, categories) pairs in order of preference. The
+    engine remembers which sets the upstream rejected and skips them for
+    `recheck_after` seconds; while it does not yet know whether the preferred
+    set works (first query, or a recheck), the next set is queried in
+    parallel instead of after the rejection, so the degraded case costs no
+    extra round trip.
+
+    With `hedge_percentile` set, a query still waiting after that percentile
+    of its set's recent latency sends one duplicate request and takes
+    whichever answers first. A lower-preference set's answer is only used
+    once every set above it has failed.
+    """
+
+    def __init__(self, strategies: List[Tuple[str, str]], recheck_after: float,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 hedge_min_delay: float = 0.05):
+        self.strategies = strategies
+        self.recheck_after = recheck_after
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._rejected_at: Dict[str, float] = {}
+        self._confirmed = set()
+        self.histograms = {name: LatencyHistogram() for name, _ in strategies}
+        self.histograms["query"] = LatencyHistogram()
+        self.queries = 0
+        self.requests = 0
+        self.probes = 0
+        self.rejections = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _order(self) -> List[Tuple[str, str]]:
+        now = time.monotonic()
+        usable = [
+            (name, categories) for name, categories in self.strategies
+            if now - self._rejected_at.get(name, -self.recheck_after) >= self.recheck_after
+        ]
+        # If everything has been rejected recently there is nothing better to do than ask again.
+        return usable or list(self.strategies)
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        histogram = self.histograms[name]
+        if self.hedge_percentile is None or histogram.count < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, histogram.percentile(self.hedge_percentile))
+
+    async def _attempt(self, name: str, categories: str, fetch: Callable[[str], Awaitable[Any]]):
+        self.requests += 1
+        start = time.monotonic()
+        try:
+            result = await fetch(categories)
+        except asyncio.CancelledError:
+            # A losing attempt was at least this slow; dropping it would bias the hedge threshold down.
+            self.histograms[name].record(time.monotonic() - start)
+            raise
+        self.histograms[name].record(time.monotonic() - start)
+        return result
+
+    async def query(self, fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Runs `fetch(categories)` per the strategy order and returns the winning result.
+        Raises CategoryRejected if every set was rejected, otherwise the error of the
+        set that failed for another reason (e.g. UpstreamUnavailable, a 5xx).
+        """
+        self.queries += 1
+        start = time.monotonic()
+        order = self._order()
+        ranks = [_Rank() for _ in order]
+        tasks: Dict[asyncio.Future, Tuple[int, bool]] = {}
+
+        def launch(index: int, hedge: bool = False):
+            name, categories = order[index]
+            task = asyncio.ensure_future(self._attempt(name, categories, fetch))
+            tasks[task] = (index, hedge)
+            ranks[index].launched = True
+            ranks[index].running += 1
+
+        launch(0)
+        if order[0][0] not in self._confirmed and len(order) > 1:
+            self.probes += 1
+            launch(1)
+        hedge_delay = self._hedge_delay(order[0][0])
+        hedged = False
+
+        try:
+            while True:
+                for index, rank in enumerate(ranks):
+                    if rank.succeeded:
+                        self.histograms["query"].record(time.monotonic() - start)
+                        return rank.result
+                    if rank.failed:
+                        continue
+                    if rank.launched:
+                        break
+                    # Only a rejection of the set above justifies asking for a different one.
+                    if isinstance(ranks[index - 1].error, CategoryRejected):
+                        launch(index)
+                        break
+                    raise ranks[index - 1].error
+                else:
+                    raise ranks[-1].error
+
+                timeout = None
+                if hedge_delay is not None and not hedged:
+                    timeout = max(0.0, start + hedge_delay - time.monotonic())
+                done, _ = await asyncio.wait(list(tasks), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    launch(next(i for i, rank in enumerate(ranks) if rank.launched and not rank.failed), hedge=True)
+                    continue
+                for task in done:
+                    index, hedge = tasks.pop(task)
+                    name, _ = order[index]
+                    rank = ranks[index]
+                    rank.running -= 1
+                    try:
+                        result = task.result()
+                    except CategoryRejected as e:
+                        self.rejections += 1
+                        self._rejected_at[name] = time.monotonic()
+                        self._confirmed.discard(name)
+                        rank.error = e
+                    except Exception as e:
+                        rank.error = e
+                    else:
+                        if not rank.succeeded:
+                            rank.succeeded = True
+                            rank.result = result
+                            self.hedge_wins += hedge
+                        self._rejected_at.pop(name, None)
+                        self._confirmed.add(name)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "queries": self.queries,
+            "requests": self.requests,
+            "probes": self.probes,
+            "rejections": self.rejections,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "rejected": sorted(self._rejected_at),
+            "latency": {name: histogram.stats() for name, histogram in self.histograms.items()},
+        }
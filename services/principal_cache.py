@@ -0,0 +1,80 @@
+import hashlib
+import time
+from typing import Optional
+
+from config import settings
+from schemas import User
+from services.cache import TTLCache, shared_cache
+
+class PrincipalCache:
+    """
+    Caches authenticated principals so protected routes don't hit the DB per request.
+
+    - principals are keyed by the token `sub` (the user's email) and only hold
+      the public `User` fields; `hashed_password` is never kept in memory
+    - decoded JWT claims are optionally cached by a SHA-256 of the raw token
+    - no entry outlives the `exp` of the token that produced it
+    - with SHARED_CACHE_DIR set, principals are shared by all worker processes,
+      so `invalidate` reaches every worker; token claims never change and stay
+      per process
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, cache_tokens: bool):
+        self._principals = shared_cache("principals", max_entries=max_entries, default_ttl=ttl_seconds)
+        if self._principals is None:
+            self._principals = TTLCache(max_entries=max_entries, default_ttl=ttl_seconds)
+        # Claims are immutable for the life of the token, so they may live until `exp`.
+        self._tokens = TTLCache(max_entries=max_entries, default_ttl=float("inf")) if cache_tokens else None
+
+    @staticmethod
+    def _seconds_until(exp) -> Optional[float]:
+        if exp is None:
+            return None
+        return float(exp) - time.time()
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    async def get_principal(self, email: str) -> Optional[dict]:
+        return await self._principals.aget(email)
+
+    async def put_principal(self, email: str, user_data: dict, exp=None) -> None:
+        principal = {field: user_data.get(field) for field in User.model_fields}
+        await self._principals.aset(email, principal, ttl=self._seconds_until(exp))
+
+    def get_token_claims(self, token: str) -> Optional[dict]:
+        if self._tokens is None:
+            return None
+        # Tokens without `exp` are never cached, so a hit is always unexpired.
+        return self._tokens.get(self._token_key(token))
+
+    def put_token_claims(self, token: str, claims: dict) -> None:
+        if self._tokens is None:
+            return
+        ttl = self._seconds_until(claims.get("exp"))
+        if ttl is None:
+            return
+        self._tokens.set(self._token_key(token), claims, ttl=ttl)
+
+    async def invalidate(self, email: str) -> None:
+        """Invalidation hook: call after any mutation of the user identified by `email`."""
+        await self._principals.adelete(email)
+
+    def clear(self) -> None:
+        self._principals.clear()
+        if self._tokens is not None:
+            self._tokens.clear()
+
+    def stats(self) -> dict:
+        return {
+            "principals": self._principals.stats(),
+            "tokens": self._tokens.stats() if self._tokens is not None else None,
+        }
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    cache_tokens=settings.TOKEN_CACHE_ENABLED,
+)
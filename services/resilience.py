@@ -0,0 +1,286 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx # type: ignore
+from config import settings
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the upstream: its circuit is open or the deadline leaves no room to wait."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: Optional[float] = None):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    # google.api_core exceptions (raised by the Gemini SDK) carry the HTTP status as `code`.
+    code = getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
+def classify(exc: BaseException):
+    """(retryable, throttled, retry_after) for an exception raised by an upstream call."""
+    status = _status_code(exc)
+    if status == 429:
+        return True, True, _retry_after(exc)
+    if status in (500, 502, 503, 504):
+        return True, False, _retry_after(exc)
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True, False, None
+    return False, False, None
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose rate adapts to the upstream (AIMD).
+
+    A 429 cuts the rate by 30% (down to `min_rate`) and holds all callers until
+    its Retry-After has passed; successes add back `max_rate / 5` per second
+    of traffic. A burst of 429s answering requests sent at the old rate only
+    counts once: the rate is cut (and paused) at most once per `cooldown`
+    seconds. Each throttled request still waits its own Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float, max_rate: float, cooldown: float = 1.0):
+        self.rate = rate
+        self.cooldown = cooldown
+        self._last_decrease = 0.0
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Reserves a token; returns how long the caller must wait before using it."""
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens -= 1
+        wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        return max(wait, self._paused_until - now)
+
+    def refund(self):
+        self._tokens += 1
+
+    def on_success(self):
+        # About `rate` successes arrive per second, so this is a linear increase over time.
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 5 / self.rate)
+
+    def on_throttled(self, retry_after: Optional[float]):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        self.rate = max(self.min_rate, self.rate * 0.7)
+        # The bucket is drained so the next requests are spaced at the new rate.
+        self._tokens = min(self._tokens, 0.0)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds; then lets one probe through (half-open) and
+    closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if self.retry_after() > 0:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self._failures = 0
+        self._probing = False
+        self.state = "closed"
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self):
+        """Ends a probe that neither succeeded nor failed (e.g. a 400 or a cancellation)."""
+        self._probing = False
+
+class Upstream:
+    """
+    Guards calls to one upstream service.
+
+    `call(func)` runs `func()` under a concurrency limit and the adaptive
+    rate limiter, retries retryable failures (429, 5xx, timeouts, connection
+    errors) with full-jitter exponential backoff while the request deadline
+    allows, and feeds a circuit breaker. If retries run out, the last
+    exception is raised unchanged. Non-retryable errors (e.g. a 400) are
+    raised immediately and do not count against the breaker.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rate: float, burst: float, max_attempts: int,
+                 backoff_base: float, backoff_max: float, failure_threshold: int, reset_timeout: float,
+                 default_timeout: float):
+        self.name = name
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.limiter = AdaptiveTokenBucket(rate=rate, burst=burst, min_rate=max(rate / 50, 0.1), max_rate=rate)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_timeout = default_timeout
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str, retry_after: Optional[float] = None):
+        self.rejected += 1
+        raise UpstreamUnavailable(self.name, reason, retry_after)
+
+    async def call(self, func: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """Runs func() with limits and retries; `deadline` is a time.monotonic() value."""
+        if deadline is None:
+            deadline = time.monotonic() + self.default_timeout
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._reject("circuit open", self.breaker.retry_after())
+            probe = self.breaker.state == "half_open"
+            wait = self.limiter.delay()
+            # Spending most of the budget queueing would leave too little for the call itself.
+            if wait > (deadline - time.monotonic()) / 2:
+                self.limiter.refund()
+                if probe:
+                    self.breaker.release()
+                self._reject("rate limited", wait)
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                if probe:
+                    self.breaker.release()
+                self._reject("too many concurrent calls")
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.release()
+                raise
+            self.in_flight += 1
+            self.calls += 1
+            error = None
+            try:
+                result = await asyncio.wait_for(func(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.release()
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+            if error is None:
+                self.limiter.on_success()
+                self.breaker.record_success()
+                return result
+
+            retryable, throttled, retry_after = classify(error)
+            if not retryable:
+                if probe:
+                    self.breaker.release()
+                raise error
+            if throttled:
+                # Overload is handled by slowing down, not by opening the circuit.
+                self.throttled += 1
+                self.limiter.on_throttled(retry_after)
+                if probe:
+                    self.breaker.release()
+            else:
+                self.breaker.record_failure()
+            attempt += 1
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if retry_after is not None:
+                backoff = max(backoff, retry_after)
+            if attempt >= self.max_attempts or time.monotonic() + backoff >= deadline:
+                raise error
+            self.retries += 1
+            await asyncio.sleep(backoff)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rate": self.limiter.rate,
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "circuit_opened": self.breaker.opened,
+        }
+
+
+# Create single, reusable instances for the app to use
+gemini_upstream = Upstream(
+    "gemini",
+    max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+    rate=settings.GEMINI_RATE_PER_SECOND,
+    burst=settings.GEMINI_RATE_BURST,
+    max_attempts=settings.UPSTREAM_MAX_ATTEMPTS,
+    backoff_base=settings.UPSTREAM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.UPSTREAM_BACKOFF_MAX_SECONDS,
+    failure_threshold=settings.UPSTREAM_FAILURE_THRESHOLD,
+    reset_timeout=settings.UPSTREAM_RESET_SECONDS,
+    default_timeout=settings.ANALYSIS_TIMEOUT_SECONDS,
+)
+geoapify_upstream = Upstream(
+    "geoapify",
+    max_concurrency=settings.GEOAPIFY_MAX_CONCURRENCY,
+    rate=settings.GEOAPIFY_RATE_PER_SECOND,
+    burst=settings.GEOAPIFY_RATE_BURST,
+    max_attempts=settings.UPSTREAM_MAX_ATTEMPTS,
+    backoff_base=settings.UPSTREAM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.UPSTREAM_BACKOFF_MAX_SECONDS,
+    failure_threshold=settings.UPSTREAM_FAILURE_THRESHOLD,
+    reset_timeout=settings.UPSTREAM_RESET_SECONDS,
+    default_timeout=settings.HOSPITALS_TIMEOUT_SECONDS,
+)
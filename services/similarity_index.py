@@ -0,0 +1,123 @@
+import re
+import sys
+from typing import Dict, FrozenSet, List, Optional
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Pure filler: articles, conjunctions, auxiliaries and first-person words that
+# don't change the clinical meaning. Everything that does is kept as a token:
+# negations ("fever" vs "no fever"), durations and times of day ("3 hours" vs
+# "3 weeks", "night sweats" vs "sweats", "since yesterday" vs "for weeks"),
+# whose symptoms they are ("he" vs "she") and severity ("a little" vs "a lot").
+STOPWORDS = frozenset("""
+a an the and or but of in on at to for from with by as is am are was were be been being
+i im i've ive me my mine we our this that these those
+have has had having get getting got feel feeling felt experiencing experience suffering
+also
+""".split())
+
+_NUMBERS = frozenset("""
+one two three four five six seven eight nine ten eleven twelve
+few several couple
+""".split())
+_UNITS = frozenset("second minute hour day week month year".split())
+
+def _singular(word: str) -> str:
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def tokenize(text: str) -> FrozenSet[str]:
+    """
+    Lowercased content words with a light plural strip ("headaches" -> "headache").
+    A count followed by a time unit is one token ("3 hours" -> "3_hour").
+    """
+    tokens = set()
+    words = _WORD.findall(text.lower())
+    i = 0
+    while i < len(words):
+        word = words[i]
+        i += 1
+        if word in STOPWORDS:
+            continue
+        if (word.isdigit() or word in _NUMBERS) and i < len(words) and _singular(words[i]) in _UNITS:
+            word = f"{word}_{_singular(words[i])}"
+            i += 1
+        else:
+            word = _singular(word)
+        # Interned so the index holds one copy of each vocabulary word.
+        tokens.add(sys.intern(word))
+    return frozenset(tokens)
+
+def _order_sensitive(tokens: FrozenSet[str]) -> bool:
+    # With two durations, which symptom each belongs to is lost in a token set.
+    return sum("_" in token for token in tokens) > 1
+
+class SimilarityIndex:
+    """
+    Index of recently answered symptom texts by their content-token set.
+
+    A lookup only matches a text with exactly the same tokens, i.e. one that
+    differs in word order, punctuation, plurals or filler words ("I have a
+    headache and a fever" vs "fever, headache"). Texts whose content differs
+    at all, even by one word, never share an answer. Texts with more than one
+    duration are not indexed, as a token set can't tell which symptom each
+    belongs to; only the exact-key cache serves them. The index is a fixed
+    ring of `max_entries` slots, so the oldest text is evicted first. Each
+    slot maps to a caller-provided value (the analysis-cache key).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._exact: Dict[FrozenSet[str], int] = {}
+        self._tokens: List[Optional[FrozenSet[str]]] = [None] * max_entries
+        self._values: List[Optional[str]] = [None] * max_entries
+        self._next = 0
+        self._size = 0
+        self.lookups = 0
+        self.hits = 0
+
+    def add(self, text: str, value: str) -> None:
+        tokens = tokenize(text)
+        if not tokens or _order_sensitive(tokens):
+            return
+        slot = self._next
+        self._next = (self._next + 1) % self.max_entries
+        if self._tokens[slot] is not None:
+            self._unlink(slot)
+        else:
+            self._size += 1
+        self._tokens[slot] = tokens
+        self._values[slot] = value
+        self._exact[tokens] = slot
+
+    def _unlink(self, slot: int) -> None:
+        if self._exact.get(self._tokens[slot]) == slot:
+            del self._exact[self._tokens[slot]]
+        self._tokens[slot] = None
+        self._values[slot] = None
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Value of an indexed text with the same content tokens, if any."""
+        self.lookups += 1
+        tokens = tokenize(text)
+        if not tokens or _order_sensitive(tokens):
+            return None
+        slot = self._exact.get(tokens)
+        if slot is None:
+            return None
+        self.hits += 1
+        return self._values[slot]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+        }
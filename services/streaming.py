@@ -0,0 +1,149 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+import orjson # type: ignore
+
+from schemas import PossibleCondition
+
+class StreamError(Exception):
+    """Raised by a stream's completion hook to end the stream with an error event."""
+
+def sse_event(event: str, data: Any) -> str:
+    """Formats one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+class IncrementalConditionParser:
+    """
+    Incremental scanner over streamed model JSON.
+
+    Feed it text chunks as they arrive; it returns each object of the
+    top-level "possible_conditions" array as soon as that object's closing
+    brace has been seen, validated as a PossibleCondition (so it carries the
+    numeric `confidence` too). It tracks string/escape state and nesting depth
+    only, so Markdown fences or other text around the JSON are ignored.
+    """
+
+    TARGET_KEY = "possible_conditions"
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._object_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:i]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._last_key == self.TARGET_KEY:
+                    self._array_depth = self._depth
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._object_start = i
+            elif ch in "}]":
+                if ch == "}" and self._object_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        completed.append(PossibleCondition.model_validate(orjson.loads(text[self._object_start:i + 1])).model_dump())
+                    except ValueError:
+                        pass
+                    self._object_start = None
+                elif ch == "]" and self._array_depth == self._depth:
+                    self._array_depth = None
+                self._depth -= 1
+        self._pos = len(text)
+        return completed
+
+async def stream_analysis_events(
+    chunks: AsyncIterator[str],
+    parse: Callable[[str], dict],
+    hospitals: Optional[Awaitable] = None,
+    hospitals_timeout: float = None,
+    on_complete: Optional[Callable[[dict], Awaitable[None]]] = None,
+) -> AsyncIterator[str]:
+    """
+    Merges a streamed model analysis and an optional hospital lookup into SSE.
+
+    Emits `condition` for each completed possible_conditions entry while the
+    model is still generating, `hospitals` as soon as the lookup finishes (or
+    times out), then `result` with the full analysis after on_complete (e.g.
+    saving history) has run. Failures end the stream with an `error` event.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump_model():
+        parser = IncrementalConditionParser()
+        try:
+            async for chunk in chunks:
+                for condition in parser.feed(chunk):
+                    await queue.put(("condition", condition))
+            await queue.put(("_model_done", parser.text))
+        except Exception as e:
+            print(f"Error during streamed Gemini call: {e}")
+            await queue.put(("_error", "Failed to get analysis from the model."))
+
+    async def pump_hospitals():
+        try:
+            result = await asyncio.wait_for(hospitals, timeout=hospitals_timeout)
+        except asyncio.TimeoutError:
+            result = {"error": "Nearby hospital lookup timed out.", "status": "unavailable"}
+        await queue.put(("hospitals", result))
+
+    tasks = [asyncio.ensure_future(pump_model())]
+    if hospitals is not None:
+        tasks.append(asyncio.ensure_future(pump_hospitals()))
+
+    try:
+        analysis_text = None
+        nearby_hospitals = None
+        pending = len(tasks)
+        while pending:
+            event, data = await queue.get()
+            if event == "_error":
+                yield sse_event("error", {"detail": data})
+                return
+            if event == "_model_done":
+                analysis_text = data
+                pending -= 1
+                continue
+            if event == "hospitals":
+                nearby_hospitals = data
+                pending -= 1
+            yield sse_event(event, data)
+
+        try:
+            result = parse(analysis_text)
+        except ValueError:
+            yield sse_event("error", {"detail": "The model returned an unreadable analysis."})
+            return
+        if hospitals is not None:
+            result["nearby_hospitals"] = nearby_hospitals
+        if on_complete is not None:
+            try:
+                await on_complete(result)
+            except StreamError as e:
+                yield sse_event("error", {"detail": str(e)})
+                return
+        yield sse_event("result", result)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,25 +1,153 @@
 # services/supabase_service.py
-from supabase import create_client, Client
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Tuple
+
+import httpx # type: ignore
 from config import settings
 from schemas import UserCreate
-from security import get_password_hash
-import uuid
+from services.password_hasher import password_hasher
+from services.principal_cache import principal_cache
+from services.cache import TTLCache
+from services.metrics import timed
+from services.lazy import lazy_import, on_prewarm
 from schemas import User
 
+supabase = lazy_import("supabase")
+
+# /history list rows carry the top condition instead of the whole response_data blob.
+TOP_CONDITION_COLUMN = "top_condition:response_data->possible_conditions->0->>condition"
+HISTORY_SUMMARY_COLUMNS = f"id, created_at, symptom_text, image_url, {TOP_CONDITION_COLUMN}"
+
 class SupabaseService:
+    """
+    Data layer for Supabase (Postgres + Storage).
+
+    The supabase-py client is synchronous, so every public method is a coroutine
+    that runs the blocking round-trip on a bounded thread pool. Handlers can
+    `await` these without stalling the event loop, and the pool size caps how
+    many concurrent DB calls a single worker can have in flight.
+
+    With LAZY_IMPORTS the supabase package is imported and the client (with
+    its connection pool) built on the first call or by the startup prewarm,
+    not in initialize_client.
+    """
+
     def __init__(self):
-        self.client: Client = None
+        self.client: "supabase.Client" = None
+        self._connect_lock = threading.Lock()
+        self._http_client: httpx.Client = None
+        self._executor: ThreadPoolExecutor = None
+        # Content-addressed storage paths already uploaded by this worker.
+        self._uploaded = TTLCache(max_entries=settings.IMAGE_UPLOAD_CACHE_SIZE, default_ttl=float("inf"))
 
     def initialize_client(self):
-        print("Initializing Supabase client...")
-        url: str = settings.SUPABASE_URL
-        key: str = settings.SUPABASE_KEY
-        self.client = create_client(url, key)
-        print("Supabase client initialized successfully.")
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.SUPABASE_MAX_WORKERS,
+            thread_name_prefix="supabase",
+        )
+        if not settings.LAZY_IMPORTS:
+            self._connect()
 
-    def create_user(self, user: UserCreate):
+    def _connect(self):
+        """Builds the supabase client once; safe to call from any thread."""
+        with self._connect_lock:
+            if self.client is not None:
+                return
+            print("Initializing Supabase client...")
+            # One pooled (HTTP/2 multiplexed) connection set shared by PostgREST and Storage.
+            self._http_client = httpx.Client(
+                http2=settings.SUPABASE_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                ),
+                timeout=settings.SUPABASE_TIMEOUT_SECONDS,
+            )
+            url: str = settings.SUPABASE_URL
+            key: str = settings.SUPABASE_KEY
+            try:
+                options = supabase.ClientOptions(httpx_client=self._http_client)
+            except TypeError:
+                # Older supabase-py releases do not accept an injected httpx client.
+                print("Supabase client does not support a shared httpx client; using defaults.")
+                options = supabase.ClientOptions()
+            self.client = supabase.create_client(url, key, options=options)
+            print("Supabase client initialized successfully.")
+
+    def close(self):
+        """Releases the worker threads and pooled connections."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+    async def _run(self, operation: str, func, *args, **kwargs):
+        """
+        Runs a blocking client call on the Supabase thread pool, recorded under
+        `operation` in the upstream latency metrics (including any wait for a thread).
+        """
+        loop = asyncio.get_running_loop()
+        if self.client is None:
+            await loop.run_in_executor(self._executor, self._connect)
+        with timed("supabase", operation):
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def create_user(self, user: UserCreate):
         """Creates a new user in the database."""
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
+        created = await self._run("insert", self._create_user, user, hashed_password)
+        await principal_cache.invalidate(user.email)
+        return created
+
+    async def update_password_hash(self, user_id: int, email: str, hashed_password: str):
+        """Replaces a user's stored password hash (used to upgrade legacy formats)."""
+        updated = await self._run("update", self._update_password_hash, user_id, hashed_password)
+        await principal_cache.invalidate(email)
+        return updated
+
+    async def get_user_by_email(self, email: str):
+        """Fetches a single user by their email address."""
+        return await self._run("select", self._get_user_by_email, email)
+
+    async def upload_symptom_image(self, user_id: int, image_bytes: bytes, content_type: str, file_name: str):
+        """
+        Uploads an image to the symptom_images storage bucket.
+        `file_name` is content-addressed, so a path this worker has already
+        uploaded is returned without another round-trip.
+        """
+        file_path = f"{user_id}/{file_name}"
+        public_url = self._uploaded.get(file_path)
+        if public_url is None:
+            public_url = await self._run("storage_upload", self._upload_symptom_image, file_path, image_bytes, content_type)
+            if public_url:
+                self._uploaded.set(file_path, public_url)
+        return public_url
+
+    async def save_query_history(self, user_id: int, symptom_text: str, response_data: dict, image_url: str = None):
+        """Saves a query and its response to the database."""
+        return await self._run("insert", self._save_query_history, user_id, symptom_text, response_data, image_url)
+
+    async def save_query_history_batch(self, rows: list):
+        """Saves several query_history rows in one bulk insert."""
+        return await self._run("insert", self._save_query_history_batch, rows)
+
+    async def get_user_history(self, user_id: int, limit: int, after: Optional[Tuple[str, int]] = None):
+        """
+        Retrieves one page of history summaries, newest first.
+        `after` is the (created_at, id) of the last row of the previous page.
+        """
+        return await self._run("select", self._get_user_history, user_id, limit, after)
+
+    async def get_history_entry(self, user_id: int, entry_id: int):
+        """Retrieves a single history entry, including its full response_data."""
+        return await self._run("select", self._get_history_entry, user_id, entry_id)
+
+    def _create_user(self, user: UserCreate, hashed_password: str):
         try:
             # Note: The Supabase Python client v1 returns a list, v2 will return a model.
             # This code is for v1.
@@ -28,7 +156,7 @@ class SupabaseService:
                 "email": user.email,
                 "hashed_password": hashed_password
             }).execute()
-            
+
             # Check if data was returned and is not empty
             if response.data and len(response.data) > 0:
                 return response.data[0] # Return the created user data
@@ -39,9 +167,16 @@ class SupabaseService:
             if "duplicate key value violates unique constraint" in str(e):
                 return {"error": "A user with this email already exists."}
             return {"error": f"An unexpected database error occurred: {str(e)}"}
-        
-    def get_user_by_email(self, email: str):
-        """Fetches a single user by their email address."""
+
+    def _update_password_hash(self, user_id: int, hashed_password: str):
+        try:
+            self.client.table('users').update({"hashed_password": hashed_password}).eq('id', user_id).execute()
+            return True
+        except Exception as e:
+            print(f"Error updating password hash: {str(e)}")
+            return False
+
+    def _get_user_by_email(self, email: str):
         try:
             response = self.client.table('users').select("*").eq('email', email).limit(1).execute()
             if response.data:
@@ -50,29 +185,26 @@ class SupabaseService:
         except Exception as e:
             print(f"Error fetching user by email: {str(e)}")
             return None
-        
-    def upload_symptom_image(self, user_id: int, image_bytes: bytes, content_type: str):
-        """Uploads an image to the symptom_images storage bucket."""
+
+    def _upload_symptom_image(self, file_path: str, image_bytes: bytes, content_type: str):
         try:
-            # Create a unique file path for the image
-            file_path = f"{user_id}/{uuid.uuid4()}.jpg"
-            
             # Upload the file
             self.client.storage.from_("symptom_images").upload(
                 path=file_path,
                 file=image_bytes,
                 file_options={"content-type": content_type}
             )
-            
-            # Get the public URL of the uploaded file
-            public_url = self.client.storage.from_("symptom_images").get_public_url(file_path)
-            return public_url
         except Exception as e:
-            print(f"Error uploading image: {str(e)}")
-            return None
+            # Same path means same content, so an existing object is as good as a new one.
+            if "Duplicate" not in str(e) and "already exists" not in str(e):
+                print(f"Error uploading image: {str(e)}")
+                return None
 
-    def save_query_history(self, user_id: int, symptom_text: str, response_data: dict, image_url: str = None):
-        """Saves a query and its response to the database."""
+        # Get the public URL of the uploaded file
+        public_url = self.client.storage.from_("symptom_images").get_public_url(file_path)
+        return public_url
+
+    def _save_query_history(self, user_id: int, symptom_text: str, response_data: dict, image_url: str = None):
         try:
             self.client.table('query_history').insert({
                 "user_id": user_id,
@@ -85,15 +217,45 @@ class SupabaseService:
             print(f"Error saving query history: {str(e)}")
             return False
 
-    def get_user_history(self, user_id: int):
-        """Retrieves all query history for a specific user."""
+    def _save_query_history_batch(self, rows: list):
         try:
-            response = self.client.table('query_history').select("*").eq('user_id', user_id).order('created_at', desc=True).execute()
+            # PostgREST bulk inserts need every row to carry the same columns.
+            self.client.table('query_history').insert([{
+                "user_id": row["user_id"],
+                "symptom_text": row["symptom_text"],
+                "response_data": row["response_data"],
+                "image_url": row.get("image_url"),
+            } for row in rows]).execute()
+            return True
+        except Exception as e:
+            print(f"Error saving query history batch of {len(rows)}: {str(e)}")
+            return False
+
+    def _get_user_history(self, user_id: int, limit: int, after: Optional[Tuple[str, int]]):
+        try:
+            # Keyset pagination: with an index on (user_id, created_at desc, id desc)
+            # every page is an index range scan, however long the history is.
+            query = self.client.table('query_history').select(HISTORY_SUMMARY_COLUMNS).eq('user_id', user_id)
+            if after is not None:
+                created_at, entry_id = after
+                query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{entry_id})')
+            response = query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
             return response.data
         except Exception as e:
             print(f"Error fetching user history: {str(e)}")
             return []
-        
-        
+
+    def _get_history_entry(self, user_id: int, entry_id: int):
+        try:
+            response = self.client.table('query_history').select(f"*, {TOP_CONDITION_COLUMN}").eq('user_id', user_id).eq('id', entry_id).limit(1).execute()
+            if response.data:
+                return response.data[0]
+            return None
+        except Exception as e:
+            print(f"Error fetching history entry: {str(e)}")
+            return None
+
+
 # Create a single, reusable instance for the app to use
-supabase_service = SupabaseService()
\ No newline at end of file
+supabase_service = SupabaseService()
+on_prewarm(supabase_service._connect)
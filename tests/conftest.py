@@ -0,0 +1,7 @@
+import os
+
+# config.Settings requires these at import time; the tests never use real keys.
+for _name in ("GOOGLE_API_KEY", "GEOAPIFY_API_KEY", "SECRET_KEY"):
+    os.environ.setdefault(_name, "test")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test.test.test")
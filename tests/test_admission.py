@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+
+from services.admission import MemoryQuotaBackend, SQLiteQuotaBackend
+
+
+def test_cost_is_charged_in_full():
+    backend = MemoryQuotaBackend()
+    assert asyncio.run(backend.take("u", rate=1.0, burst=5.0, cost=3.0)) == 0.0
+    assert asyncio.run(backend.take("u", rate=1.0, burst=5.0, cost=3.0)) > 0.0
+
+
+def test_cost_above_burst_is_admitted_into_debt():
+    backend = MemoryQuotaBackend()
+    assert asyncio.run(backend.take("u", rate=1.0, burst=5.0, cost=50.0)) == 0.0
+    # 45 tokens in debt, then one more needed.
+    assert 45.0 < asyncio.run(backend.take("u", rate=1.0, burst=5.0)) < 47.0
+
+
+def test_sqlite_take_runs_off_the_event_loop(tmp_path):
+    backend = SQLiteQuotaBackend(str(tmp_path / "quota.sqlite3"))
+    threads = []
+    take = backend._take
+
+    def recording_take(*args):
+        threads.append(threading.current_thread())
+        return take(*args)
+
+    backend._take = recording_take
+    try:
+        assert asyncio.run(backend.take("u", rate=1.0, burst=2.0, cost=2.0)) == 0.0
+        assert asyncio.run(backend.take("u", rate=1.0, burst=2.0)) > 0.0
+    finally:
+        backend.close()
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
+
+
+def test_sqlite_prunes_refilled_buckets(tmp_path):
+    backend = SQLiteQuotaBackend(str(tmp_path / "quota.sqlite3"), prune_interval=0.0)
+    try:
+        # Refills in a millisecond, so it's gone at the next prune.
+        asyncio.run(backend.take("idle", rate=1000.0, burst=1.0))
+        asyncio.run(backend.take("busy", rate=0.001, burst=1.0))
+        time.sleep(0.01)
+        asyncio.run(backend.take("other", rate=0.001, burst=1.0))
+        keys = {row[0] for row in backend._conn.execute("SELECT key FROM buckets")}
+    finally:
+        backend.close()
+    assert keys == {"busy", "other"}
+    assert backend.pruned >= 1
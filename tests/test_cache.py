@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from services.cache import SQLiteCache, TTLCache
+
+
+def test_sqlite_cache_runs_off_the_event_loop(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=10, default_ttl=60)
+    threads = []
+    get, set_ = cache.get, cache.set
+
+    def recording(method):
+        def call(*args):
+            threads.append(threading.current_thread())
+            return method(*args)
+        return call
+
+    cache.get, cache.set = recording(get), recording(set_)
+
+    async def round_trip():
+        await cache.aset("key", {"value": 1})
+        found = await cache.aget("key")
+        await cache.adelete("key")
+        return found, await cache.aget("key", "gone")
+
+    try:
+        assert asyncio.run(round_trip()) == ({"value": 1}, "gone")
+    finally:
+        cache.close()
+    assert len(threads) == 3
+    assert all(thread is not threading.main_thread() for thread in threads)
+
+
+def test_ttl_cache_async_interface_matches():
+    cache = TTLCache(max_entries=10, default_ttl=60)
+
+    async def round_trip():
+        await cache.aset("key", b"value")
+        found = await cache.aget("key")
+        await cache.adelete("key")
+        return found, await cache.aget("key")
+
+    assert asyncio.run(round_trip()) == (b"value", None)
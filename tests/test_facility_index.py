@@ -0,0 +1,35 @@
+import json
+
+from services.facility_index import FacilityIndex, read_geojson
+
+
+def test_antimeridian_longitude_is_indexed_in_the_last_column():
+    index = FacilityIndex.build([
+        ("East edge", "", 10.0, 180.0),
+        ("West edge", "", 10.05, -180.0),
+    ], cell_degrees=0.05)
+    assert index.cell_ids.max() < (index._cell_rows(10.05, 0.05) + 1) * index.n_cols
+    assert [h["name"] for h in index.within_radius(10.0, 179.999, 1000, 5)] == ["East edge"]
+    # Not mistaken for the next row's first column.
+    assert index.within_radius(10.05, -179.999, 1000, 5)[0]["name"] == "West edge"
+    assert len(index.within_radius(10.05, -179.999, 1000, 5)) == 1
+
+
+def test_north_pole_latitude_is_indexed_in_the_last_row():
+    index = FacilityIndex.build([("Pole", "", 90.0, 0.0)], cell_degrees=0.05)
+    assert [h["name"] for h in index.within_radius(89.999, 0.0, 1000, 5)] == ["Pole"]
+
+
+def test_null_names_and_addresses_get_placeholders():
+    index = FacilityIndex.build([(None, None, 1.0, 1.0), ("Clinic", "1 Main Road", 1.001, 1.0)])
+    assert [(h["name"], h["address"]) for h in index.within_radius(1.0, 1.0, 1000, 5)] == [
+        ("N/A", "Address not available"), ("Clinic", "1 Main Road"),
+    ]
+
+
+def test_geojson_nulls_get_placeholders(tmp_path):
+    path = tmp_path / "facilities.geojson"
+    path.write_text(json.dumps({"features": [
+        {"properties": {"name": None, "address_line2": None, "lat": 1.0, "lon": 2.0}},
+    ]}))
+    assert list(read_geojson(str(path))) == [("N/A", "Address not available", 1.0, 2.0)]
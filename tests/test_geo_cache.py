@@ -0,0 +1,51 @@
+import math
+
+from services.cache import TTLCache
+from services.geo_cache import GeoCache, haversine_meters
+
+
+def _place(latitude, longitude, name):
+    return {"name": name, "address": "", "lat": latitude, "lon": longitude}
+
+
+def _offset(latitude, longitude, north_meters, east_meters):
+    return (latitude + north_meters / 111_320,
+            longitude + east_meters / (111_320 * math.cos(math.radians(latitude))))
+
+
+def _ring(latitude, longitude, count, distance):
+    """`count` places `distance` meters from the point, evenly around it."""
+    return [
+        _place(*_offset(latitude, longitude, distance * math.cos(2 * math.pi * i / count),
+                        distance * math.sin(2 * math.pi * i / count)), f"ring {i}")
+        for i in range(count)
+    ]
+
+
+def test_complete_tile_answers_every_caller():
+    cache = GeoCache(TTLCache(max_entries=10, default_ttl=60), precision=6)
+    tile = cache.tile(51.5, -0.12)
+    places = _ring(tile.center_lat, tile.center_lon, 5, 3000)
+    hospitals = cache.nearest_covered(tile, places, 51.5, -0.12, 5000, 7, fetch_limit=20)
+    assert hospitals == cache.nearest(places, 51.5, -0.12, 5000, 7)
+
+
+def test_truncated_tile_answers_callers_near_its_center():
+    cache = GeoCache(TTLCache(max_entries=10, default_ttl=60), precision=6)
+    tile = cache.tile(51.5, -0.12)
+    # 3 places 100 m out, the rest up to 1 km: complete within 1 km of the center.
+    places = _ring(tile.center_lat, tile.center_lon, 3, 100) + _ring(tile.center_lat, tile.center_lon, 17, 1000)
+    hospitals = cache.nearest_covered(tile, places, tile.center_lat, tile.center_lon, 5000, 3, fetch_limit=20)
+    assert [h["name"] for h in hospitals] == ["ring 0", "ring 1", "ring 2"]
+    assert cache.uncovered == 0
+
+
+def test_truncated_tile_defers_callers_it_may_not_cover():
+    cache = GeoCache(TTLCache(max_entries=10, default_ttl=60), precision=6)
+    tile = cache.tile(51.5, -0.12)
+    places = _ring(tile.center_lat, tile.center_lon, 20, 200)
+    # A caller 300 m from the center may have a closer place the fetch cut off.
+    latitude, longitude = _offset(tile.center_lat, tile.center_lon, 0, 300)
+    assert haversine_meters(tile.center_lat, tile.center_lon, latitude, longitude) < tile.half_diagonal_meters
+    assert cache.nearest_covered(tile, places, latitude, longitude, 5000, 7, fetch_limit=20) is None
+    assert cache.uncovered == 1
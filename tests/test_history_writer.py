@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.standins import FakeSupabaseClient
+from services.history_writer import HistoryWriter, _unsaved_rows
+from services.supabase_service import SupabaseService
+
+
+@pytest.fixture
+def db():
+    service = SupabaseService()
+    service.client = FakeSupabaseClient()
+    service.initialize_client()
+    yield service
+    service.close()
+
+
+def _row(i: int) -> dict:
+    return {"user_id": 1, "symptom_text": f"symptoms {i:03d}", "response_data": {"n": i}, "image_url": None}
+
+
+def _writer(insert_batch, journal_path, **kwargs) -> HistoryWriter:
+    options = dict(max_queue=100, batch_size=10, flush_interval=0.01, max_backoff=0.01)
+    options.update(kwargs)
+    return HistoryWriter(insert_batch=insert_batch, journal_path=str(journal_path), **options)
+
+
+def _saved(db) -> list:
+    return [row["symptom_text"] for row in db.client.db.get("query_history", [])]
+
+
+async def _crash(writer: HistoryWriter):
+    """Stops a writer the way a killed process would: no flush, no ack, no cleanup."""
+    for task in (writer._task, writer._backlog_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    writer._journal.close()
+    writer._journal_lock.close()
+
+
+async def _wait_for(condition, timeout: float = 5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_rows_journaled_before_a_crash_are_replayed_exactly_once(db, tmp_path):
+    journal = tmp_path / "history_journal.jsonl"
+
+    async def first_run():
+        # A flush interval longer than the run: the rows are journaled but never inserted.
+        writer = _writer(db.save_query_history_batch, journal, batch_size=100, flush_interval=60)
+        await writer.start()
+        for i in range(5):
+            await writer.enqueue(_row(i))
+        await _crash(writer)
+
+    async def next_run():
+        writer = _writer(db.save_query_history_batch, journal)
+        await writer.start()
+        await _wait_for(lambda: writer._backlog_task.done() and not writer._unacked)
+        await writer.stop(timeout=1)
+        return writer.replayed_rows
+
+    asyncio.run(first_run())
+    assert _saved(db) == []
+    assert asyncio.run(next_run()) == 5
+    assert _saved(db) == [f"symptoms {i:03d}" for i in range(5)]
+    # Acknowledged on replay, so a further restart has nothing left to insert.
+    assert asyncio.run(next_run()) == 0
+    assert _saved(db) == [f"symptoms {i:03d}" for i in range(5)]
+
+
+def test_rejected_row_is_dead_lettered_without_blocking_later_rows(db, tmp_path):
+    journal = tmp_path / "history_journal.jsonl"
+    rejected = {"user_id": 1, "response_data": {}}  # no symptom_text: the insert fails
+
+    async def run():
+        writer = _writer(db.save_query_history_batch, journal, max_attempts=2)
+        await writer.start()
+        await writer.enqueue(_row(0))
+        await writer.enqueue(rejected)
+        for i in range(1, 4):
+            await writer.enqueue(_row(i))
+        await _wait_for(lambda: not writer._unacked)
+        await writer.enqueue(_row(4))
+        await writer.stop(timeout=1)
+        return writer
+
+    writer = asyncio.run(run())
+    assert _saved(db) == [f"symptoms {i:03d}" for i in range(5)]
+    assert writer.dead_lettered == 1
+    assert list(_unsaved_rows(writer.dead_letter_path)) == [rejected]
+    assert journal.read_text() == ""
+
+
+def test_compaction_keeps_only_unacknowledged_rows(db, tmp_path):
+    journal = tmp_path / "history_journal.jsonl"
+    compacted, resume = asyncio.Event(), asyncio.Event()
+    writer = None
+
+    async def insert_batch(rows):
+        if writer.compactions and not resume.is_set():
+            # Hold the next insert so the compacted journal can be inspected.
+            compacted.set()
+            await resume.wait()
+        return await db.save_query_history_batch(rows)
+
+    async def run():
+        nonlocal writer
+        writer = _writer(insert_batch, journal, batch_size=1, compact_bytes=1)
+        await writer.start()
+        for i in range(20):
+            await writer.enqueue(_row(i))
+        await asyncio.wait_for(compacted.wait(), 5)
+        entries = [json.loads(line) for line in journal.read_text().splitlines()]
+        resume.set()
+        await writer.stop(timeout=5)
+        return entries
+
+    entries = asyncio.run(run())
+    saved = 20 - len(entries)
+    assert 0 < saved < 20
+    assert [entry["seq"] for entry in entries] == list(range(saved, 20))
+    assert [entry["row"] for entry in entries] == [_row(i) for i in range(saved, 20)]
+    assert writer.compactions >= 1
+    assert len(_saved(db)) == 20
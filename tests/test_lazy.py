@@ -0,0 +1,21 @@
+import asyncio
+import sys
+import threading
+
+from services.lazy import LazyModule, ensure_loaded
+
+
+def test_ensure_loaded_imports_off_the_event_loop(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe.py").write_text("import threading\nIMPORTED_ON = threading.current_thread()\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = LazyModule("lazy_probe")
+    try:
+        assert asyncio.run(ensure_loaded(module)) is module
+        assert module.loaded
+        assert module.IMPORTED_ON is not threading.main_thread()
+    finally:
+        sys.modules.pop("lazy_probe", None)
+
+
+def test_ensure_loaded_passes_real_modules_through():
+    assert asyncio.run(ensure_loaded(threading)) is threading
@@ -0,0 +1,49 @@
+import pytest
+
+from services.model_output import ModelOutputError, extract_json_object, parse_analysis
+
+ANALYSIS = {"possible_conditions": [{"condition": "Common cold", "confidence_score": "70%"}], "disclaimer": "{not advice}"}
+BODY = '{"possible_conditions": [{"condition": "Common cold", "confidence_score": "70%"}], "disclaimer": "{not advice}"}'
+
+
+@pytest.mark.parametrize("text", [
+    pytest.param(BODY, id="bare object"),
+    pytest.param(f"```json\n{BODY}\n```", id="json fence"),
+    pytest.param(f"```\n{BODY}\n```", id="plain fence"),
+    pytest.param(f"Here is the analysis you asked for:\n\n{BODY}", id="leading prose"),
+    pytest.param(f"Sure!\n```json\n{BODY}\n```\nLet me know if you need anything else.", id="prose around a fence"),
+    pytest.param(f"{BODY}\nNote: the {{braces}} here are not JSON.", id="trailing text with braces"),
+    pytest.param(BODY.replace('"70%"}]', '"70%"},]'), id="trailing comma in array"),
+    pytest.param(BODY.replace('}"}', '}",}'), id="trailing comma in object"),
+    pytest.param(f"```json\n{BODY.replace('}]', '},]')}\n```\n{{see notes}}", id="fence, trailing comma and trailing braces"),
+])
+def test_extracts_the_object(text):
+    assert extract_json_object(text) == ANALYSIS
+
+
+@pytest.mark.parametrize("text", [
+    pytest.param("", id="empty"),
+    pytest.param("I can't help with that.", id="prose only"),
+    pytest.param("```json\n```", id="empty fence"),
+    pytest.param('{"possible_conditions": [{"condition": "Cold"', id="truncated"),
+    pytest.param("} before {", id="braces reversed"),
+    pytest.param("{'possible_conditions': []}", id="single quotes"),
+    pytest.param('{"possible_conditions": [] "disclaimer": ""}', id="missing comma"),
+])
+def test_rejects_malformed_output(text):
+    with pytest.raises(ModelOutputError):
+        extract_json_object(text)
+
+
+@pytest.mark.parametrize("text", [
+    pytest.param('{"disclaimer": "x"}', id="missing conditions"),
+    pytest.param('{"possible_conditions": "Cold"}', id="conditions not a list"),
+])
+def test_parse_analysis_rejects_objects_off_schema(text):
+    with pytest.raises(ModelOutputError):
+        parse_analysis(text)
+
+
+def test_model_output_error_is_a_value_error():
+    # stream_analysis_events catches ValueError from its parse hook.
+    assert issubclass(ModelOutputError, ValueError)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from services.place_query import CategoryRejected, PlaceQueryEngine
+
+STRATEGIES = [("preferred", "healthcare.hospital"), ("fallback", "healthcare")]
+
+
+class StubPlaces:
+    """Fetcher that answers after a scripted delay per request and records cancellations."""
+
+    def __init__(self, reject=(), delays=()):
+        self.reject = set(reject)
+        self.delays = list(delays)
+        self.requests = []
+        self.cancelled = []
+
+    async def fetch(self, categories: str):
+        number = len(self.requests)
+        self.requests.append(categories)
+        try:
+            await asyncio.sleep(self.delays.pop(0) if self.delays else 0.001)
+        except asyncio.CancelledError:
+            self.cancelled.append(number)
+            raise
+        if categories in self.reject:
+            raise CategoryRejected(categories)
+        return [{"name": "City Hospital", "request": number}]
+
+
+def test_rejected_category_is_not_requested_while_remembered():
+    places = StubPlaces(reject={"healthcare.hospital"})
+    engine = PlaceQueryEngine(STRATEGIES, recheck_after=0.2)
+
+    async def run():
+        # Not yet known to work: both sets are asked at once.
+        await engine.query(places.fetch)
+        assert places.requests == ["healthcare.hospital", "healthcare"]
+        for _ in range(5):
+            await engine.query(places.fetch)
+        remembered = list(places.requests)
+        await asyncio.sleep(0.25)
+        await engine.query(places.fetch)
+        return remembered
+
+    remembered = asyncio.run(run())
+    assert remembered == ["healthcare.hospital"] + ["healthcare"] * 6
+    # Past recheck_after the preferred set is tried again, alongside the fallback.
+    assert places.requests[len(remembered):] == ["healthcare.hospital", "healthcare"]
+    assert engine.stats()["rejected"] == ["preferred"]
+    assert engine.rejections == 2
+
+
+def _hedging_engine() -> PlaceQueryEngine:
+    return PlaceQueryEngine(STRATEGIES, recheck_after=60, hedge_percentile=50, hedge_min_samples=1,
+                            hedge_min_delay=0.01)
+
+
+async def _warm_up(engine: PlaceQueryEngine, places: StubPlaces):
+    """One query at ~20 ms, so later queries hedge after ~20 ms; the stub forgets it afterwards."""
+    places.delays = [0.02, 0.02]
+    await engine.query(places.fetch)
+    await asyncio.sleep(0.03)
+    places.requests.clear()
+    places.cancelled.clear()
+
+
+def test_hedge_is_cancelled_once_the_first_request_succeeds():
+    places = StubPlaces()
+    engine = _hedging_engine()
+
+    async def run():
+        await _warm_up(engine, places)
+        # The first request answers at 100 ms; the hedge sent at ~20 ms would take 10 s.
+        places.delays = [0.1, 10]
+        start = time.monotonic()
+        result = await engine.query(places.fetch)
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(0.01)
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+    assert result == [{"name": "City Hospital", "request": 0}]
+    assert elapsed < 1
+    assert places.requests == ["healthcare.hospital", "healthcare.hospital"]
+    assert places.cancelled == [1]
+    assert (engine.hedges, engine.hedge_wins) == (1, 0)
+
+
+def test_slow_request_is_cancelled_once_the_hedge_succeeds():
+    places = StubPlaces()
+    engine = _hedging_engine()
+
+    async def run():
+        await _warm_up(engine, places)
+        places.delays = [10, 0.01]
+        start = time.monotonic()
+        result = await engine.query(places.fetch)
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(0.01)
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+    assert result == [{"name": "City Hospital", "request": 1}]
+    assert elapsed < 1
+    assert places.cancelled == [0]
+    assert (engine.hedges, engine.hedge_wins) == (1, 1)
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from benchmarks.bench_brownout import run
+from services.resilience import AdaptiveTokenBucket, Upstream
+
+RPS = 100
+CAPACITY = 20
+LATENCY = 0.1
+PHASE_SECONDS = 2.0
+
+
+@pytest.fixture(scope="module")
+def brownout():
+    """One guarded run through the stub's healthy, brownout, outage and recovered phases."""
+    return asyncio.run(run("guarded", RPS, deadline=2.0, capacity=CAPACITY, latency=LATENCY,
+                           phase_seconds=PHASE_SECONDS))
+
+
+def _goodput(results, phase: str) -> int:
+    return sum(1 for ok, _ in results[phase] if ok)
+
+
+def _upstream(**kwargs) -> Upstream:
+    options = dict(max_concurrency=10, rate=100, burst=10, max_attempts=100, backoff_base=0.02,
+                   backoff_max=0.1, failure_threshold=1000, reset_timeout=1.0, default_timeout=1.0)
+    options.update(kwargs)
+    return Upstream("stub", **options)
+
+
+def _status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "http://stub/v2/places")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+def test_brownout_goodput_stays_within_bound_of_healthy(brownout):
+    results, _, _ = brownout
+    healthy = _goodput(results, "healthy")
+    assert healthy >= 0.5 * len(results["healthy"])
+    # In the brownout the stub serves a quarter of the requests at four times the latency.
+    brownout_rps = (CAPACITY // 4) / (LATENCY * 4)
+    expected = healthy * min(1.0, brownout_rps / RPS)
+    assert _goodput(results, "brownout") >= 0.5 * expected
+
+
+def test_outage_load_drops_once_the_circuit_opens(brownout):
+    results, received, stats = brownout
+    assert _goodput(results, "outage") == 0
+    assert stats["circuit_opened"] >= 1
+    # Without the breaker every request would reach the stub at least once.
+    assert received["outage"] < 0.5 * len(results["outage"])
+    assert _goodput(results, "recovered") >= 0.5 * len(results["recovered"])
+
+
+def test_retries_stop_at_the_deadline():
+    upstream = _upstream()
+    attempts = []
+
+    async def failing():
+        attempts.append(time.monotonic())
+        raise _status_error(503)
+
+    async def call():
+        start = time.monotonic()
+        with pytest.raises(httpx.HTTPStatusError):
+            await upstream.call(failing, deadline=start + 0.5)
+        return start, time.monotonic()
+
+    start, end = asyncio.run(call())
+    assert len(attempts) > 1
+    assert all(at < start + 0.5 for at in attempts)
+    # Gives up instead of sleeping past the deadline.
+    assert end - start < 0.5
+    assert upstream.retries == len(attempts) - 1
+
+
+def test_retry_after_beyond_the_deadline_is_not_waited_for():
+    upstream = _upstream()
+    attempts = []
+
+    async def throttled():
+        attempts.append(time.monotonic())
+        raise _status_error(429, {"Retry-After": "5"})
+
+    async def call():
+        start = time.monotonic()
+        with pytest.raises(httpx.HTTPStatusError):
+            await upstream.call(throttled, deadline=start + 0.5)
+        return time.monotonic() - start
+
+    assert asyncio.run(call()) < 0.1
+    assert len(attempts) == 1
+
+
+def test_token_bucket_slows_down_after_retry_after():
+    bucket = AdaptiveTokenBucket(rate=10, burst=1, min_rate=1, max_rate=10)
+    assert bucket.delay() == 0.0
+    bucket.refund()
+    bucket.on_throttled(retry_after=0.5)
+    assert bucket.rate == pytest.approx(7)
+    # Held for the Retry-After, then spaced at the lower rate (1/7 s rather than 1/10 s).
+    waits = [bucket.delay() for _ in range(6)]
+    assert waits == pytest.approx([0.5, 0.5, 0.5, 4 / 7, 5 / 7, 6 / 7], abs=0.01)
+    # A burst of 429s answering requests sent at the old rate is one signal.
+    bucket.on_throttled(retry_after=0.5)
+    assert bucket.rate == pytest.approx(7)
+
+
+def test_upstream_waits_for_retry_after_and_lowers_the_rate():
+    upstream = _upstream(rate=10, burst=10)
+    attempts = []
+
+    async def throttled_once():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise _status_error(429, {"Retry-After": "0.2"})
+        return "ok"
+
+    assert asyncio.run(upstream.call(throttled_once)) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+    assert upstream.throttled == 1
+    assert upstream.limiter.rate < 10
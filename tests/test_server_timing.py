@@ -0,0 +1,52 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config import settings
+from services.metrics import MetricsMiddleware, timed
+from services.pipeline import RequestPipeline
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/staged")
+async def staged():
+    pipeline = RequestPipeline()
+    pipeline.start("lookup", asyncio.sleep(0), timeout=1)
+    await pipeline.run("analysis", asyncio.sleep(0), timeout=1)
+    await pipeline.result("lookup")
+    return {}
+
+
+@app.get("/upstream")
+async def upstream():
+    with timed("gemini", "text"):
+        await asyncio.sleep(0)
+    return {}
+
+
+client = TestClient(app)
+
+
+def _entries(response):
+    return [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+
+
+def test_stage_timings_are_listed_by_default():
+    assert not settings.METRICS_SERVER_TIMING
+    entries = _entries(client.get("/staged"))
+    assert sorted(entries[:-1]) == ["analysis", "lookup"]
+    assert entries[-1] == "total"
+
+
+def test_stage_timings_are_listed_with_metrics_off(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    assert sorted(_entries(client.get("/staged"))) == ["analysis", "lookup", "total"]
+
+
+def test_upstream_calls_need_the_option(monkeypatch):
+    assert "server-timing" not in client.get("/upstream").headers
+    monkeypatch.setattr(settings, "METRICS_SERVER_TIMING", True)
+    assert _entries(client.get("/upstream")) == ["gemini-text", "total"]
@@ -0,0 +1,50 @@
+import pytest
+
+from services.similarity_index import SimilarityIndex, tokenize
+
+# Each pair differs in something clinically meaningful and must never share an answer.
+DIFFERENT_MEANING = [
+    ("chest pain for 3 weeks", "chest pain for 3 hours"),
+    ("night sweats", "sweats"),
+    ("fever since yesterday", "fever for weeks"),
+    ("she has abdominal pain", "he has abdominal pain"),
+    ("fever", "no fever"),
+    ("cough for 2 days and fever for 5 days", "cough for 5 days and fever for 2 days"),
+    ("a little bleeding", "a lot of bleeding"),
+]
+
+SAME_MEANING = [
+    ("fever, headache", "I have a headache and a fever"),
+    ("headaches and sore throats", "sore throat, headache"),
+    ("chest pain for 3 hours", "I have been having chest pain for 3 hours"),
+]
+
+
+@pytest.mark.parametrize("indexed, query", DIFFERENT_MEANING)
+def test_different_meaning_does_not_match(indexed, query):
+    index = SimilarityIndex(max_entries=10)
+    index.add(indexed, "cached")
+    assert index.lookup(query) is None
+
+
+@pytest.mark.parametrize("indexed, query", SAME_MEANING)
+def test_rephrasing_matches(indexed, query):
+    index = SimilarityIndex(max_entries=10)
+    index.add(indexed, "cached")
+    assert index.lookup(query) == "cached"
+
+
+def test_durations_are_single_tokens():
+    assert "3_hour" in tokenize("pain for 3 hours")
+    assert "two_day" in tokenize("cough for two days")
+
+
+def test_oldest_entry_is_evicted():
+    index = SimilarityIndex(max_entries=2)
+    index.add("fever", "a")
+    index.add("cough", "b")
+    index.add("rash", "c")
+    assert index.lookup("fever") is None
+    assert index.lookup("cough") == "b"
+    assert index.lookup("rash") == "c"
+    assert len(index) == 2
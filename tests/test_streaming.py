@@ -0,0 +1,51 @@
+from services.streaming import IncrementalConditionParser
+
+# Fenced like Gemini's plain-text output, with braces, brackets, quotes and
+# escapes inside strings and a nested "possible_conditions" that is not the target.
+RESPONSE = """```json
+{
+  "note": "ignore {\\"possible_conditions\\": [{}]} in here",
+  "possible_conditions": [
+    {"condition": "Common cold", "confidence_score": "70%"},
+    {"condition": "Flu {influenza} [A/B]", "confidence_score": "High", "extra": {"possible_conditions": [{"condition": "x"}]}},
+    {"condition": "Say \\"ahh\\" \\\\ then rest", "confidence_score": "12.5"}
+  ],
+  "recommended_next_steps": ["Rest", "Fluids"],
+  "disclaimer": "Not medical advice."
+}
+```"""
+
+EXPECTED = [
+    {"condition": "Common cold", "confidence_score": "70%", "confidence": 70.0},
+    {"condition": "Flu {influenza} [A/B]", "confidence_score": "High", "confidence": None},
+    {"condition": 'Say "ahh" \\ then rest', "confidence_score": "12.5", "confidence": 12.5},
+]
+
+
+def _parse(chunks) -> list:
+    parser = IncrementalConditionParser()
+    conditions = []
+    for chunk in chunks:
+        conditions.extend(parser.feed(chunk))
+    assert parser.text == RESPONSE
+    return conditions
+
+
+def test_whole_response():
+    assert _parse([RESPONSE]) == EXPECTED
+
+
+def test_same_conditions_at_every_split_offset():
+    for offset in range(len(RESPONSE) + 1):
+        assert _parse([RESPONSE[:offset], RESPONSE[offset:]]) == EXPECTED, offset
+
+
+def test_same_conditions_one_character_at_a_time():
+    assert _parse(RESPONSE) == EXPECTED
+
+
+def test_condition_emitted_as_soon_as_its_object_closes():
+    parser = IncrementalConditionParser()
+    first_end = RESPONSE.index("},", RESPONSE.index("Common cold")) + 1
+    assert parser.feed(RESPONSE[:first_end - 1]) == []
+    assert parser.feed(RESPONSE[first_end - 1:first_end]) == EXPECTED[:1]
@@ -0,0 +1,48 @@
+import httpx
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from services.image_processor import UploadLimitMiddleware
+
+app = FastAPI()
+app.add_middleware(UploadLimitMiddleware, path_prefix="/analyze/image", max_bytes=100_000)
+
+
+@app.post("/analyze/image")
+async def analyze_image(image: UploadFile = File(...)):
+    return {"size": len(await image.read())}
+
+
+client = TestClient(app)
+
+
+def _multipart(size: int):
+    request = httpx.Request("POST", "http://test/", files={"image": ("photo.jpg", b"x" * size, "image/jpeg")})
+    return request.read(), request.headers["content-type"]
+
+
+def _chunked(body: bytes):
+    # A generator body is sent without a Content-Length.
+    for start in range(0, len(body), 8192):
+        yield body[start:start + 8192]
+
+
+def test_declared_oversized_upload_is_refused():
+    body, content_type = _multipart(200_000)
+    response = client.post("/analyze/image", content=body, headers={"content-type": content_type})
+    assert response.status_code == 413
+
+
+def test_chunked_oversized_upload_is_refused_while_received():
+    body, content_type = _multipart(500_000)
+    response = client.post("/analyze/image", content=_chunked(body), headers={"content-type": content_type})
+    assert response.request.headers.get("content-length") is None
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Image is too large."}
+
+
+def test_chunked_upload_under_the_cap_is_parsed():
+    body, content_type = _multipart(50_000)
+    response = client.post("/analyze/image", content=_chunked(body), headers={"content-type": content_type})
+    assert response.status_code == 200
+    assert response.json() == {"size": 50_000}